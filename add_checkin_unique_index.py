@@ -0,0 +1,35 @@
+"""
+Add the unique (user_id, quest_id) index on travel_checkins that travel
+checkins use to reject duplicates (INSERT ... ON CONFLICT DO NOTHING).
+Duplicate checkins left by the old check-then-insert code are removed first,
+keeping each user's earliest checkin per location. Safe to re-run.
+"""
+from app.database import engine
+from sqlalchemy import text
+
+def add_checkin_unique_index():
+    print("Adding unique checkin index...")
+
+    try:
+        with engine.connect() as conn:
+            result = conn.execute(text("""
+                DELETE FROM travel_checkins
+                WHERE id NOT IN (
+                    SELECT min(id) FROM travel_checkins GROUP BY user_id, quest_id
+                )
+            """))
+            print(f"✓ Removed {result.rowcount} duplicate checkins")
+
+            conn.execute(text("""
+                CREATE UNIQUE INDEX IF NOT EXISTS uq_travel_checkins_user_id_quest_id
+                ON travel_checkins (user_id, quest_id)
+            """))
+            print("✓ uq_travel_checkins_user_id_quest_id")
+            conn.commit()
+
+    except Exception as e:
+        print(f"Error: {e}")
+        print("\nIf you see an error, please run: python reset_database.py")
+
+if __name__ == "__main__":
+    add_checkin_unique_index()
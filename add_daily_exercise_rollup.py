@@ -0,0 +1,53 @@
+"""
+Migration script to add the daily_exercise_rollup table and backfill it from exercise_logs.
+perform_daily_check reads yesterday's totals from this table, so run this once
+before deploying. It is safe to re-run: existing rollup rows are recomputed.
+
+Days are local days in DEFAULT_TIMEZONE (every user's zone before pets.timezone
+existed); on SQLite, where there are no time zones, the stored UTC date is used.
+"""
+from sqlalchemy import func, select
+from app.database import engine
+from app import crud_atomic, models
+
+def backfill():
+    # Create the table if it doesn't exist yet
+    models.DailyExerciseRollup.__table__.create(bind=engine, checkfirst=True)
+    print("✓ daily_exercise_rollup table ready")
+
+    logs = models.ExerciseLog.__table__
+    rollup = models.DailyExerciseRollup.__table__
+    if engine.dialect.name == "postgresql":
+        day = func.date(func.timezone(models.DEFAULT_TIMEZONE, logs.c.created_at))
+    else:
+        day = func.date(logs.c.created_at)
+    totals = select(
+        logs.c.user_id,
+        day,
+        func.coalesce(func.sum(logs.c.duration_seconds), 0),
+        func.coalesce(func.sum(logs.c.steps), 0),
+        func.coalesce(func.sum(logs.c.duration_seconds // 10), 0),
+        func.count()
+    ).where(logs.c.user_id.is_not(None)).group_by(logs.c.user_id, day)
+
+    with engine.connect() as conn:
+        stmt = crud_atomic.dialect_insert(conn, rollup).from_select(
+            ["user_id", "day", "seconds", "steps", "strength_points", "sessions"], totals
+        )
+        result = conn.execute(stmt.on_conflict_do_update(
+            index_elements=[rollup.c.user_id, rollup.c.day],
+            set_={
+                column: stmt.excluded[column]
+                for column in ["seconds", "steps", "strength_points", "sessions"]
+            }
+        ))
+        conn.commit()
+        print(f"✓ Backfilled {result.rowcount} user-day rows from exercise_logs")
+
+if __name__ == "__main__":
+    try:
+        backfill()
+        print("\n✓ Migration completed successfully!")
+    except Exception as e:
+        print(f"\n✗ Migration failed: {e}")
+        raise
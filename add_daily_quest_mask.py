@@ -0,0 +1,44 @@
+"""
+Replace the per-quest daily_quest_1/2/3_completed columns with the
+daily_quests_claimed bitmask (bit quest id - 1) used by daily_quests.py.
+The mask is backfilled from the old columns when it is first added; the old
+columns are left in place and can be dropped once no deployment reads them.
+Safe to re-run.
+"""
+from app.database import engine
+from sqlalchemy import text
+
+def add_daily_quest_mask():
+    print("Adding daily_quests_claimed column to pets table...")
+
+    try:
+        with engine.connect() as conn:
+            exists = conn.execute(text("""
+                SELECT EXISTS (
+                    SELECT FROM information_schema.columns
+                    WHERE table_name = 'pets' AND column_name = 'daily_quests_claimed'
+                )
+            """)).scalar()
+            if exists:
+                print("✓ Column daily_quests_claimed already exists, skipping")
+                return
+
+            conn.execute(text("""
+                ALTER TABLE pets
+                ADD COLUMN daily_quests_claimed BIGINT NOT NULL DEFAULT 0
+            """))
+            result = conn.execute(text("""
+                UPDATE pets SET daily_quests_claimed =
+                    (CASE WHEN daily_quest_1_completed THEN 1 ELSE 0 END)
+                    | (CASE WHEN daily_quest_2_completed THEN 2 ELSE 0 END)
+                    | (CASE WHEN daily_quest_3_completed THEN 4 ELSE 0 END)
+            """))
+            conn.commit()
+            print(f"✓ Column daily_quests_claimed ready, backfilled {result.rowcount} pets")
+
+    except Exception as e:
+        print(f"Error: {e}")
+        print("\nIf you see an error, please run: python reset_database.py")
+
+if __name__ == "__main__":
+    add_daily_quest_mask()
@@ -0,0 +1,30 @@
+"""
+Add the composite indexes used by keyset pagination and the level leaderboard.
+Safe to re-run.
+"""
+from app.database import engine
+from sqlalchemy import text
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_exercise_logs_user_id_id ON exercise_logs (user_id, id)",
+    "CREATE INDEX IF NOT EXISTS ix_travel_checkins_user_id_id ON travel_checkins (user_id, id)",
+    "CREATE INDEX IF NOT EXISTS ix_user_quests_user_id_id ON user_quests (user_id, id)",
+    "CREATE INDEX IF NOT EXISTS ix_pets_level_strength ON pets (level, strength)",
+]
+
+def add_pagination_indexes():
+    print("Adding pagination indexes...")
+
+    try:
+        with engine.connect() as conn:
+            for statement in INDEXES:
+                conn.execute(text(statement))
+                print(f"✓ {statement.split()[5]}")
+            conn.commit()
+
+    except Exception as e:
+        print(f"Error: {e}")
+        print("\nIf you see an error, please run: python reset_database.py")
+
+if __name__ == "__main__":
+    add_pagination_indexes()
@@ -0,0 +1,40 @@
+"""
+Add the timezone column to the pets table (and the index used by the nightly reset).
+Existing pets get DEFAULT_TIMEZONE, which is where every user lived before this column existed,
+and the column is made NOT NULL so the reset can compare it directly (using the index).
+Run this before deploying the daily reset job (python -m app.daily_reset).
+"""
+from app.database import engine
+from app.models import DEFAULT_TIMEZONE
+from sqlalchemy import text
+
+def add_pet_timezone():
+    print("Adding timezone column to pets table...")
+
+    try:
+        with engine.connect() as conn:
+            conn.execute(text(f"""
+                ALTER TABLE pets
+                ADD COLUMN IF NOT EXISTS timezone VARCHAR DEFAULT '{DEFAULT_TIMEZONE}'
+            """))
+            conn.execute(text(f"""
+                UPDATE pets SET timezone = '{DEFAULT_TIMEZONE}' WHERE timezone IS NULL
+            """))
+            conn.execute(text(f"""
+                ALTER TABLE pets
+                ALTER COLUMN timezone SET DEFAULT '{DEFAULT_TIMEZONE}',
+                ALTER COLUMN timezone SET NOT NULL
+            """))
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_pets_timezone_last_daily_check
+                ON pets (timezone, last_daily_check)
+            """))
+            conn.commit()
+            print("✓ Column timezone (NOT NULL) and index ix_pets_timezone_last_daily_check ready")
+
+    except Exception as e:
+        print(f"Error: {e}")
+        print("\nIf you see an error, please run: python reset_database.py")
+
+if __name__ == "__main__":
+    add_pet_timezone()
@@ -0,0 +1,26 @@
+"""
+Add the version column to the pets table if it doesn't exist.
+Every UPDATE of a pet bumps it; GET /users/{user_id}/pet, /daily-quests and
+/daily-stats use it as their ETag.
+"""
+from app.database import engine
+from sqlalchemy import text
+
+def add_pet_version():
+    print("Adding version column to pets table...")
+
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("""
+                ALTER TABLE pets
+                ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1
+            """))
+            conn.commit()
+            print("✓ Column version ready")
+
+    except Exception as e:
+        print(f"Error: {e}")
+        print("\nIf you see an error, please run: python reset_database.py")
+
+if __name__ == "__main__":
+    add_pet_version()
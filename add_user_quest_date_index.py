@@ -0,0 +1,24 @@
+"""
+Add the (user_id, date) index used to look up a user's quests for today.
+Safe to re-run.
+"""
+from app.database import engine
+from sqlalchemy import text
+
+def add_user_quest_date_index():
+    print("Adding user quest date index...")
+
+    try:
+        with engine.connect() as conn:
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_user_quests_user_id_date ON user_quests (user_id, date)"
+            ))
+            conn.commit()
+            print("✓ ix_user_quests_user_id_date")
+
+    except Exception as e:
+        print(f"Error: {e}")
+        print("\nIf you see an error, please run: python reset_database.py")
+
+if __name__ == "__main__":
+    add_user_quest_date_index()
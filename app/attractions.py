@@ -0,0 +1,239 @@
+"""
+In-memory attraction catalog.
+
+The attractions table changes rarely (seeding, imports), so the whole table is
+held as an immutable, versioned snapshot: the rows, the pre-serialized
+GET /travel/attractions body and its ETag. Readers grab the current snapshot
+reference and never see a half-built one; a reload swaps in a new snapshot.
+
+The snapshot is reloaded:
+- lazily, after a commit that changed attractions in this process
+  (ORM flushes are picked up by an after_flush hook, Core writes call
+  invalidate())
+- every ATTRACTION_REFRESH_SECONDS, to pick up changes made by other processes
+The version only moves when the content actually changed, and the ETag is a
+hash of the body, so it is the same on every worker.
+
+Each snapshot also carries a GridIndex over the attractions' coordinates for
+nearby queries: points are bucketed into ATTRACTION_GRID_CELL_DEGREES square
+cells, a query only looks at the cells overlapping its radius, and distances
+to the candidates are computed with a vectorized haversine.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import math
+import threading
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from . import models
+from .database import SessionLocal
+
+ATTRACTION_REFRESH_SECONDS = int(os.getenv("ATTRACTION_REFRESH_SECONDS", "300"))
+
+# ~1.1 km north-south; a typical nearby radius only touches a handful of cells
+ATTRACTION_GRID_CELL_DEGREES = float(os.getenv("ATTRACTION_GRID_CELL_DEGREES", "0.01"))
+
+ATTRACTION_COLUMNS = ["id", "name", "description", "latitude", "longitude"]
+
+EARTH_RADIUS_M = 6371008.8
+
+# ==================
+# Spatial index
+# ==================
+
+class GridIndex:
+    """
+    Uniform lat/lng grid over the attractions that have coordinates. Immutable
+    once built; positions refer to the snapshot's attractions tuple.
+    """
+
+    def __init__(self, attractions, cell_degrees: float = ATTRACTION_GRID_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        located = [
+            (position, attraction["latitude"], attraction["longitude"])
+            for position, attraction in enumerate(attractions)
+            if attraction["latitude"] is not None and attraction["longitude"] is not None
+        ]
+        self.positions = np.array([point[0] for point in located], dtype=np.int64)
+        self.lat = np.radians(np.array([point[1] for point in located], dtype=np.float64))
+        self.lng = np.radians(np.array([point[2] for point in located], dtype=np.float64))
+
+        # cell -> indexes into positions / lat / lng. Columns are normalized the
+        # way _candidates wraps them, so longitude 180 lands with -180
+        self.wrap = round(360 / cell_degrees)
+        cells = {}
+        for i, (_, lat, lng) in enumerate(located):
+            row, column = self._cell(lat, lng)
+            cells.setdefault((row, self._wrap_column(column)), []).append(i)
+        self.cells = {cell: np.array(members, dtype=np.int64) for cell, members in cells.items()}
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _cell(self, lat: float, lng: float):
+        return (math.floor(lat / self.cell_degrees), math.floor(lng / self.cell_degrees))
+
+    def _wrap_column(self, column: int) -> int:
+        return (column + self.wrap // 2) % self.wrap - self.wrap // 2
+
+    def _candidates(self, lat: float, lng: float, radius_m: float):
+        """Indexes of the points in the cells overlapping the query's bounding box."""
+        dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+        cos_lat = math.cos(math.radians(min(abs(lat) + dlat, 90.0)))
+        if lat + dlat >= 90 or lat - dlat <= -90 or cos_lat < 1e-6:
+            return np.arange(len(self.positions))  # box reaches a pole
+        dlng = min(dlat / cos_lat, 180.0)
+
+        south, west = self._cell(lat - dlat, lng - dlng)
+        north, east = self._cell(lat + dlat, lng + dlng)
+        columns = east - west + 1
+        if (north - south + 1) * columns >= len(self.cells):
+            return np.arange(len(self.positions))  # scanning the occupied cells is cheaper
+        members = [
+            self.cells[cell]
+            for row in range(south, north + 1)
+            for column in range(west, west + min(columns, self.wrap))  # the box may cross the antimeridian
+            for cell in [(row, self._wrap_column(column))]
+            if cell in self.cells
+        ]
+        return np.concatenate(members) if members else np.empty(0, dtype=np.int64)
+
+    def nearby(self, lat: float, lng: float, radius_m: float, limit: int):
+        """(positions, distances in meters) of the closest points within radius_m, nearest first."""
+        candidates = self._candidates(lat, lng, radius_m)
+        if not len(candidates):
+            return [], []
+        lat1, lng1 = math.radians(lat), math.radians(lng)
+        lat2, lng2 = self.lat[candidates], self.lng[candidates]
+        a = np.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+        distances = 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+        within = np.flatnonzero(distances <= radius_m)
+        if len(within) > limit:
+            within = within[np.argpartition(distances[within], limit - 1)[:limit]]
+        within = within[np.argsort(distances[within], kind="stable")]
+        return self.positions[candidates[within]].tolist(), distances[within].tolist()
+
+# ==================
+# Catalog
+# ==================
+
+class CatalogSnapshot(NamedTuple):
+    version: int
+    attractions: Tuple[dict, ...]  # List[schemas.Attraction] as dicts, ordered by id
+    body: bytes  # serialized attractions
+    etag: str
+    index: GridIndex
+
+EMPTY_SNAPSHOT = CatalogSnapshot(0, (), b"[]", '"attractions-empty"', GridIndex(()))
+
+class AttractionCatalog:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = EMPTY_SNAPSHOT
+        self._stale = True
+        self._invalidations = 0  # lets a load tell whether it saw the latest invalidate()
+
+    @property
+    def stale(self) -> bool:
+        return self._stale
+
+    def snapshot(self) -> CatalogSnapshot:
+        return self._snapshot
+
+    def load(self, db: Session) -> CatalogSnapshot:
+        """
+        Reload the catalog from the database. Returns the current snapshot.
+        It stays stale if the load fails, or if it was invalidated again while
+        loading (the rows read may predate that change).
+        """
+        invalidations = self._invalidations
+        table = models.Attraction.__table__
+        rows = db.execute(
+            select(*[table.c[column] for column in ATTRACTION_COLUMNS]).order_by(table.c.id)
+        ).mappings().all()
+        attractions = tuple(dict(row) for row in rows)
+        body = json.dumps(list(attractions), ensure_ascii=False).encode("utf-8")
+        with self._lock:
+            if body != self._snapshot.body:
+                self._snapshot = CatalogSnapshot(
+                    version=self._snapshot.version + 1,
+                    attractions=attractions,
+                    body=body,
+                    etag=f'"attractions-{hashlib.sha1(body).hexdigest()[:16]}"',
+                    index=GridIndex(attractions)
+                )
+            if self._invalidations == invalidations:
+                self._stale = False
+            return self._snapshot
+
+    def get(self, db: Session) -> CatalogSnapshot:
+        """Current snapshot, reloading first if the table changed since the last load."""
+        if self._stale:
+            return self.load(db)
+        return self._snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._invalidations += 1
+            self._stale = True
+
+    def random_attraction(self, snapshot: Optional[CatalogSnapshot] = None):
+        attractions = (snapshot or self._snapshot).attractions
+        return random.choice(attractions) if attractions else None
+
+    def nearby(self, lat: float, lng: float, radius_m: float, limit: int,
+               snapshot: Optional[CatalogSnapshot] = None):
+        """Attractions within radius_m of (lat, lng), nearest first, each with its distance_m."""
+        snapshot = snapshot or self._snapshot
+        positions, distances = snapshot.index.nearby(lat, lng, radius_m, limit)
+        return [
+            {**snapshot.attractions[position], "distance_m": round(distance, 1)}
+            for position, distance in zip(positions, distances)
+        ]
+
+attraction_catalog = AttractionCatalog()
+
+async def refresh_periodically():
+    """Reload the catalog every ATTRACTION_REFRESH_SECONDS (started from the app startup hook)."""
+    while True:
+        await asyncio.sleep(ATTRACTION_REFRESH_SECONDS)
+        db = SessionLocal()
+        try:
+            await run_in_threadpool(attraction_catalog.load, db)
+        except Exception as e:
+            print(f"Error refreshing attraction catalog: {e}")
+        finally:
+            db.close()
+
+# ==================
+# Session hooks
+# ==================
+
+def invalidate(db: Session):
+    """Mark the catalog stale once this session commits (for Core writes to attractions)."""
+    db.info["attractions_changed"] = True
+
+@event.listens_for(Session, "after_flush")
+def _track_flushed_attractions(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, models.Attraction):
+            invalidate(session)
+            return
+
+@event.listens_for(Session, "after_commit")
+def _apply_changes(session):
+    if session.info.pop("attractions_changed", False):
+        attraction_catalog.invalidate()
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop("attractions_changed", None)
@@ -0,0 +1,339 @@
+"""
+Game balance simulator.
+
+Runs the pet rules (pet_rules.py: stat changes, level-up, breakthrough, daily
+check) and the daily quest rewards over a population of synthetic users for a
+number of days, to answer questions like "how many days until an average user
+reaches BUFF_CHICKEN?" or "what if MIN_DAILY_STRENGTH were 90?" without
+driving the API by hand.
+
+The population is one NumPy array per pet stat (a PetState of arrays) and
+every rule is applied to all users at once, so a million pet-days take a
+couple of seconds.
+
+Each simulated day, for every user:
+1. the daily check (from day 2 on): stamina refill, the mood / strength
+   penalty for missing MIN_DAILY_STRENGTH, daily counters and claims reset
+2. with the user's activity probability the user opens the app: claims the
+   quests without a goal (daily login), logs one exercise session with a
+   log-normal duration and step count, then claims every quest whose goal
+   the session met
+3. an active user waiting for a breakthrough travels (check-in, which also
+   completes the breakthrough) with travel_probability
+Users differ by a log-normal engagement factor that scales both their
+activity probability and their typical session length.
+
+The game constants default to the live values (BalanceConfig) and the
+population model to POPULATION_DEFAULTS; both can be overridden, as can the
+daily quest definitions (same format as daily_quests.DAILY_QUEST_DEFINITIONS).
+
+Run it with:
+    python -m app.balance --users 10000 --days 120 --set min_daily_strength=90
+or POST to /admin/balance/simulate.
+"""
+import argparse
+import json
+import time
+from typing import NamedTuple
+
+import numpy as np
+
+from . import crud, daily_quests, pet_rules
+from .models import PetStage
+from .pet_rules import PetState
+
+MAX_SIMULATION_USERS = 1_000_000
+MAX_SIMULATION_DAYS = 3650
+MAX_SIMULATION_PET_DAYS = 100_000_000
+
+class BalanceConfig(NamedTuple):
+    strength_per_level: int = pet_rules.STRENGTH_PER_LEVEL
+    max_level: int = pet_rules.MAX_LEVEL
+    max_stamina: int = pet_rules.MAX_STAMINA
+    max_mood: int = pet_rules.MAX_MOOD
+    min_daily_strength: int = pet_rules.MIN_DAILY_STRENGTH
+    breakthrough_interval: int = pet_rules.BREAKTHROUGH_INTERVAL
+    level_up_mood_bonus: int = pet_rules.LEVEL_UP_MOOD_BONUS
+    missed_day_mood_penalty: int = pet_rules.MISSED_DAY_MOOD_PENALTY
+    missed_day_strength_penalty: int = pet_rules.MISSED_DAY_STRENGTH_PENALTY
+    seconds_per_strength_point: int = crud.SECONDS_PER_STRENGTH_POINT
+    exercise_stamina_cost: int = crud.EXERCISE_STAMINA_COST
+    exercise_mood_gain: int = crud.EXERCISE_MOOD_GAIN
+    travel_reward_strength: int = crud.TRAVEL_CHECKIN_REWARD["strength"]
+    travel_reward_stamina: int = crud.TRAVEL_CHECKIN_REWARD["stamina"]
+    travel_reward_mood: int = crud.TRAVEL_CHECKIN_REWARD["mood"]
+
+POPULATION_DEFAULTS = {
+    "active_probability": 0.7,  # Average chance a user opens the app on a given day
+    "exercise_minutes_median": 15.0,
+    "exercise_minutes_sigma": 0.6,  # Log-normal spread of one user's sessions
+    "steps_median": 4000.0,
+    "steps_sigma": 0.5,
+    "engagement_sigma": 0.5,  # Log-normal spread between users
+    "travel_probability": 0.3,  # Daily chance an active user at a breakthrough travels
+}
+
+# ==================
+# Vectorized rules (pet_rules.py over arrays)
+# ==================
+
+class Rules:
+    def __init__(self, config: BalanceConfig):
+        self.config = config
+        completed, pending = pet_rules.stage_tables(config.max_level, config.breakthrough_interval)
+        self.stage_completed = np.array([stage.value for stage in completed], dtype=np.int8)
+        self.stage_pending = np.array([stage.value for stage in pending], dtype=np.int8)
+
+    def needs_breakthrough(self, level, breakthrough_completed):
+        interval = self.config.breakthrough_interval
+        return (level % interval == 0) & (level >= interval) & ~breakthrough_completed
+
+    def stage_for_level(self, level, breakthrough_completed):
+        level = np.clip(level, 0, self.config.max_level)
+        return np.where(breakthrough_completed, self.stage_completed[level], self.stage_pending[level])
+
+    def apply_stats(self, pet: PetState, mask, strength=0, stamina=0, mood=0):
+        """pet_rules.apply_stats for the users in `mask`. Returns the users whose strength was blocked."""
+        c = self.config
+        blocked = mask & (np.asarray(strength) > 0) & self.needs_breakthrough(pet.level, pet.breakthrough_completed)
+        total = pet.strength + strength
+        levels = np.maximum(0, np.minimum(np.minimum(
+            total // c.strength_per_level,
+            c.max_level - pet.level),
+            c.breakthrough_interval - pet.level % c.breakthrough_interval
+        ))
+        levels = np.where(mask & ~blocked, levels, 0)
+        leveled_up = levels > 0
+        level = pet.level + levels
+        breakthrough_completed = np.where(
+            leveled_up & (level % c.breakthrough_interval == 0), False, pet.breakthrough_completed
+        )
+        gated = self.needs_breakthrough(level, breakthrough_completed)
+        unblocked = mask & ~blocked
+
+        pet.strength = np.where(unblocked, np.where(gated, 0, total - levels * c.strength_per_level), pet.strength)
+        pet.stamina = np.where(
+            mask, np.clip(np.where(leveled_up, c.max_stamina, pet.stamina) + stamina, 0, c.max_stamina), pet.stamina
+        )
+        pet.mood = np.where(
+            mask, np.clip(pet.mood + levels * c.level_up_mood_bonus + mood, 0, c.max_mood), pet.mood
+        )
+        pet.level = level
+        pet.breakthrough_completed = breakthrough_completed
+        pet.stage = np.where(unblocked, self.stage_for_level(level, breakthrough_completed), pet.stage)
+        return blocked
+
+    def complete_breakthrough(self, pet: PetState, mask):
+        mask = mask & self.needs_breakthrough(pet.level, pet.breakthrough_completed)
+        pet.breakthrough_completed = pet.breakthrough_completed | mask
+        pet.stage = np.where(mask, self.stage_for_level(pet.level, True), pet.stage)
+        return mask
+
+    def start_new_day(self, pet: PetState, strength_yesterday):
+        c = self.config
+        missed = strength_yesterday < c.min_daily_strength
+        pet.stamina = np.full_like(pet.stamina, c.max_stamina)
+        pet.mood = np.where(missed, np.maximum(0, pet.mood - c.missed_day_mood_penalty), pet.mood)
+        pet.strength = np.where(
+            missed & (pet.mood == 0) & (pet.strength > 0),
+            np.maximum(0, pet.strength - c.missed_day_strength_penalty),
+            pet.strength
+        )
+
+def new_population(users: int, config: BalanceConfig) -> PetState:
+    """Freshly created pets (see crud.create_pet_for_user)."""
+    return PetState(
+        strength=np.zeros(users, dtype=np.int64),
+        stamina=np.full(users, config.max_stamina, dtype=np.int64),
+        mood=np.zeros(users, dtype=np.int64),
+        level=np.ones(users, dtype=np.int64),
+        stage=np.full(users, PetStage.EGG.value, dtype=np.int8),
+        breakthrough_completed=np.zeros(users, dtype=bool),
+    )
+
+# ==================
+# Simulation
+# ==================
+
+def make_config(overrides: dict = None) -> BalanceConfig:
+    overrides = dict(overrides or {})
+    unknown = set(overrides) - set(BalanceConfig._fields)
+    if unknown:
+        raise ValueError(f"Unknown balance constants: {', '.join(sorted(unknown))}")
+    config = BalanceConfig(**{name: int(value) for name, value in overrides.items()})
+    if config.strength_per_level < 1 or config.seconds_per_strength_point < 1:
+        raise ValueError("strength_per_level and seconds_per_strength_point must be at least 1")
+    if config.max_level < 1 or config.breakthrough_interval < 1:
+        raise ValueError("max_level and breakthrough_interval must be at least 1")
+    return config
+
+def make_population(overrides: dict = None) -> dict:
+    overrides = dict(overrides or {})
+    unknown = set(overrides) - set(POPULATION_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown population parameters: {', '.join(sorted(unknown))}")
+    population = {**POPULATION_DEFAULTS, **{name: float(value) for name, value in overrides.items()}}
+    for name in ("active_probability", "travel_probability"):
+        if not 0 <= population[name] <= 1:
+            raise ValueError(f"{name} must be between 0 and 1")
+    return population
+
+def simulate(users: int = 10000, days: int = 90, config: dict = None, population: dict = None,
+             quests: list = None, seed: int = None):
+    """
+    Simulate `users` new pets for `days` days. Returns the per-day level and
+    stage distributions and, per stage, how many days users took to reach it.
+    Raises ValueError for invalid parameters.
+    """
+    if not 1 <= users <= MAX_SIMULATION_USERS:
+        raise ValueError(f"users must be between 1 and {MAX_SIMULATION_USERS}")
+    if not 1 <= days <= MAX_SIMULATION_DAYS:
+        raise ValueError(f"days must be between 1 and {MAX_SIMULATION_DAYS}")
+    if users * days > MAX_SIMULATION_PET_DAYS:
+        raise ValueError(f"users * days must be at most {MAX_SIMULATION_PET_DAYS}")
+    config = make_config(config)
+    population = make_population(population)
+    try:
+        registry = daily_quests.DailyQuestRegistry(quests) if quests is not None else daily_quests.registry
+    except TypeError as e:
+        raise ValueError(f"Invalid daily quest definition: {e}")
+    if seed is None:
+        seed = int(np.random.SeedSequence().generate_state(1)[0])
+
+    started = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    rules = Rules(config)
+    pet = new_population(users, config)
+
+    engagement = rng.lognormal(0.0, population["engagement_sigma"], users)
+    active_probability = np.clip(population["active_probability"] * engagement, 0, 1)
+    exercise_median_seconds = population["exercise_minutes_median"] * 60 * engagement
+    strength_yesterday = np.zeros(users, dtype=np.int64)
+    first_day = np.full((len(PetStage), users), -1, dtype=np.int32)
+    first_day[PetStage.EGG.value] = 0
+    daily = []
+
+    for day in range(1, days + 1):
+        if day > 1:
+            rules.start_new_day(pet, strength_yesterday)
+
+        active = rng.random(users) < active_probability
+        for quest in registry:
+            if quest.metric is None:
+                rules.apply_stats(pet, active, quest.reward_strength, quest.reward_stamina, quest.reward_mood)
+
+        seconds = np.where(
+            active, rng.lognormal(np.log(exercise_median_seconds), population["exercise_minutes_sigma"]), 0
+        ).astype(np.int64)
+        steps = np.where(
+            active, rng.lognormal(np.log(population["steps_median"]), population["steps_sigma"], users), 0
+        ).astype(np.int64)
+        strength_yesterday = seconds // config.seconds_per_strength_point
+        rules.apply_stats(pet, active, strength_yesterday, -config.exercise_stamina_cost, config.exercise_mood_gain)
+
+        counters = {"daily_exercise_seconds": seconds, "daily_steps": steps}
+        for quest in registry:
+            if quest.metric is not None:
+                met = active & (counters[quest.metric] >= quest.goal)
+                rules.apply_stats(pet, met, quest.reward_strength, quest.reward_stamina, quest.reward_mood)
+
+        travels = rules.complete_breakthrough(pet, active & (rng.random(users) < population["travel_probability"]))
+        rules.apply_stats(
+            pet, travels, config.travel_reward_strength, config.travel_reward_stamina, config.travel_reward_mood
+        )
+
+        stage_counts = np.bincount(pet.stage, minlength=len(PetStage))
+        for stage in PetStage:
+            reached = (pet.stage >= stage.value) & (first_day[stage.value] < 0)
+            first_day[stage.value][reached] = day
+        daily.append({
+            "day": day,
+            "mean_level": round(float(pet.level.mean()), 3),
+            "active_users": int(active.sum()),
+            "breakthrough_pending": int(rules.needs_breakthrough(pet.level, pet.breakthrough_completed).sum()),
+            "level_counts": np.bincount(pet.level, minlength=config.max_level + 1)[1:].tolist(),
+            "stage_counts": {stage.name: int(stage_counts[stage.value]) for stage in PetStage},
+        })
+
+    days_to_stage = {}
+    for stage in PetStage:
+        reached = first_day[stage.value][first_day[stage.value] >= 0]
+        days_to_stage[stage.name] = {
+            "reached": round(len(reached) / users, 4),
+            "median": float(np.median(reached)) if len(reached) else None,
+            "p90": float(np.percentile(reached, 90)) if len(reached) else None,
+        }
+
+    seconds_taken = time.perf_counter() - started
+    return {
+        "users": users,
+        "days": days,
+        "seed": seed,
+        "seconds": round(seconds_taken, 3),
+        "pet_days_per_second": round(users * days / seconds_taken, 1) if seconds_taken else 0.0,
+        "config": config._asdict(),
+        "population": population,
+        "days_to_stage": days_to_stage,
+        "daily": daily,
+    }
+
+# ==================
+# CLI
+# ==================
+
+def _parse_assignments(values):
+    assignments = {}
+    for value in values or []:
+        name, separator, number = value.partition("=")
+        if not separator:
+            raise SystemExit(f"Expected NAME=VALUE: {value}")
+        assignments[name.strip().lower()] = float(number)
+    return assignments
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate pet progression over a synthetic population")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--set", action="append", metavar="NAME=VALUE",
+                        help="override a game constant, e.g. min_daily_strength=90 (repeatable)")
+    parser.add_argument("--population", action="append", metavar="NAME=VALUE",
+                        help="override a population parameter, e.g. active_probability=0.5 (repeatable)")
+    parser.add_argument("--quests", help="JSON file with daily quest definitions")
+    parser.add_argument("--every", type=int, default=7, help="print every Nth day (default: 7)")
+    parser.add_argument("--json", action="store_true", help="print the full result as JSON")
+    args = parser.parse_args()
+
+    try:
+        result = simulate(
+            args.users, args.days,
+            config=_parse_assignments(args.set),
+            population=_parse_assignments(args.population),
+            quests=daily_quests.load_definitions(args.quests) if args.quests else None,
+            seed=args.seed
+        )
+    except ValueError as e:
+        raise SystemExit(f"Error: {e}")
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False))
+        return
+
+    stages = [stage.name for stage in PetStage]
+    print("day  mean_level  " + "  ".join(f"{name:>12}" for name in stages))
+    for row in result["daily"]:
+        if row["day"] % args.every == 0 or row["day"] in (1, result["days"]):
+            print(f"{row['day']:>3}  {row['mean_level']:>10.2f}  "
+                  + "  ".join(f"{row['stage_counts'][name]:>12}" for name in stages))
+    print("\nDays to reach each stage:")
+    for name, summary in result["days_to_stage"].items():
+        if summary["median"] is None:
+            print(f"  {name:<12} not reached")
+        else:
+            print(f"  {name:<12} {summary['reached']:>7.1%} of users, median {summary['median']:.0f}, "
+                  f"p90 {summary['p90']:.0f}")
+    print(f"\n✓ Simulated {result['users'] * result['days']} pet-days in {result['seconds']}s "
+          f"(seed {result['seed']})")
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,12 @@
+from sqlalchemy import exists, insert, literal, select, update
 from sqlalchemy.orm import Session
-from . import models, schemas
+from . import attractions, crud_atomic, daily_quests, leaderboard, models, pagination, pet_cache, pet_rules, quest_templates, schemas
+from .pet_rules import PetState
+import os
 import random
-from datetime import datetime, date, time, timedelta
+from typing import List
+from datetime import datetime, date, time, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 # Password hashing is omitted for simplicity.
 # In a real app, use passlib:
@@ -28,16 +33,13 @@ def create_user(db: Session, user: schemas.UserCreate):
         # Create user with provided user_id
         db_user = models.User(id=user.user_id)
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        db.flush()
         
         # When creating a user, automatically assign them a pet with the provided name
-        create_pet_for_user(db, db_user, pet_name=user.pet_name)
+        create_pet_for_user(db, db_user, pet_name=user.pet_name, timezone_name=user.timezone)
         
-        db.refresh(db_user) # Refresh to include the new pet
         return db_user
     except Exception as e:
-        db.rollback()
         print(f"Error in create_user: {e}")
         raise e
 
@@ -48,67 +50,53 @@ def create_user(db: Session, user: schemas.UserCreate):
 def get_pet_by_user_id(db: Session, user_id: str):
     return db.query(models.Pet).filter(models.Pet.owner_id == user_id).first()
 
-def create_pet_for_user(db: Session, user: models.User, pet_name: str):
+def get_pet_state(db: Session, user_id: str):
+    """Read-only pet state as a dict of column values, served from the pet cache when possible."""
+    return pet_cache.pet_cache.load(db, user_id)
+
+def create_pet_for_user(db: Session, user: models.User, pet_name: str, timezone_name: str = None):
     try:
         # Create a new pet with provided name, default to "EGG" stage
         db_pet = models.Pet(
             owner_id=user.id,
             name=pet_name,
             stage=models.PetStage.EGG,
-            stamina=900  # Start with full stamina
+            stamina=900,  # Start with full stamina
+            timezone=timezone_name or models.DEFAULT_TIMEZONE
         )
         db.add(db_pet)
-        db.commit()
-        db.refresh(db_pet)
+        db.flush()
         return db_pet
     except Exception as e:
-        db.rollback()
         print(f"Error in create_pet_for_user: {e}")
         raise e
 
-# Map of levels to stages (only after breakthrough)
-# Stage evolution happens AFTER breakthrough at level milestones
-LEVEL_STAGE_MAP = {
-    1: models.PetStage.EGG,        # Level 1-4 (before lv5 breakthrough)
-    5: models.PetStage.CHICK,      # After lv5 breakthrough
-    10: models.PetStage.CHICKEN,   # After lv10 breakthrough
-    15: models.PetStage.BIG_CHICKEN, # After lv15 breakthrough
-    20: models.PetStage.BUFF_CHICKEN # After lv20 breakthrough
-}
-# Cache sorted thresholds to avoid repeated sorting
-SORTED_LEVEL_THRESHOLDS = sorted(LEVEL_STAGE_MAP.keys(), reverse=True)
-
-MAX_LEVEL = 25
-STRENGTH_PER_LEVEL = 120  # 120 points = 1200 seconds = 20 minutes
-MIN_DAILY_STRENGTH = 60   # Minimum 60 points (10 minutes) per day to maintain mood
-MAX_STAMINA = 900  # Maximum stamina value, reset daily
-
-def get_stage_for_level(level: int, breakthrough_completed: bool) -> models.PetStage:
-    """
-    Determine the pet's stage based on level and breakthrough status.
-    Stage only changes AFTER completing breakthrough at level milestones (5, 10, 15, 20).
-    """
-    # If at a breakthrough level (multiple of 5) but haven't completed breakthrough, stay at previous stage
-    if level % 5 == 0 and level > 1 and not breakthrough_completed:
-        # Stay at previous milestone's stage
-        prev_milestone = level - 5
-        for lvl_threshold in SORTED_LEVEL_THRESHOLDS:
-            if prev_milestone >= lvl_threshold:
-                return LEVEL_STAGE_MAP[lvl_threshold]
-    
-    # Otherwise, find the appropriate stage for current level
-    stage = models.PetStage.EGG
-    for lvl_threshold in SORTED_LEVEL_THRESHOLDS:
-        if level >= lvl_threshold:
-            stage = LEVEL_STAGE_MAP[lvl_threshold]
-            break
-    return stage
+# Level, stage and stat rules live in pet_rules.py
+SECONDS_PER_STRENGTH_POINT = 10  # 10 seconds of exercise = 1 strength point
+EXERCISE_STAMINA_COST = 10  # Stamina cost per exercise session
+EXERCISE_MOOD_GAIN = 5  # Mood increase per exercise session
+TRAVEL_CHECKIN_REWARD = {"strength": 15, "stamina": 10, "mood": 10}
+
+# Apply pet mutations as single conditional UPDATE ... RETURNING statements
+# (see crud_atomic.py). Set ATOMIC_PET_UPDATES=false to use the ORM
+# read-modify-write path instead, e.g. for comparison.
+ATOMIC_PET_UPDATES = os.getenv("ATOMIC_PET_UPDATES", "true").lower() in ("1", "true", "yes")
+
+def update_user_pet(db: Session, user_id: str, update_data: schemas.PetUpdate):
+    """update_pet for the user's pet; None if the user has no pet."""
+    pet = get_pet_by_user_id(db, user_id)
+    if pet is None:
+        return None
+    return update_pet(db, pet, update_data)
 
 def update_pet(db: Session, pet: models.Pet, update_data: schemas.PetUpdate):
     """
     Generic update function that allows updating any pet attribute.
     For strength/stamina/mood updates, uses the same logic as update_pet_stats.
     """
+    if ATOMIC_PET_UPDATES:
+        return crud_atomic.update_pet(db, pet, update_data)
+
     update_dict = update_data.dict(exclude_unset=True)
     
     # Separate stat updates (strength, stamina, mood) from other updates
@@ -147,9 +135,8 @@ def update_pet(db: Session, pet: models.Pet, update_data: schemas.PetUpdate):
         )
         return result["pet"]
     
-    # If only non-stat updates, just commit
-    db.commit()
-    db.refresh(pet)
+    # If only non-stat updates, just flush
+    db.flush()
     return pet
 
 def update_pet_stats(db: Session, pet: models.Pet, 
@@ -162,55 +149,16 @@ def update_pet_stats(db: Session, pet: models.Pet,
     - Mood: Increases with exercise
     - Stamina: 0-900 range (reset daily)
     """
+    if ATOMIC_PET_UPDATES:
+        return crud_atomic.update_pet_stats(db, pet, strength, stamina, mood)
+
     try:
-        # Check if at a breakthrough level and breakthrough not completed
-        needs_breakthrough = (pet.level % 5 == 0) and (pet.level >= 5) and not pet.breakthrough_completed
-        
-        if needs_breakthrough and strength > 0:
-            # Cannot gain strength without breakthrough - return warning
-            # Strength gains are blocked
-            strength = 0
-            # Still update stamina and mood
-            pet.stamina = max(0, min(MAX_STAMINA, pet.stamina + stamina))
-            pet.mood = max(0, min(100, pet.mood + mood))
-            db.commit()
-            db.refresh(pet)
-            return {"pet": pet, "breakthrough_required": True}
-        
-        # Apply strength gains
-        pet.strength += strength
-        
-        # Check for level up (120 strength points = 1 level)
-        while pet.strength >= STRENGTH_PER_LEVEL and pet.level < MAX_LEVEL:
-            pet.strength -= STRENGTH_PER_LEVEL
-            pet.level += 1
-            
-            # Reset stamina to full on level up
-            pet.stamina = MAX_STAMINA
-            pet.mood += 10  # Bonus mood on level up
-            
-            # Check if new level requires breakthrough
-            if pet.level % 5 == 0 and pet.level >= 5:
-                pet.breakthrough_completed = False
-                # Stop further leveling until breakthrough
-                break
-        
-        # Cap strength at max for current level if at breakthrough
-        if pet.level % 5 == 0 and pet.level >= 5 and not pet.breakthrough_completed:
-            pet.strength = 0
-        
-        # Update other stats
-        pet.stamina = max(0, min(MAX_STAMINA, pet.stamina + stamina))
-        pet.mood = max(0, min(100, pet.mood + mood))
-        
-        # Update growth stage based on level and breakthrough status
-        pet.stage = get_stage_for_level(pet.level, pet.breakthrough_completed)
-        
-        db.commit()
-        db.refresh(pet)
-        return {"pet": pet, "breakthrough_required": False}
+        state = PetState.from_object(pet)
+        breakthrough_required = pet_rules.apply_stats(state, strength, stamina, mood)
+        state.write_to(pet)
+        db.flush()
+        return {"pet": pet, "breakthrough_required": breakthrough_required}
     except Exception as e:
-        db.rollback()
         print(f"Error in update_pet_stats: {e}")
         raise e
 
@@ -227,6 +175,9 @@ def log_exercise(db: Session, user_id: str, log: schemas.ExerciseLogCreate):
     - Mood increase: 5 per exercise session
     - Accumulate daily exercise time and steps
     """
+    if ATOMIC_PET_UPDATES:
+        return crud_atomic.log_exercise(db, user_id, log)
+
     try:
         pet = get_pet_by_user_id(db, user_id)
         if not pet:
@@ -238,19 +189,20 @@ def log_exercise(db: Session, user_id: str, log: schemas.ExerciseLogCreate):
             pet_id=pet.id
         )
         db.add(db_log)
+        add_to_daily_rollup(db, user_id, [log], pet.timezone)
         
         # Accumulate daily exercise time and steps
         pet.daily_exercise_seconds += log.duration_seconds
         pet.daily_steps += log.steps
         
-        # NOTE: 不再直接在這裡翻轉 daily_quest_X_completed 的布林旗標（避免語意混淆）。
+        # NOTE: 不再直接在這裡設定每日任務的領取狀態（避免語意混淆）。
         # 判定是否可以領獎改由 claim_daily_quest_reward 在領取時檢查 daily_exercise_seconds / daily_steps。
         
         # Calculate pet stat changes based on exercise duration
         # 10 seconds = 1 strength point
-        strength_gain = log.duration_seconds // 10
-        stamina_cost = -10
-        mood_gain = 5
+        strength_gain = log.duration_seconds // SECONDS_PER_STRENGTH_POINT
+        stamina_cost = -EXERCISE_STAMINA_COST
+        mood_gain = EXERCISE_MOOD_GAIN
 
         result = update_pet_stats(
             db=db,
@@ -262,143 +214,179 @@ def log_exercise(db: Session, user_id: str, log: schemas.ExerciseLogCreate):
         
         return result
     except Exception as e:
-        db.rollback()
         print(f"Error in log_exercise: {e}")
         raise e
 
+def get_exercise_logs(db: Session, user_id: str, cursor: str = None,
+                      limit: int = pagination.DEFAULT_PAGE_SIZE):
+    """One page of the user's exercise logs, newest first. Returns (logs, next_cursor)."""
+    log = models.ExerciseLog
+    return pagination.paginate(
+        db, select(log).where(log.user_id == user_id),
+        [log.id], cursor, limit
+    )
+
+def add_to_daily_rollup(db: Session, user_id: str, logs: List[schemas.ExerciseLogCreate],
+                        timezone_name: str = None):
+    """Upsert the user's daily_exercise_rollup row for their local today with the given sessions."""
+    rollup = models.DailyExerciseRollup.__table__
+    stmt = crud_atomic.dialect_insert(db, rollup).values(
+        user_id=user_id,
+        day=datetime.now(get_zone(timezone_name)).date(),
+        seconds=sum(log.duration_seconds for log in logs),
+        steps=sum(log.steps for log in logs),
+        strength_points=sum(log.duration_seconds // SECONDS_PER_STRENGTH_POINT for log in logs),
+        sessions=len(logs)
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[rollup.c.user_id, rollup.c.day],
+        set_={
+            column: rollup.c[column] + stmt.excluded[column]
+            for column in ["seconds", "steps", "strength_points", "sessions"]
+        }
+    ))
+
+MAX_EXERCISE_BATCH_SIZE = 1000  # Sessions accepted per batch request
+
+# Pet columns written back by log_exercise_batch
+EXERCISE_BATCH_COLUMNS = [
+    "strength", "stamina", "mood", "level", "stage", "breakthrough_completed",
+    "daily_exercise_seconds", "daily_steps"
+]
+
+def log_exercise_batch(db: Session, user_id: str, logs: List[schemas.ExerciseLogCreate]):
+    """
+    Log many exercise sessions at once (e.g. sessions queued while offline).
+
+    Sessions are applied in order with the same rules as log_exercise, but the
+    pet row is locked and read once, all stat changes are folded in memory, the
+    logs are bulk-inserted and the final pet is written with a single UPDATE,
+    all in one transaction.
+
+    Returns the final pet and the outcome of each session.
+    """
+    try:
+        pets = models.Pet.__table__
+        row = db.execute(
+            select(pets).where(pets.c.owner_id == user_id).with_for_update()
+        ).mappings().first()
+        if row is None:
+            return None
+
+        pet = dict(row)
+        state = PetState.from_dict(pet)
+        results = []
+        for index, log in enumerate(logs):
+            level_before = state.level
+            pet["daily_exercise_seconds"] += log.duration_seconds
+            pet["daily_steps"] += log.steps
+            strength_gain = log.duration_seconds // SECONDS_PER_STRENGTH_POINT
+            blocked = pet_rules.apply_stats(state, strength_gain, -EXERCISE_STAMINA_COST, EXERCISE_MOOD_GAIN)
+            results.append({
+                "index": index,
+                "strength_gain": 0 if blocked else strength_gain,
+                "level": state.level,
+                "levels_gained": state.level - level_before,
+                "breakthrough_required": blocked
+            })
+        pet.update(state.as_dict())
+
+        if logs:
+            db.execute(insert(models.ExerciseLog.__table__), [
+                {**log.dict(), "user_id": user_id, "pet_id": pet["id"]}
+                for log in logs
+            ])
+            add_to_daily_rollup(db, user_id, logs, pet["timezone"])
+            pet = dict(db.execute(
+                update(pets)
+                .where(pets.c.id == pet["id"])
+                .values({column: pet[column] for column in EXERCISE_BATCH_COLUMNS})
+                .returning(*pets.c)
+            ).mappings().first())
+            leaderboard.track(db, pet)
+            pet_cache.track(db, pet)
+
+        return {"pet": pet, "results": results}
+    except Exception as e:
+        print(f"Error in log_exercise_batch: {e}")
+        raise e
+
 # ==================
 # Daily Quest System (Independent)
 # ==================
 
-# Daily quest definitions
-DAILY_QUEST_DEFINITIONS = [
-    {
-        "id": 1,
-        "title": "每日登入",
-        "description": "今天第一次登入遊戲",
-        "reward_strength": 10,
-        "reward_stamina": 20,
-        "reward_mood": 5
-    },
-    {
-        "id": 2,
-        "title": "運動十分鐘",
-        "description": "累積運動時間達到10分鐘",
-        "reward_strength": 30,
-        "reward_stamina": 15,
-        "reward_mood": 10
-    },
-    {
-        "id": 3,
-        "title": "走路5000步",
-        "description": "今日累積走路5000步",
-        "reward_strength": 50,
-        "reward_stamina": 20,
-        "reward_mood": 15
-    }
-]
-
 def get_daily_quest_status(db: Session, user_id: str):
     """Get current status of all daily quests (simplified for frontend)
 
     Returns both 'claimed' (True = already claimed) and 'claimable' (True = can claim now)
     """
-    pet = get_pet_by_user_id(db, user_id)
+    pet = get_pet_state(db, user_id)
     if not pet:
         return None
-    
-    # We treat pet.daily_quest_X_completed as 'claimed' flags (True = already claimed).
-    quest1_claimed = bool(pet.daily_quest_1_completed)
-    quest2_claimed = bool(pet.daily_quest_2_completed)
-    quest3_claimed = bool(pet.daily_quest_3_completed)
-    
-    # Compute claimable based on progress and claimed flags
-    quest1_claimable = (not quest1_claimed)  # quest1: daily login; perform_daily_check should set ready
-    quest2_claimable = (not quest2_claimed) and (pet.daily_exercise_seconds >= 600)
-    quest3_claimable = (not quest3_claimed) and (pet.daily_steps >= 5000)
-    
-    return {
-        "quest_1_claimed": quest1_claimed,
-        "quest_1_claimable": quest1_claimable,
-        "quest_2_claimed": quest2_claimed,
-        "quest_2_claimable": quest2_claimable,
-        "quest_3_claimed": quest3_claimed,
-        "quest_3_claimable": quest3_claimable
-    }
+    return daily_quest_status(pet)
+
+def daily_quest_status(pet: dict):
+    """Daily quest status for a pet state dict (see get_pet_state)."""
+    return daily_quests.registry.status(pet)
 
 def get_daily_stats(db: Session, user_id: str):
     """Get user's daily exercise statistics"""
-    pet = get_pet_by_user_id(db, user_id)
+    pet = get_pet_state(db, user_id)
     if not pet:
         return None
-    
+    return daily_stats(pet)
+
+def daily_stats(pet: dict):
+    """Daily exercise statistics for a pet state dict (see get_pet_state)."""
     return {
-        "daily_exercise_seconds": pet.daily_exercise_seconds,
-        "daily_steps": pet.daily_steps,
-        "last_reset_date": pet.last_reset_date
+        "daily_exercise_seconds": pet["daily_exercise_seconds"],
+        "daily_steps": pet["daily_steps"],
+        "last_reset_date": pet["last_reset_date"]
     }
 
 def claim_daily_quest_reward(db: Session, user_id: str, quest_id: int):
     """Claim reward for a completed daily quest (can only claim once)
 
     Semantics:
-    - pet.daily_quest_X_completed is used as 'claimed' flag (True = already claimed).
-    - To be claimable:
-      - quest 1: allowed if not already claimed (login quest; perform_daily_check resets claimed -> False daily)
-      - quest 2: pet.daily_exercise_seconds >= 600 and not claimed
-      - quest 3: pet.daily_steps >= 5000 and not claimed
+    - pet.daily_quests_claimed has the quest's bit set once claimed today
+      (the daily reset clears it).
+    - A quest is claimable if not claimed yet and its goal, if any, is met
+      (see daily_quests.py).
     """
+    if ATOMIC_PET_UPDATES:
+        return crud_atomic.claim_daily_quest_reward(db, user_id, quest_id)
+
     try:
         pet = get_pet_by_user_id(db, user_id)
         if not pet:
             return None
         
-        # Quest 1: daily login
-        if quest_id == 1:
-            if pet.daily_quest_1_completed:
-                return {"success": False, "message": "Quest already claimed"}
-            # Claim is allowed (perform_daily_check should set daily_quest_1_completed = False at reset)
-            pet.daily_quest_1_completed = True
-            quest_def = DAILY_QUEST_DEFINITIONS[0]
-        elif quest_id == 2:
-            # Need to ensure exercise threshold met
-            if pet.daily_quest_2_completed:
-                return {"success": False, "message": "Quest already claimed"}
-            if pet.daily_exercise_seconds < 600:
-                return {"success": False, "message": "Exercise requirement not met"}
-            pet.daily_quest_2_completed = True
-            quest_def = DAILY_QUEST_DEFINITIONS[1]
-        elif quest_id == 3:
-            if pet.daily_quest_3_completed:
-                return {"success": False, "message": "Quest already claimed"}
-            if pet.daily_steps < 5000:
-                return {"success": False, "message": "Step requirement not met"}
-            pet.daily_quest_3_completed = True
-            quest_def = DAILY_QUEST_DEFINITIONS[2]
-        else:
+        quest = daily_quests.registry.get(quest_id)
+        if quest is None:
             return {"success": False, "message": "Invalid quest ID"}
-        
-        # Apply rewards (update_pet_stats will commit and refresh pet)
+        claimed_mask = pet.daily_quests_claimed or 0
+        if claimed_mask & quest.bit:
+            return {"success": False, "message": "Quest already claimed"}
+        if quest.metric and not quest.met({quest.metric: getattr(pet, quest.metric)}):
+            return {"success": False, "message": quest.unmet_message}
+        pet.daily_quests_claimed = claimed_mask | quest.bit
+        
+        # Apply rewards (update_pet_stats will flush the pet)
         result = update_pet_stats(
             db=db,
             pet=pet,
-            strength=quest_def["reward_strength"],
-            stamina=quest_def["reward_stamina"],
-            mood=quest_def["reward_mood"]
+            strength=quest.reward_strength,
+            stamina=quest.reward_stamina,
+            mood=quest.reward_mood
         )
         
         return {
             "success": True,
-            "message": f"Claimed reward for {quest_def['title']}",
+            "message": f"Claimed reward for {quest.title}",
             "pet": result["pet"],
-            "rewards": {
-                "strength": quest_def["reward_strength"],
-                "stamina": quest_def["reward_stamina"],
-                "mood": quest_def["reward_mood"]
-            }
+            "rewards": quest.rewards
         }
     except Exception as e:
-        db.rollback()
         print(f"Error in claim_daily_quest_reward: {e}")
         raise e
 
@@ -406,65 +394,79 @@ def claim_daily_quest_reward(db: Session, user_id: str, quest_id: int):
 # Quest
 # ==================
 
-# Simple daily quest system
+# Simple daily quest system, with the same quests and rewards as the daily quest registry
 QUEST_TEMPLATES = [
-    {"title": "每日登入", "description": "今天第一次登入遊戲", "reward_mood": 5, "reward_stamina": 10, "reward_strength": 0},
-    {"title": "運動十分鐘", "description": "累積運動時間達到10分鐘", "reward_strength": 20, "reward_stamina": 10, "reward_mood": 0},
-    {"title": "走路5000步", "description": "今日累積走路5000步", "reward_strength": 30, "reward_mood": 10, "reward_stamina": 0},
+    {
+        "title": quest.title,
+        "description": quest.description,
+        "reward_strength": quest.reward_strength,
+        "reward_stamina": quest.reward_stamina,
+        "reward_mood": quest.reward_mood,
+    }
+    for quest in daily_quests.registry
 ]
 
+def seed_quest_templates(db: Session):
+    """Ensure the QUEST_TEMPLATES rows exist and are current; the quest template registry reloads them on commit."""
+    quest_templates.registry.seed(db, QUEST_TEMPLATES)
+
+USER_QUEST_COLUMNS = ("id", "quest_id", "user_id", "date", "is_completed")
+
+def _user_quest_response(db: Session, user_quest: dict) -> dict:
+    """schemas.UserQuest as a dict, with the nested quest from the template registry."""
+    return {
+        **{column: user_quest[column] for column in USER_QUEST_COLUMNS},
+        "quest": quest_templates.registry.get(db, user_quest["quest_id"]),
+    }
+
 def get_or_create_daily_quests(db: Session, user_id: str):
+    """The user's quests for their local today, generating them on the first call of the day."""
     try:
-        # Check if quests for today have been generated (simplified logic)
-        today_quests = db.query(models.UserQuest).filter(
-            models.UserQuest.user_id == user_id,
-            # Should add date filtering: (func.date(models.UserQuest.date) == datetime.date.today())
-        ).all()
-        
-        if today_quests:
-            return today_quests
-
-        # First time or new day, generate new quests
-        # Batch process: collect all quests first, then commit once
-        quests_to_create = []
-        for quest_template in QUEST_TEMPLATES:
-            # Ensure the quest exists in the Quest table
-            q = db.query(models.Quest).filter(models.Quest.title == quest_template["title"]).first()
-            if not q:
-                q = models.Quest(**quest_template)
-                db.add(q)
-                quests_to_create.append(("new", q, quest_template))
-            else:
-                quests_to_create.append(("existing", q, quest_template))
-        
-        # Commit new quests if any
-        if any(status == "new" for status, _, _ in quests_to_create):
-            db.commit()
-            # Refresh new quests
-            for status, q, _ in quests_to_create:
-                if status == "new":
-                    db.refresh(q)
-        
-        # Create all user quest entries
-        new_user_quests = []
-        for _, q, _ in quests_to_create:
-            uq = models.UserQuest(quest_id=q.id, user_id=user_id)
-            db.add(uq)
-            new_user_quests.append(uq)
-        
-        # Single commit for all user quests
-        db.commit()
-        
-        # Load relationships
-        for uq in new_user_quests:
-            db.refresh(uq) # Load the 'quest' relationship
-            
-        return new_user_quests
+        user_quests = models.UserQuest.__table__
+        columns = [user_quests.c[column] for column in USER_QUEST_COLUMNS]
+
+        # Today's quests only, using the (user_id, date) index
+        pet = get_pet_state(db, user_id)
+        today_start = local_day_start(get_zone(pet["timezone"] if pet else None), datetime.now(timezone.utc))
+        today_quests = db.execute(
+            select(*columns)
+            .where(user_quests.c.user_id == user_id, user_quests.c.date >= today_start)
+            .order_by(user_quests.c.id)
+        ).mappings().all()
+
+        if not today_quests:
+            # First time or new day, generate all of today's quests in one statement
+            quest_ids = quest_templates.registry.ids(db, QUEST_TEMPLATES)
+            today_quests = db.execute(
+                insert(user_quests)
+                .values([{"quest_id": quest_id, "user_id": user_id, "is_completed": False} for quest_id in quest_ids])
+                .returning(*columns)
+            ).mappings().all()
+
+        return [_user_quest_response(db, user_quest) for user_quest in today_quests]
     except Exception as e:
-        db.rollback()
         print(f"Error in get_or_create_daily_quests: {e}")
         raise e
 
+def get_user_quests(db: Session, user_id: str, cursor: str = None,
+                    limit: int = pagination.DEFAULT_PAGE_SIZE):
+    """
+    One page of the user's quests, newest first (today's quests lead the first
+    page), generating today's quests when the first page is requested.
+    Returns (user_quests, next_cursor).
+    """
+    if not cursor:
+        get_or_create_daily_quests(db, user_id)
+    uq = models.UserQuest
+    user_quests, next_cursor = pagination.paginate(
+        db, select(uq).where(uq.user_id == user_id),
+        [uq.id], cursor, limit
+    )
+    return [
+        _user_quest_response(db, {column: getattr(user_quest, column) for column in USER_QUEST_COLUMNS})
+        for user_quest in user_quests
+    ], next_cursor
+
 def complete_quest(db: Session, user_id: str, user_quest_id: int):
     try:
         uq = db.query(models.UserQuest).filter(
@@ -477,29 +479,45 @@ def complete_quest(db: Session, user_id: str, user_quest_id: int):
         
         # Mark quest as completed
         uq.is_completed = True
-        db.commit()  # Commit the quest completion first
+        db.flush()  # Write the quest completion first
         
         # Apply rewards
+        quest = quest_templates.registry.get(db, uq.quest_id)
         pet = get_pet_by_user_id(db, user_id)
         result = update_pet_stats(
             db=db,
             pet=pet,
-            strength=uq.quest.reward_strength,
-            stamina=uq.quest.reward_stamina,
-            mood=uq.quest.reward_mood
+            strength=quest["reward_strength"],
+            stamina=quest["reward_stamina"],
+            mood=quest["reward_mood"]
         )
         
-        # No need to commit again - update_pet_stats already commits
-        return result
+        # No need to flush again - update_pet_stats already flushes
+        return {"success": True, **result}
     except Exception as e:
-        db.rollback()
         print(f"Error in complete_quest: {e}")
         raise e
 
 # ==================
-# Travel & Leaderboard
+# Daily Check
 # ==================
 
+def get_zone(name: str) -> ZoneInfo:
+    """ZoneInfo for an IANA time zone name, falling back to DEFAULT_TIMEZONE."""
+    try:
+        return ZoneInfo(name or models.DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(models.DEFAULT_TIMEZONE)
+
+def local_day_start(zone: ZoneInfo, now: datetime) -> datetime:
+    """Local midnight (in `zone`) of the day containing `now`, as an aware UTC datetime."""
+    local_date = now.astimezone(zone).date()
+    return datetime.combine(local_date, time.min, tzinfo=zone).astimezone(timezone.utc)
+
+def as_utc(value: datetime) -> datetime:
+    """Timestamps read back without tzinfo (SQLite) are stored in UTC."""
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
 def perform_daily_check(db: Session, user_id: str):
     """
     Perform daily check at 00:00 to verify if user exercised enough yesterday.
@@ -513,66 +531,43 @@ def perform_daily_check(db: Session, user_id: str):
         return None
     
     try:
-        now = datetime.now()
-        today_start = datetime.combine(date.today(), time.min)
-        
-        # Check if daily check already performed today
-        if pet.last_daily_check:
-            pet_check_date = pet.last_daily_check
-            if pet_check_date.tzinfo is None:
-                pet_check_date = pet_check_date.replace(tzinfo=None)
-                today_start = today_start.replace(tzinfo=None)
-            
-            if pet_check_date.date() >= today_start.date():
-                # Already checked today, just refresh pet and return
-                db.refresh(pet)
-                return {
-                    "pet": pet, 
-                    "already_checked": True, 
-                    "met_requirement": True,
-                    "total_strength_yesterday": 0
-                }
-        
-        # Get yesterday's exercise logs
-        yesterday_start = today_start - timedelta(days=1)
-        yesterday_exercises = db.query(models.ExerciseLog).filter(
-            models.ExerciseLog.user_id == user_id,
-            models.ExerciseLog.created_at >= yesterday_start,
-            models.ExerciseLog.created_at < today_start
-        ).all()
-        
-        # Calculate total strength points gained yesterday (10 seconds = 1 point)
-        total_strength_yesterday = sum(log.duration_seconds // 10 for log in yesterday_exercises)
+        now = datetime.now(timezone.utc)
+        zone = get_zone(pet.timezone)
+        today_start = local_day_start(zone, now)
+        
+        # Check if daily check already performed today (owner's local day).
+        # Usually the nightly reset job (daily_reset.py) has already done it.
+        if pet.last_daily_check and as_utc(pet.last_daily_check) >= today_start:
+            # Already checked today, nothing to write
+            return {
+                "pet": pet, 
+                "already_checked": True, 
+                "met_requirement": True,
+                "total_strength_yesterday": 0
+            }
         
-        # Check if met minimum requirement (60 points = 10 minutes)
-        met_requirement = total_strength_yesterday >= MIN_DAILY_STRENGTH
+        # Get yesterday's strength points (10 seconds = 1 point) from the daily rollup
+        yesterday = today_start.astimezone(zone).date() - timedelta(days=1)
+        rollup = db.get(models.DailyExerciseRollup, (user_id, yesterday))
+        total_strength_yesterday = rollup.strength_points if rollup else 0
         
-        # Reset stamina to 900 for the new day
-        pet.stamina = MAX_STAMINA
+        # Refill stamina; mood (and strength) drop if the minimum was not met
+        state = PetState.from_object(pet)
+        met_requirement = pet_rules.start_new_day(state, total_strength_yesterday)
+        state.write_to(pet)
         
         # Reset daily exercise tracking
         pet.daily_exercise_seconds = 0
         pet.daily_steps = 0
         pet.last_reset_date = now
         
-        # Reset daily quest claimed flags (False means not yet claimed for the new day)
-        pet.daily_quest_1_completed = False  # Quest 1: 每日登入 (not claimed yet)
-        pet.daily_quest_2_completed = False  # Quest 2: 運動十分鐘 (not claimed yet)
-        pet.daily_quest_3_completed = False  # Quest 3: 走路5000步 (not claimed yet)
-        
-        if not met_requirement:
-            # Didn't meet requirement - decrease mood
-            pet.mood = max(0, pet.mood - 10)
-            
-            # If mood reaches 0 and strength > 0, decrease strength
-            if pet.mood == 0 and pet.strength > 0:
-                pet.strength = max(0, pet.strength - 10)
+        # Nothing claimed yet for the new day
+        pet.daily_quests_claimed = 0
         
         # Update last daily check timestamp
         pet.last_daily_check = now
         
-        db.commit()
-        db.refresh(pet)
+        db.flush()
         
         return {
             "pet": pet, 
@@ -581,7 +576,6 @@ def perform_daily_check(db: Session, user_id: str):
             "total_strength_yesterday": total_strength_yesterday
         }
     except Exception as e:
-        db.rollback()
         # Log the error for debugging
         print(f"Error in perform_daily_check: {e}")
         raise e
@@ -591,30 +585,25 @@ def complete_breakthrough(db: Session, user_id: str):
     Complete breakthrough by traveling to an attraction.
     This allows the pet to continue leveling past level 5, 10, 15, 20.
     """
+    if ATOMIC_PET_UPDATES:
+        return crud_atomic.complete_breakthrough(db, user_id)
+
     try:
         pet = get_pet_by_user_id(db, user_id)
         if not pet:
             return None
         
-        # Check if at a breakthrough level
-        if pet.level % 5 != 0 or pet.level < 5:
-            return {"success": False, "message": "Not at a breakthrough level"}
-        
-        if pet.breakthrough_completed:
-            return {"success": False, "message": "Breakthrough already completed for this level"}
+        # Mark breakthrough as completed and update the stage
+        state = PetState.from_object(pet)
+        error = pet_rules.complete_breakthrough(state)
+        if error:
+            return {"success": False, "message": error}
+        state.write_to(pet)
         
-        # Mark breakthrough as completed
-        pet.breakthrough_completed = True
-        
-        # Update stage after breakthrough
-        pet.stage = get_stage_for_level(pet.level, pet.breakthrough_completed)
-        
-        db.commit()
-        db.refresh(pet)
+        db.flush()
         
         return {"success": True, "pet": pet, "message": "Breakthrough completed!"}
     except Exception as e:
-        db.rollback()
         print(f"Error in complete_breakthrough: {e}")
         raise e
 
@@ -623,10 +612,14 @@ def complete_breakthrough(db: Session, user_id: str):
 # ==================
 
 TAIPEI_ATTRACTIONS = [
-    {"name": "Taipei 101", "description": "Once the world's tallest building"},
-    {"name": "National Palace Museum", "description": "Home to a vast collection of Chinese artifacts"},
-    {"name": "Longshan Temple", "description": "A popular and historic temple"},
-    {"name": "Yangmingshan National Park", "description": "The 'backyard' of Taipei City"},
+    {"name": "Taipei 101", "description": "Once the world's tallest building",
+     "latitude": 25.0339, "longitude": 121.5645},
+    {"name": "National Palace Museum", "description": "Home to a vast collection of Chinese artifacts",
+     "latitude": 25.1024, "longitude": 121.5485},
+    {"name": "Longshan Temple", "description": "A popular and historic temple",
+     "latitude": 25.0372, "longitude": 121.4999},
+    {"name": "Yangmingshan National Park", "description": "The 'backyard' of Taipei City",
+     "latitude": 25.1551, "longitude": 121.5480},
 ]
 
 # Ensure attractions exist in the DB
@@ -635,15 +628,42 @@ def seed_attractions(db: Session):
         for att in TAIPEI_ATTRACTIONS:
             db_att = models.Attraction(
                 name=att["name"], 
-                description=att["description"]
+                description=att["description"],
+                latitude=att["latitude"],
+                longitude=att["longitude"]
             )
             db.add(db_att)
-        db.commit()
+        db.flush()
+
+def get_attraction_catalog(db: Session):
+    """Current attraction catalog snapshot (see attractions.py)."""
+    return attractions.attraction_catalog.get(db)
+
+def get_attractions(db: Session):
+    return list(get_attraction_catalog(db).attractions)
 
 def get_random_attraction(db: Session):
-    seed_attractions(db) # Ensure data exists
-    attractions = db.query(models.Attraction).all()
-    return random.choice(attractions) if attractions else None
+    catalog = get_attraction_catalog(db)
+    if not catalog.attractions:
+        seed_attractions(db) # Ensure data exists
+        # The catalog only picks up the seeded rows once the request commits
+        seeded = db.query(models.Attraction).all()
+        return random.choice(seeded) if seeded else None
+    return attractions.attraction_catalog.random_attraction(catalog)
+
+def get_travel_quest(db: Session, user_id: str):
+    """
+    (pet state, random attraction) for starting a breakthrough travel quest.
+    The attraction is None when there is no pet or it has no breakthrough pending.
+    """
+    pet = get_pet_state(db, user_id)
+    if pet is None or not pet_rules.needs_breakthrough(pet["level"], pet["breakthrough_completed"]):
+        return pet, None
+    return pet, get_random_attraction(db)
+
+def get_nearby_attractions(db: Session, lat: float, lng: float, radius_m: float, limit: int):
+    catalog = get_attraction_catalog(db)
+    return attractions.attraction_catalog.nearby(lat, lng, radius_m, limit, catalog)
 
 def get_leaderboard_by_level(db: Session, limit: int = 10):
     return db.query(models.Pet, models.User.id)\
@@ -656,56 +676,60 @@ def get_leaderboard_by_level(db: Session, limit: int = 10):
 # Travel Checkins (Location-based quests)
 # ==================
 
-def get_user_travel_checkins(db: Session, user_id: str):
-    "Get all travel checkins for a user"
-    return db.query(models.TravelCheckin).filter(models.TravelCheckin.user_id == user_id).order_by(models.TravelCheckin.completed_at.desc()).all()
+def get_user_travel_checkins(db: Session, user_id: str, cursor: str = None,
+                             limit: int = pagination.DEFAULT_PAGE_SIZE):
+    "Get one page of a user's travel checkins, newest first. Returns (checkins, next_cursor)."
+    checkin = models.TravelCheckin
+    return pagination.paginate(
+        db, select(checkin).where(checkin.user_id == user_id),
+        [checkin.id], cursor, limit
+    )
+
+def insert_travel_checkin(db: Session, user_id: str, checkin: schemas.TravelCheckinCreate):
+    """
+    Insert the checkin if the user has a pet and has not checked in at this
+    location yet, as a single INSERT ... ON CONFLICT DO NOTHING RETURNING.
+    Returns the new row, or None. A concurrent duplicate waits on the unique
+    (user_id, quest_id) index and then gets None.
+    """
+    checkins = models.TravelCheckin.__table__
+    pets = models.Pet.__table__
+    values = select(
+        literal(user_id), literal(checkin.quest_id), literal(checkin.lat), literal(checkin.lng)
+    ).where(exists().where(pets.c.owner_id == user_id))
+    stmt = crud_atomic.dialect_insert(db, checkins).from_select(
+        ["user_id", "quest_id", "lat", "lng"], values
+    ).on_conflict_do_nothing(index_elements=["user_id", "quest_id"]).returning(*checkins.c)
+    row = db.execute(stmt).mappings().first()
+    return dict(row) if row else None
 
 def create_travel_checkin(db: Session, user_id: str, checkin: schemas.TravelCheckinCreate):
     "Create a new travel checkin and reward the pet."
+    if ATOMIC_PET_UPDATES:
+        return crud_atomic.create_travel_checkin(db, user_id, checkin)
+
     try:
         pet = get_pet_by_user_id(db, user_id)
         if not pet:
             raise ValueError("Pet not found")
         
-        # Check if already checked in at this location
-        existing = db.query(models.TravelCheckin).filter(
-            models.TravelCheckin.user_id == user_id,
-            models.TravelCheckin.quest_id == checkin.quest_id
-        ).first()
-        if existing:
+        # Create checkin record; nothing is inserted if already checked in at this location
+        db_checkin = insert_travel_checkin(db, user_id, checkin)
+        if db_checkin is None:
             raise ValueError("Already checked in at this location")
         
-        # Create checkin record
-        db_checkin = models.TravelCheckin(
-            user_id=user_id, 
-            quest_id=checkin.quest_id, 
-            lat=checkin.lat, 
-            lng=checkin.lng
-        )
-        db.add(db_checkin)
-        db.commit()
-        db.refresh(db_checkin)
-        
         # Check if at a breakthrough level and auto-complete breakthrough
-        at_breakthrough = (pet.level % 5 == 0) and (pet.level >= 5) and not pet.breakthrough_completed
+        state = PetState.from_object(pet)
+        at_breakthrough = pet_rules.needs_breakthrough(state.level, state.breakthrough_completed)
         if at_breakthrough:
-            pet.breakthrough_completed = True
-            pet.stage = get_stage_for_level(pet.level, pet.breakthrough_completed)
-            db.commit()
-            db.refresh(pet)
+            pet_rules.complete_breakthrough(state)
         
-        # Apply rewards using update_pet_stats for proper level-up logic
-        # Give stamina reward for travel checkin
-        result = update_pet_stats(
-            db=db,
-            pet=pet,
-            strength=15,
-            stamina=10,  # Add stamina reward
-            mood=10
-        )
+        # Apply rewards with the level-up rules
+        pet_rules.apply_stats(state, **TRAVEL_CHECKIN_REWARD)
+        state.write_to(pet)
+        db.flush()
         
-        return {"pet": result["pet"], "checkin": db_checkin, "breakthrough_completed": at_breakthrough}
+        return {"pet": pet, "checkin": db_checkin, "breakthrough_completed": at_breakthrough}
     except Exception as e:
-        db.rollback()
         print(f"Error in create_travel_checkin: {e}")
         raise e
\ No newline at end of file
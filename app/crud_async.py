@@ -0,0 +1,203 @@
+"""
+Async versions of the CRUD functions in crud.py.
+
+Each function has the same name and arguments as its counterpart in crud.py
+and accepts either session flavour:
+- AsyncSession (USE_ASYNC_DB=true): the game logic in crud.py runs on the
+  session's asyncpg connection via run_sync, so the request only occupies the
+  event loop while it waits on Postgres - no worker thread is held.
+- Session (default): the call is handed to the AnyIO threadpool, which is the
+  same execution model as the previous sync route handlers.
+
+Keeping crud.py as the single implementation means both paths always apply the
+same rules. Results whose response model reads relationships (user.pet,
+user.exercise_logs, user_quest.quest) are serialized inside the session call,
+because lazy loads cannot run on the event loop.
+
+A sync Session keeps its pooled connection from its first statement until
+the commit, including between threadpool calls. A route must therefore make
+at most one run() call per request. Otherwise a request that holds a
+connection waits for a worker thread while the worker threads wait for
+connections. Work that needs several CRUD calls gets one function here or in
+crud.py that does them all in a single call.
+"""
+import time
+from typing import List
+
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from . import attractions, crud, pagination, pet_cache, pet_rules, schemas, server_timing
+
+async def run(db, fn, *args, **kwargs):
+    """Run a sync CRUD function with the given (sync or async) session."""
+    if server_timing.current() is None:
+        if isinstance(db, AsyncSession):
+            return await db.run_sync(fn, *args, **kwargs)
+        return await run_in_threadpool(fn, db, *args, **kwargs)
+
+    # Server-Timing: a "crud" span per function, plus the wait for a worker thread
+    name = fn.__name__ if fn.__name__ != "<lambda>" else None
+    if isinstance(db, AsyncSession):
+        with server_timing.span("crud", name):
+            return await db.run_sync(fn, *args, **kwargs)
+    queued = time.perf_counter()
+
+    def timed(*args, **kwargs):
+        server_timing.add("threadpool", time.perf_counter() - queued)
+        with server_timing.span("crud", name):
+            return fn(*args, **kwargs)
+    return await run_in_threadpool(timed, db, *args, **kwargs)
+
+# ==================
+# User
+# ==================
+
+def _user_response(db: Session, user, include_logs: bool = False):
+    # Bounded user shape: the pet plus, on request, only the latest page of logs
+    if user is None:
+        return None
+    pet = crud.get_pet_state(db, user.id)
+    logs = []
+    if include_logs:
+        logs, _ = crud.get_exercise_logs(db, user.id)
+    return schemas.User(
+        id=user.id,
+        created_at=user.created_at,
+        pet=schemas.Pet.model_validate(pet) if pet else None,
+        exercise_logs=[schemas.ExerciseLog.model_validate(log) for log in logs]
+    )
+
+async def get_user(db, user_id: str, include_logs: bool = False):
+    return await run(db, lambda s: _user_response(s, crud.get_user(s, user_id), include_logs))
+
+async def create_user(db, user: schemas.UserCreate):
+    return await run(db, lambda s: _user_response(s, crud.create_user(s, user)))
+
+# ==================
+# Pet
+# ==================
+
+async def get_pet_state(db, user_id: str):
+    # Cache hits are answered without leaving the event loop
+    pet = pet_cache.pet_cache.get(user_id)
+    if pet is not None:
+        return pet
+    return await run(db, crud.get_pet_state, user_id)
+
+async def update_user_pet(db, user_id: str, update_data: schemas.PetUpdate):
+    return await run(db, crud.update_user_pet, user_id, update_data)
+
+# ==================
+# Exercise
+# ==================
+
+async def log_exercise(db, user_id: str, log: schemas.ExerciseLogCreate):
+    return await run(db, crud.log_exercise, user_id, log)
+
+async def get_exercise_logs(db, user_id: str, cursor: str = None,
+                            limit: int = pagination.DEFAULT_PAGE_SIZE):
+    return await run(db, crud.get_exercise_logs, user_id, cursor, limit)
+
+async def log_exercise_batch(db, user_id: str, logs: List[schemas.ExerciseLogCreate]):
+    return await run(db, crud.log_exercise_batch, user_id, logs)
+
+# ==================
+# Daily Quest System (Independent)
+# ==================
+
+async def get_daily_quest_status(db, user_id: str):
+    pet = pet_cache.pet_cache.get(user_id)
+    if pet is not None:
+        return crud.daily_quest_status(pet)
+    return await run(db, crud.get_daily_quest_status, user_id)
+
+async def get_daily_stats(db, user_id: str):
+    pet = pet_cache.pet_cache.get(user_id)
+    if pet is not None:
+        return crud.daily_stats(pet)
+    return await run(db, crud.get_daily_stats, user_id)
+
+async def claim_daily_quest_reward(db, user_id: str, quest_id: int):
+    return await run(db, crud.claim_daily_quest_reward, user_id, quest_id)
+
+# ==================
+# Quest
+# ==================
+
+def _user_quests_response(db: Session, user_id: str):
+    quests = crud.get_or_create_daily_quests(db, user_id)
+    return [schemas.UserQuest.model_validate(uq) for uq in quests]
+
+async def get_or_create_daily_quests(db, user_id: str):
+    return await run(db, _user_quests_response, user_id)
+
+def _user_quests_page_response(db: Session, user_id: str, cursor: str, limit: int):
+    quests, next_cursor = crud.get_user_quests(db, user_id, cursor, limit)
+    return [schemas.UserQuest.model_validate(uq) for uq in quests], next_cursor
+
+async def get_user_quests(db, user_id: str, cursor: str = None,
+                          limit: int = pagination.DEFAULT_PAGE_SIZE):
+    return await run(db, _user_quests_page_response, user_id, cursor, limit)
+
+async def complete_quest(db, user_id: str, user_quest_id: int):
+    return await run(db, crud.complete_quest, user_id, user_quest_id)
+
+# ==================
+# Travel & Leaderboard
+# ==================
+
+async def perform_daily_check(db, user_id: str):
+    return await run(db, crud.perform_daily_check, user_id)
+
+async def complete_breakthrough(db, user_id: str):
+    return await run(db, crud.complete_breakthrough, user_id)
+
+async def get_attraction_catalog(db):
+    # Served from memory unless the catalog changed since it was last loaded
+    if not attractions.attraction_catalog.stale:
+        return attractions.attraction_catalog.snapshot()
+    return await run(db, crud.get_attraction_catalog)
+
+async def get_attractions(db):
+    return list((await get_attraction_catalog(db)).attractions)
+
+async def get_nearby_attractions(db, lat: float, lng: float, radius_m: float, limit: int):
+    catalog = await get_attraction_catalog(db)
+    return attractions.attraction_catalog.nearby(lat, lng, radius_m, limit, catalog)
+
+async def get_random_attraction(db):
+    catalog = attractions.attraction_catalog
+    if not catalog.stale:
+        snapshot = catalog.snapshot()
+        if snapshot.attractions:
+            return catalog.random_attraction(snapshot)
+    return await run(db, crud.get_random_attraction)
+
+async def get_travel_quest(db, user_id: str):
+    # Answered from the pet cache and the catalog when both are current,
+    # otherwise everything is read in one session call
+    pet = pet_cache.pet_cache.get(user_id)
+    catalog = attractions.attraction_catalog
+    if pet is not None and not catalog.stale:
+        if not pet_rules.needs_breakthrough(pet["level"], pet["breakthrough_completed"]):
+            return pet, None
+        snapshot = catalog.snapshot()
+        if snapshot.attractions:
+            return pet, catalog.random_attraction(snapshot)
+    return await run(db, crud.get_travel_quest, user_id)
+
+async def get_leaderboard_by_level(db, limit: int = 10):
+    return await run(db, crud.get_leaderboard_by_level, limit=limit)
+
+# ==================
+# Travel Checkins (Location-based quests)
+# ==================
+
+async def get_user_travel_checkins(db, user_id: str, cursor: str = None,
+                                   limit: int = pagination.DEFAULT_PAGE_SIZE):
+    return await run(db, crud.get_user_travel_checkins, user_id, cursor, limit)
+
+async def create_travel_checkin(db, user_id: str, checkin: schemas.TravelCheckinCreate):
+    return await run(db, crud.create_travel_checkin, user_id, checkin)
@@ -0,0 +1,396 @@
+"""
+Set-based pet mutations.
+
+These functions apply the same rules as pet_rules.py (used by the ORM code in
+crud.py), but as conditional UPDATE ... RETURNING statements against the pets row: clamping,
+level-up, the breakthrough gate and daily quest claim conditions are evaluated
+by the database. Concurrent requests for the same pet can no longer overwrite
+each other's changes, and each call costs one statement instead of a
+SELECT / UPDATE / COMMIT / SELECT chain.
+
+Pets are returned as plain dicts built from the RETURNING row.
+
+crud.py delegates here unless ATOMIC_PET_UPDATES is disabled.
+"""
+from sqlalchemy import Boolean, Integer, and_, case, cast, insert, literal, or_, select, true, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import FunctionElement
+
+from . import crud, daily_quests, leaderboard, models, pet_cache, pet_rules, schemas
+
+pets = models.Pet.__table__
+
+# ==================
+# SQL helpers
+# ==================
+
+class greatest(FunctionElement):
+    type = Integer()
+    inherit_cache = True
+
+class least(FunctionElement):
+    type = Integer()
+    inherit_cache = True
+
+@compiles(greatest)
+def _compile_greatest(element, compiler, **kw):
+    return "greatest(%s)" % compiler.process(element.clauses, **kw)
+
+@compiles(greatest, "sqlite")
+def _compile_greatest_sqlite(element, compiler, **kw):
+    # SQLite's multi-argument max() is a scalar function
+    return "max(%s)" % compiler.process(element.clauses, **kw)
+
+@compiles(least)
+def _compile_least(element, compiler, **kw):
+    return "least(%s)" % compiler.process(element.clauses, **kw)
+
+@compiles(least, "sqlite")
+def _compile_least_sqlite(element, compiler, **kw):
+    return "min(%s)" % compiler.process(element.clauses, **kw)
+
+def dialect_insert(db, table):
+    """INSERT construct with ON CONFLICT support for the session's (or connection's) dialect."""
+    bind = db.get_bind() if isinstance(db, Session) else db
+    if bind.dialect.name == "sqlite":
+        return sqlite.insert(table)
+    return postgresql.insert(table)
+
+def clamp(value, low, high):
+    return greatest(low, least(high, value))
+
+def needs_breakthrough(level, breakthrough_completed):
+    """Pet is at level 5, 10, 15, ... and has not done the breakthrough yet."""
+    interval = pet_rules.BREAKTHROUGH_INTERVAL
+    return and_(level % interval == 0, level >= interval, breakthrough_completed.is_not(true()))
+
+# pet_rules' stage tables keyed by level * 2 + (1 if breakthrough completed else 0)
+_STAGE_LOOKUP = {
+    level * 2 + completed: stage.name
+    for completed, table in (
+        (0, pet_rules.STAGE_BY_LEVEL_PENDING_BREAKTHROUGH),
+        (1, pet_rules.STAGE_BY_LEVEL),
+    )
+    for level, stage in enumerate(table)
+}
+
+def stage_for_level(level, breakthrough_completed):
+    """SQL version of pet_rules.stage_for_level: a lookup in the same stage tables."""
+    key = clamp(level, 0, pet_rules.MAX_LEVEL) * 2 + case((breakthrough_completed.is_(true()), 1), else_=0)
+    return cast(case(_STAGE_LOOKUP, value=key), pets.c.stage.type)
+
+def _base_columns(base):
+    columns = {
+        "strength": pets.c.strength,
+        "stamina": pets.c.stamina,
+        "mood": pets.c.mood,
+        "level": pets.c.level,
+        "breakthrough_completed": pets.c.breakthrough_completed,
+    }
+    columns.update(base or {})
+    return columns
+
+def stat_changes(strength, stamina, mood, base=None):
+    """
+    Column values for update_pet_stats when strength gains are not blocked.
+
+    The level-up loop is computed in closed form: the number of levels gained is
+    bounded by the available strength, MAX_LEVEL and the next breakthrough level.
+    `base` overrides the columns the rules start from (e.g. values set by the
+    same statement).
+    """
+    b = _base_columns(base)
+    total = b["strength"] + strength
+    levels = greatest(0, least(
+        total // pet_rules.STRENGTH_PER_LEVEL,
+        pet_rules.MAX_LEVEL - b["level"],
+        pet_rules.BREAKTHROUGH_INTERVAL - b["level"] % pet_rules.BREAKTHROUGH_INTERVAL
+    ))
+    leveled_up = levels > 0
+    level = b["level"] + levels
+    # Reaching a breakthrough level stops leveling until the breakthrough is done
+    breakthrough_completed = case(
+        (and_(leveled_up, level % pet_rules.BREAKTHROUGH_INTERVAL == 0), literal(False)),
+        else_=b["breakthrough_completed"]
+    )
+    return {
+        "level": level,
+        "breakthrough_completed": breakthrough_completed,
+        "strength": case(
+            (needs_breakthrough(level, breakthrough_completed), 0),
+            else_=total - levels * pet_rules.STRENGTH_PER_LEVEL
+        ),
+        # Stamina is refilled and mood gets a bonus on every level up
+        "stamina": clamp(
+            case((leveled_up, pet_rules.MAX_STAMINA), else_=b["stamina"]) + stamina,
+            0, pet_rules.MAX_STAMINA
+        ),
+        "mood": clamp(b["mood"] + levels * pet_rules.LEVEL_UP_MOOD_BONUS + mood, 0, pet_rules.MAX_MOOD),
+        "stage": stage_for_level(level, breakthrough_completed),
+    }
+
+def blocked_changes(stamina, mood, base=None):
+    """Column values for update_pet_stats when strength gains are blocked."""
+    b = _base_columns(base)
+    return {
+        "stamina": clamp(b["stamina"] + stamina, 0, pet_rules.MAX_STAMINA),
+        "mood": clamp(b["mood"] + mood, 0, pet_rules.MAX_MOOD),
+    }
+
+# ==================
+# Statements
+# ==================
+
+def _returning_pet(db: Session, stmt):
+    """Run an UPDATE ... RETURNING of a pets row; the row as a dict (None if none matched), tracked for the caches."""
+    row = db.execute(stmt).mappings().first()
+    if row is None:
+        return None
+    pet = dict(row)
+    outcome = {key: pet.pop(key) for key in list(pet) if key not in pets.c}
+    leaderboard.track(db, pet)
+    pet_cache.track(db, pet)
+    pet.update(outcome)
+    return pet
+
+def _update_pet(db: Session, where, values):
+    return _returning_pet(db, update(pets).where(*where).values(**values).returning(*pets.c))
+
+def _update_pet_deciding(db: Session, where, condition, values):
+    """
+    Update the pet matching `where` in one statement whose SET depends on
+    `condition` as it holds before the update, which RETURNING cannot see.
+
+    `values(decided)` builds the column values from `decided`, a boolean
+    expression to use in CASE. A CTE evaluates the condition once on the
+    current row (locking it on Postgres) and it is returned alongside the new
+    row. Returns (pet, condition held), or (None, False) if no pet matched.
+    """
+    decision = (
+        select(pets.c.id, condition.label("decided"))
+        .where(*where)
+        .with_for_update()
+        .cte("decision")
+        .prefix_with("MATERIALIZED")  # evaluated once, before the update
+    )
+    decided = select(decision.c.decided).scalar_subquery()
+    pet = _returning_pet(
+        db,
+        update(pets)
+        .where(pets.c.id.in_(select(decision.c.id)))
+        .values(**values(decided))
+        .returning(*pets.c, decided.label("decided"))
+    )
+    if pet is None:
+        return None, False
+    return pet, bool(pet.pop("decided"))
+
+def apply_pet_stats(db: Session, where, strength=0, stamina: int = 0, mood: int = 0,
+                    extra=None, base=None):
+    """
+    Apply update_pet_stats rules to the pet matching `where`, in one statement.
+
+    Returns (pet, breakthrough_required), or (None, False) if no pet matched.
+    A blocked strength gain keeps every column the normal rules would change
+    except stamina and mood, chosen per column with CASE.
+    """
+    extra = extra or {}
+    b = _base_columns(base)
+    gated = needs_breakthrough(b["level"], b["breakthrough_completed"])
+    if isinstance(strength, int):
+        blocked = gated if strength > 0 else None
+    else:
+        blocked = and_(gated, strength > 0)
+
+    if blocked is None:
+        return _update_pet(db, where, {**extra, **stat_changes(strength, stamina, mood, base)}), False
+
+    def values(is_blocked):
+        when_blocked = {**extra, **blocked_changes(stamina, mood, base)}
+        result = dict(extra)
+        for key, value in stat_changes(strength, stamina, mood, base).items():
+            result[key] = case((is_blocked, when_blocked.get(key, pets.c[key])), else_=value)
+        return result
+
+    return _update_pet_deciding(db, where, blocked, values)
+
+# ==================
+# Pet
+# ==================
+
+def update_pet(db: Session, pet: models.Pet, update_data: schemas.PetUpdate):
+    update_dict = update_data.dict(exclude_unset=True)
+    if not update_dict:
+        return pet
+    try:
+        stat_updates = {k: v for k, v in update_dict.items() if k in ["strength", "stamina", "mood"]}
+        other_updates = {k: v for k, v in update_dict.items() if k not in stat_updates}
+        where = [pets.c.id == pet.id]
+
+        if stat_updates:
+            # Values set by this request are the starting point for the stat rules
+            base = {
+                key: literal(value, Boolean if key == "breakthrough_completed" else Integer)
+                for key, value in other_updates.items()
+                if key in ["level", "breakthrough_completed"]
+            }
+            # Deltas from the current row to the requested values
+            deltas = {
+                key: literal(stat_updates[key]) - pets.c[key] if key in stat_updates else 0
+                for key in ["strength", "stamina", "mood"]
+            }
+            result, _ = apply_pet_stats(db, where, extra=other_updates, base=base, **deltas)
+        else:
+            result = _update_pet(db, where, other_updates)
+        return result
+    except Exception as e:
+        print(f"Error in update_pet: {e}")
+        raise e
+
+def update_pet_stats(db: Session, pet: models.Pet,
+                     strength: int = 0, stamina: int = 0, mood: int = 0):
+    try:
+        result, breakthrough_required = apply_pet_stats(
+            db, [pets.c.id == pet.id], strength, stamina, mood
+        )
+        return {"pet": result, "breakthrough_required": breakthrough_required}
+    except Exception as e:
+        print(f"Error in update_pet_stats: {e}")
+        raise e
+
+# ==================
+# Exercise
+# ==================
+
+def log_exercise(db: Session, user_id: str, log: schemas.ExerciseLogCreate):
+    try:
+        pet, breakthrough_required = apply_pet_stats(
+            db,
+            [pets.c.owner_id == user_id],
+            strength=log.duration_seconds // crud.SECONDS_PER_STRENGTH_POINT,
+            stamina=-crud.EXERCISE_STAMINA_COST,
+            mood=crud.EXERCISE_MOOD_GAIN,
+            extra={
+                "daily_exercise_seconds": pets.c.daily_exercise_seconds + log.duration_seconds,
+                "daily_steps": pets.c.daily_steps + log.steps,
+            }
+        )
+        if pet is None:
+            return None
+
+        db.execute(insert(models.ExerciseLog.__table__).values(
+            **log.dict(),
+            user_id=user_id,
+            pet_id=pet["id"]
+        ))
+        crud.add_to_daily_rollup(db, user_id, [log], pet["timezone"])
+        return {"pet": pet, "breakthrough_required": breakthrough_required}
+    except Exception as e:
+        print(f"Error in log_exercise: {e}")
+        raise e
+
+# ==================
+# Daily Quest System (Independent)
+# ==================
+
+def claim_daily_quest_reward(db: Session, user_id: str, quest_id: int):
+    try:
+        quest = daily_quests.registry.get(quest_id)
+        if quest is None:
+            if not db.execute(select(pets.c.id).where(pets.c.owner_id == user_id)).first():
+                return None
+            return {"success": False, "message": "Invalid quest ID"}
+
+        claimed = pets.c.daily_quests_claimed
+        where = [pets.c.owner_id == user_id, claimed.bitwise_and(quest.bit) == 0]
+        if quest.metric is not None:
+            where.append(pets.c[quest.metric] >= quest.goal)
+
+        pet, _ = apply_pet_stats(
+            db,
+            where,
+            strength=quest.reward_strength,
+            stamina=quest.reward_stamina,
+            mood=quest.reward_mood,
+            extra={claimed.name: claimed.bitwise_or(quest.bit)}
+        )
+        if pet is None:
+            # Nothing was updated, read the row to report why
+            row = db.execute(select(claimed).where(pets.c.owner_id == user_id)).first()
+            if row is None:
+                return None
+            if row[0] & quest.bit or quest.metric is None:
+                return {"success": False, "message": "Quest already claimed"}
+            return {"success": False, "message": quest.unmet_message}
+
+        return {
+            "success": True,
+            "message": f"Claimed reward for {quest.title}",
+            "pet": pet,
+            "rewards": quest.rewards
+        }
+    except Exception as e:
+        print(f"Error in claim_daily_quest_reward: {e}")
+        raise e
+
+# ==================
+# Travel
+# ==================
+
+def complete_breakthrough(db: Session, user_id: str):
+    try:
+        pet = _update_pet(
+            db,
+            [pets.c.owner_id == user_id, needs_breakthrough(pets.c.level, pets.c.breakthrough_completed)],
+            {
+                "breakthrough_completed": True,
+                "stage": stage_for_level(pets.c.level, literal(True)),
+            }
+        )
+        if pet is None:
+            row = db.execute(
+                select(pets.c.level, pets.c.breakthrough_completed).where(pets.c.owner_id == user_id)
+            ).first()
+            if row is None:
+                return None
+            # Why the pet did not match; it may also have changed since the UPDATE
+            error = pet_rules.complete_breakthrough(
+                pet_rules.PetState(level=row.level, breakthrough_completed=row.breakthrough_completed)
+            )
+            return {"success": False, "message": error or "Breakthrough already completed for this level"}
+
+        return {"success": True, "pet": pet, "message": "Breakthrough completed!"}
+    except Exception as e:
+        print(f"Error in complete_breakthrough: {e}")
+        raise e
+
+def create_travel_checkin(db: Session, user_id: str, checkin: schemas.TravelCheckinCreate):
+    try:
+        db_checkin = crud.insert_travel_checkin(db, user_id, checkin)
+        if db_checkin is None:
+            if db.execute(select(pets.c.id).where(pets.c.owner_id == user_id)).first() is None:
+                raise ValueError("Pet not found")
+            raise ValueError("Already checked in at this location")
+
+        # The checkin and the rewards commit together with the request
+        reward = crud.TRAVEL_CHECKIN_REWARD
+        owner = pets.c.owner_id == user_id
+        gated = needs_breakthrough(pets.c.level, pets.c.breakthrough_completed)
+
+        # Checking in at a breakthrough level also completes the breakthrough,
+        # and the reward is applied on top of the unlocked pet
+        pet, at_breakthrough = _update_pet_deciding(
+            db, [owner], gated,
+            lambda at_gate: stat_changes(
+                **reward, base={"breakthrough_completed": or_(pets.c.breakthrough_completed, at_gate)}
+            )
+        )
+        if pet is None:
+            raise ValueError("Pet not found")
+
+        return {"pet": pet, "checkin": db_checkin, "breakthrough_completed": at_breakthrough}
+    except Exception as e:
+        print(f"Error in create_travel_checkin: {e}")
+        raise e
@@ -0,0 +1,115 @@
+"""
+Data-driven daily quests.
+
+Quest definitions are plain data - DAILY_QUEST_DEFINITIONS below, or a JSON
+list of the same objects at DAILY_QUESTS_PATH - loaded once into an in-memory
+registry. A quest either needs nothing but a claim (the daily login quest) or
+needs one of the pet's daily counters (DAILY_QUEST_METRICS) to reach its goal.
+
+Which quests were claimed today is a bitmask on the pet row
+(pets.daily_quests_claimed, bit id - 1) that the daily reset clears. Adding a
+quest is a new definition: no column, no migration, and the status of every
+quest is evaluated in one pass over the pet state the endpoints already have.
+"""
+import json
+import os
+from typing import NamedTuple, Optional
+
+DAILY_QUESTS_PATH = os.getenv("DAILY_QUESTS_PATH")
+
+# Pet counters a quest goal can refer to; all are reset by the daily reset
+DAILY_QUEST_METRICS = ("daily_exercise_seconds", "daily_steps")
+
+# pets.daily_quests_claimed is a BIGINT
+MAX_DAILY_QUEST_ID = 63
+
+DAILY_QUEST_DEFINITIONS = [
+    {
+        "id": 1,
+        "title": "每日登入",
+        "description": "今天第一次登入遊戲",
+        "reward_strength": 10,
+        "reward_stamina": 20,
+        "reward_mood": 5
+    },
+    {
+        "id": 2,
+        "title": "運動十分鐘",
+        "description": "累積運動時間達到10分鐘",
+        "reward_strength": 30,
+        "reward_stamina": 15,
+        "reward_mood": 10,
+        "metric": "daily_exercise_seconds",
+        "goal": 600,
+        "unmet_message": "Exercise requirement not met"
+    },
+    {
+        "id": 3,
+        "title": "走路5000步",
+        "description": "今日累積走路5000步",
+        "reward_strength": 50,
+        "reward_stamina": 20,
+        "reward_mood": 15,
+        "metric": "daily_steps",
+        "goal": 5000,
+        "unmet_message": "Step requirement not met"
+    }
+]
+
+class DailyQuest(NamedTuple):
+    id: int
+    title: str
+    description: str
+    reward_strength: int = 0
+    reward_stamina: int = 0
+    reward_mood: int = 0
+    metric: Optional[str] = None  # one of DAILY_QUEST_METRICS, None = claimable any time
+    goal: int = 0
+    unmet_message: str = "Quest requirement not met"
+
+    @property
+    def bit(self) -> int:
+        return 1 << (self.id - 1)
+
+    @property
+    def rewards(self) -> dict:
+        return {"strength": self.reward_strength, "stamina": self.reward_stamina, "mood": self.reward_mood}
+
+    def met(self, pet) -> bool:
+        """Whether a pet state dict has reached the goal."""
+        return self.metric is None or (pet[self.metric] or 0) >= self.goal
+
+class DailyQuestRegistry:
+    def __init__(self, definitions):
+        quests = sorted((DailyQuest(**definition) for definition in definitions), key=lambda quest: quest.id)
+        for quest in quests:
+            if not 1 <= quest.id <= MAX_DAILY_QUEST_ID:
+                raise ValueError(f"Daily quest id must be 1..{MAX_DAILY_QUEST_ID}: {quest.id}")
+            if quest.metric is not None and quest.metric not in DAILY_QUEST_METRICS:
+                raise ValueError(f"Unknown daily quest metric: {quest.metric}")
+        self.quests = tuple(quests)
+        self._by_id = {quest.id: quest for quest in quests}
+        if len(self._by_id) != len(quests):
+            raise ValueError("Duplicate daily quest id")
+
+    def __iter__(self):
+        return iter(self.quests)
+
+    def get(self, quest_id: int) -> Optional[DailyQuest]:
+        return self._by_id.get(quest_id)
+
+    def status(self, pet) -> dict:
+        """quest_N_claimed / quest_N_claimable for every quest, from a pet state dict."""
+        claimed_mask = pet["daily_quests_claimed"] or 0
+        status = {}
+        for quest in self.quests:
+            claimed = bool(claimed_mask & quest.bit)
+            status[f"quest_{quest.id}_claimed"] = claimed
+            status[f"quest_{quest.id}_claimable"] = not claimed and quest.met(pet)
+        return status
+
+def load_definitions(path: str):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+registry = DailyQuestRegistry(load_definitions(DAILY_QUESTS_PATH) if DAILY_QUESTS_PATH else DAILY_QUEST_DEFINITIONS)
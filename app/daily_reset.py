@@ -0,0 +1,121 @@
+"""
+Nightly daily reset.
+
+Applies the perform_daily_check rules to every pet whose owner's local
+midnight has passed since its last check, as a couple of set-based UPDATE
+statements per time zone instead of one read-modify-write transaction per
+user on their first app open. Once the job has run for a time zone,
+POST /users/{user_id}/daily-check is a plain read for those users.
+
+Run it from cron / a scheduler with:
+    python -m app.daily_reset
+or let each app instance run it every DAILY_RESET_INTERVAL_SECONDS (0 turns
+the in-process scheduler off). Runs are idempotent - a pet is only reset once
+per local day - so overlapping runs from several instances are harmless.
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, case, exists, or_, select, update
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from . import crud, crud_atomic, leaderboard, models, pet_cache, pet_rules
+from .database import SessionLocal
+
+DAILY_RESET_INTERVAL_SECONDS = int(os.getenv("DAILY_RESET_INTERVAL_SECONDS", "300"))
+
+pets = models.Pet.__table__
+rollup = models.DailyExerciseRollup.__table__
+
+def reset_timezone(db: Session, zone_name: str, now: datetime):
+    """Reset all pets in one time zone bucket that have not been checked since local midnight."""
+    zone = crud.get_zone(zone_name)
+    today_start = crud.local_day_start(zone, now)
+    yesterday = today_start.astimezone(zone).date() - timedelta(days=1)
+
+    # A plain comparison on timezone (NOT NULL, see add_pet_timezone.py), so the
+    # bucket is found through ix_pets_timezone_last_daily_check
+    due = and_(
+        pets.c.timezone == zone_name,
+        or_(pets.c.last_daily_check.is_(None), pets.c.last_daily_check < today_start)
+    )
+    met_requirement = exists().where(
+        rollup.c.user_id == pets.c.owner_id,
+        rollup.c.day == yesterday,
+        rollup.c.strength_points >= pet_rules.MIN_DAILY_STRENGTH
+    )
+    reset = {
+        "stamina": pet_rules.MAX_STAMINA,
+        "daily_exercise_seconds": 0,
+        "daily_steps": 0,
+        "daily_quests_claimed": 0,
+        "last_reset_date": now,
+        "last_daily_check": now,
+    }
+
+    try:
+        # Missed yesterday's minimum: mood drops, and strength drops once mood hits 0
+        mood = crud_atomic.greatest(0, pets.c.mood - pet_rules.MISSED_DAY_MOOD_PENALTY)
+        missed = db.execute(
+            update(pets)
+            .where(due, ~met_requirement)
+            .values(
+                **reset,
+                mood=mood,
+                strength=case(
+                    (and_(mood == 0, pets.c.strength > 0), crud_atomic.greatest(0, pets.c.strength - pet_rules.MISSED_DAY_STRENGTH_PENALTY)),
+                    else_=pets.c.strength
+                )
+            )
+            .returning(pets.c.owner_id, pets.c.name, pets.c.level, pets.c.strength)
+        ).mappings().all()
+        for pet in missed:
+            leaderboard.track(db, pet)
+            pet_cache.invalidate(db, pet["owner_id"])
+
+        # Everyone else in the bucket only gets the daily resets
+        met = db.execute(update(pets).where(due).values(**reset).returning(pets.c.owner_id)).scalars().all()
+        for user_id in met:
+            pet_cache.invalidate(db, user_id)
+
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Error in reset_timezone ({zone_name}): {e}")
+        raise e
+
+    return {"timezone": zone_name, "met_requirement": len(met), "missed_requirement": len(missed)}
+
+def run_daily_reset(db: Session, now: datetime = None):
+    """Run the daily reset for every time zone that has pets. Returns one summary per bucket."""
+    now = now or datetime.now(timezone.utc)
+    zone_names = db.execute(select(pets.c.timezone).distinct()).scalars().all()
+    return [reset_timezone(db, zone_name, now) for zone_name in zone_names]
+
+async def run_periodically():
+    """Run the daily reset every DAILY_RESET_INTERVAL_SECONDS (started from the app startup hook)."""
+    while True:
+        await asyncio.sleep(DAILY_RESET_INTERVAL_SECONDS)
+        db = SessionLocal()
+        try:
+            await run_in_threadpool(run_daily_reset, db)
+        except Exception as e:
+            print(f"Error running daily reset: {e}")
+        finally:
+            db.close()
+
+def main():
+    db = SessionLocal()
+    try:
+        for bucket in run_daily_reset(db):
+            print(
+                f"✓ {bucket['timezone']}: {bucket['met_requirement']} reset, "
+                f"{bucket['missed_requirement']} missed yesterday's minimum"
+            )
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Streaming exercise log export (NDJSON / CSV).
+
+Rows are read through a server-side cursor (yield_per) on a session owned by
+the generator, encoded a batch at a time and handed to a StreamingResponse,
+so memory use is bounded by EXPORT_BATCH_SIZE no matter how long the history
+is. Starlette iterates the (sync) generator in its threadpool.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+
+from sqlalchemy import select
+
+from . import models
+from .database import SessionLocal
+
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+EXPORT_COLUMNS = [
+    "id", "user_id", "pet_id", "exercise_type", "duration_seconds", "steps", "volume", "created_at"
+]
+
+def _batches(*where):
+    """Exercise log rows matching `where`, in id order, as lists of tuples."""
+    logs = models.ExerciseLog.__table__
+    stmt = (
+        select(*[logs.c[column] for column in EXPORT_COLUMNS])
+        .where(*where)
+        .order_by(logs.c.id)
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    db = SessionLocal()
+    try:
+        for batch in db.execute(stmt).partitions():
+            yield batch
+    finally:
+        db.close()
+
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def _ndjson(batches):
+    for batch in batches:
+        yield "".join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, map(_value, row))), ensure_ascii=False) + "\n"
+            for row in batch
+        ).encode("utf-8")
+
+def _csv(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for batch in batches:
+        writer.writerows([_value(value) for value in row] for row in batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+def stream_exercise_logs(format: str, user_id: str = None, start: datetime = None, end: datetime = None):
+    """
+    Encoded chunks of exercise logs for one user (or everyone), optionally
+    limited to start <= created_at < end.
+    """
+    logs = models.ExerciseLog.__table__
+    where = []
+    if user_id is not None:
+        where.append(logs.c.user_id == user_id)
+    if start is not None:
+        where.append(logs.c.created_at >= start)
+    if end is not None:
+        where.append(logs.c.created_at < end)
+    encode = _csv if format == "csv" else _ndjson
+    return encode(_batches(*where))
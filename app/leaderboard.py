@@ -0,0 +1,180 @@
+"""
+In-memory level leaderboard.
+
+Pets are kept in a SortedList ordered by (level, strength) descending, so the
+top-N and a user's own rank are O(log n) lookups instead of a sort over the
+pets/users join on every request. The board is loaded at startup and then kept
+up to date from the write paths:
+- ORM writes to Pet objects are picked up by an after_flush hook
+- Core UPDATE ... RETURNING paths call track() with the returned row
+Changes are only applied once the session commits, and dropped on rollback.
+
+Every worker process has its own board, so it is also reloaded from the
+database every LEADERBOARD_REFRESH_SECONDS to pick up writes made elsewhere.
+"""
+import asyncio
+import json
+import os
+import threading
+
+from sortedcontainers import SortedList
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from . import models
+from .database import SessionLocal
+
+LEADERBOARD_REFRESH_SECONDS = int(os.getenv("LEADERBOARD_REFRESH_SECONDS", "60"))
+
+class LevelLeaderboard:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = SortedList()  # (-level, -strength, user_id)
+        self._pets = {}  # user_id -> (name, level, strength)
+        self._top_json = {}  # limit -> (pre-serialized first page, next position)
+
+    @staticmethod
+    def _key(user_id, level, strength):
+        return (-(level or 0), -(strength or 0), user_id)
+
+    def load(self, db: Session):
+        """Rebuild the board from the database."""
+        rows = db.execute(
+            select(models.Pet.owner_id, models.Pet.name, models.Pet.level, models.Pet.strength)
+            .join(models.User, models.Pet.owner_id == models.User.id)
+        ).all()
+        pets = {user_id: (name, level, strength) for user_id, name, level, strength in rows}
+        entries = SortedList(self._key(user_id, level, strength) for user_id, (_, level, strength) in pets.items())
+        with self._lock:
+            self._pets = pets
+            self._entries = entries
+            self._top_json = {}
+
+    def update(self, user_id: str, name: str, level: int, strength: int):
+        with self._lock:
+            old = self._pets.get(user_id)
+            if old == (name, level, strength):
+                return
+            if old is not None:
+                self._entries.discard(self._key(user_id, old[1], old[2]))
+            self._pets[user_id] = (name, level, strength)
+            self._entries.add(self._key(user_id, level, strength))
+            self._top_json = {}
+
+    def remove(self, user_id: str):
+        with self._lock:
+            old = self._pets.pop(user_id, None)
+            if old is not None:
+                self._entries.discard(self._key(user_id, old[1], old[2]))
+                self._top_json = {}
+
+    def _page(self, after, limit):
+        # Entries strictly after the (level, strength, user_id) position `after`
+        start = self._entries.bisect_right(self._key(after[2], after[0], after[1])) if after else 0
+        return [
+            (user_id, self._pets[user_id][0], -level, -strength)
+            for level, strength, user_id in self._entries[start:start + max(limit, 0)]
+        ], start + max(limit, 0) < len(self._entries)
+
+    def top(self, limit: int = 10):
+        """Top pets as (user_id, name, level, strength), best first."""
+        with self._lock:
+            return self._page(None, limit)[0]
+
+    def page_json(self, after=None, limit: int = 10):
+        """
+        A page of the board as a serialized List[schemas.LeaderboardEntry], starting
+        after the (level, strength, user_id) position `after` (None for the top).
+        Returns (body, position of the last entry if there are more, else None).
+        First pages are cached until the board changes.
+        """
+        with self._lock:
+            page = self._top_json.get(limit) if after is None else None
+            if page is None:
+                entries, more = self._page(after, limit)
+                body = json.dumps(
+                    [{"username": name, "value": level} for _, name, level, _ in entries],
+                    ensure_ascii=False
+                ).encode("utf-8")
+                last = entries[-1] if entries and more else None
+                page = (body, (last[2], last[3], last[0]) if last else None)
+                if after is None:
+                    self._top_json[limit] = page
+            return page
+
+    def top_json(self, limit: int = 10) -> bytes:
+        """Top-N as a serialized List[schemas.LeaderboardEntry], cached until the board changes."""
+        return self.page_json(None, limit)[0]
+
+    def rank(self, user_id: str):
+        """
+        1-based rank of the user's pet (pets with equal level and strength share a rank),
+        or None if the user has no pet on the board.
+        """
+        with self._lock:
+            pet = self._pets.get(user_id)
+            if pet is None:
+                return None
+            name, level, strength = pet
+            ahead = self._entries.bisect_left((-(level or 0), -(strength or 0)))
+            return {
+                "user_id": user_id,
+                "username": name,
+                "level": level,
+                "strength": strength,
+                "rank": ahead + 1,
+                "total": len(self._entries)
+            }
+
+level_leaderboard = LevelLeaderboard()
+
+async def refresh_periodically():
+    """Reload the board every LEADERBOARD_REFRESH_SECONDS (started from the app startup hook)."""
+    while True:
+        await asyncio.sleep(LEADERBOARD_REFRESH_SECONDS)
+        db = SessionLocal()
+        try:
+            await run_in_threadpool(level_leaderboard.load, db)
+        except Exception as e:
+            print(f"Error refreshing leaderboard: {e}")
+        finally:
+            db.close()
+
+# ==================
+# Session hooks
+# ==================
+
+def track(db: Session, pet: dict):
+    """Queue a pet row (e.g. from UPDATE ... RETURNING) to be applied on commit."""
+    db.info.setdefault("leaderboard_updates", {})[pet["owner_id"]] = (
+        pet["name"], pet["level"], pet["strength"]
+    )
+
+@event.listens_for(Session, "after_flush")
+def _track_flushed_pets(session, flush_context):
+    # new / dirty / deleted still describe what was just flushed, and column
+    # defaults of new pets have been filled in
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, models.Pet) and obj.owner_id is not None:
+            track(session, {
+                "owner_id": obj.owner_id, "name": obj.name,
+                "level": obj.level, "strength": obj.strength
+            })
+    for obj in session.deleted:
+        if isinstance(obj, models.Pet) and obj.owner_id is not None:
+            session.info.setdefault("leaderboard_updates", {})[obj.owner_id] = None
+
+@event.listens_for(Session, "after_commit")
+def _apply_updates(session):
+    updates = session.info.pop("leaderboard_updates", None)
+    if updates:
+        for user_id, pet in updates.items():
+            if pet is None:
+                level_leaderboard.remove(user_id)
+            else:
+                level_leaderboard.update(user_id, *pet)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_updates(session):
+    session.info.pop("leaderboard_updates", None)
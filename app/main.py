@@ -1,20 +1,33 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from . import startup  # first, so startup.timings["imports"] covers everything below
+
+import asyncio
+import hmac
+import os
+import tempfile
+from datetime import datetime
+
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
-from . import crud, models, schemas
-from .database import SessionLocal, engine, get_db
+from . import (
+    attractions, balance, crud, crud_async, daily_reset, export, leaderboard, metrics, pagination,
+    poi_import, profiling, query_stats, schemas, server_timing
+)
+from .database import get_session
 
-# Create all database tables
-# In production, you might use Alembic for database migrations
-models.Base.metadata.create_all(bind=engine)
+startup.imports_done()
 
 app = FastAPI(
     title="Pet Fitness API",
     description="Backend API for a fitness and virtual pet app",
     version="1.0.0",
 )
+# Routes record when their endpoint runs, for the Server-Timing breakdown
+app.router.route_class = server_timing.TimedRoute
 
 # Add CORS middleware - must be configured before routes
 app.add_middleware(
@@ -26,32 +39,97 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+# Server-Timing span breakdown, X-Request-ID and (REQUEST_LOG_FORMAT=json) request logs
+app.add_middleware(server_timing.ServerTimingMiddleware)
+
+# Statements and DB time per request (X-DB-Queries / X-DB-Time-Ms, N+1 and slow query log)
+app.add_middleware(query_stats.QueryStatsMiddleware)
+
+# Request count / latency per route for GET /metrics (outermost, so it times everything)
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Profile requests with a signed X-Profile header (see profiling.py); not installed without PROFILE_SECRET
+if profiling.PROFILE_SECRET:
+    app.add_middleware(profiling.ProfileMiddleware)
+
+# Admin endpoints require this in the X-Admin-Token header; unset disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN or not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+ExportFormat = Query("ndjson", pattern="^(ndjson|csv)$")
+
+ImportFormat = Query("json", pattern="^(json|csv)$")
+
+def export_response(chunks, format: str, filename: str):
+    return StreamingResponse(
+        chunks,
+        media_type=export.EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{format}"'}
+    )
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True if the request's If-None-Match header lists the given (strong) ETag."""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+# Request-scoped session, committed once before the response is sent (see get_db)
+UnitOfWork = Depends(get_session, scope="function")
+
+PageSize = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE)
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]):
+    if next_cursor:
+        response.headers[pagination.NEXT_CURSOR_HEADER] = next_cursor
+
+def pet_etag(pet: dict) -> str:
+    """Strong ETag for responses derived from a pet's state (changes with every pet UPDATE)."""
+    return f'"pet-{pet["id"]}-{pet["version"]}"'
+
 # ==================
 # Application startup event (for seeding data)
 # ==================
 @app.on_event("startup")
-def on_startup():
-    # On app start, seed some basic data
-    db = SessionLocal()
-    try:
-        # Seed attractions
-        crud.seed_attractions(db)
-        # Seed daily quest templates
-        for quest_template in crud.QUEST_TEMPLATES:
-            q = db.query(models.Quest).filter(models.Quest.title == quest_template["title"]).first()
-            if not q:
-                q = models.Quest(**quest_template)
-                db.add(q)
-        db.commit()
-    finally:
-        db.close()
+async def on_startup():
+    # Create tables (development only), seed some basic data and load the
+    # in-memory caches; see startup.py
+    await startup.run()
+
+@app.on_event("startup")
+async def start_background_tasks():
+    if leaderboard.LEADERBOARD_REFRESH_SECONDS > 0:
+        asyncio.create_task(leaderboard.refresh_periodically())
+    if attractions.ATTRACTION_REFRESH_SECONDS > 0:
+        asyncio.create_task(attractions.refresh_periodically())
+    if daily_reset.DAILY_RESET_INTERVAL_SECONDS > 0:
+        asyncio.create_task(daily_reset.run_periodically())
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    metrics.worker_exit()
+
+# ==================
+# Metrics
+# ==================
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus metrics of all workers (see metrics.py)."""
+    body, content_type = await run_in_threadpool(metrics.render)
+    return Response(content=body, media_type=content_type)
 
 
 # ==================
 # User & Auth (Simple)
 # ==================
 @app.post("/users/", response_model=schemas.User, tags=["User"])
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+@query_stats.budget(4)
+async def create_user(user: schemas.UserCreate, db: Session = UnitOfWork):
     """
     Create a new user.
     
@@ -59,14 +137,19 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     - Returns user with id (use this id for all subsequent API calls)
     - An "Egg" stage pet with the provided name is automatically created
     """
-    return crud.create_user(db=db, user=user)
+    return await crud_async.create_user(db=db, user=user)
 
 @app.get("/users/{user_id}", response_model=schemas.User, tags=["User"])
-def read_user(user_id: str, db: Session = Depends(get_db)):
+@query_stats.budget(3)
+async def read_user(user_id: str, include_logs: bool = False, db: Session = UnitOfWork):
     """
     Get user information by ID (includes pet status).
+
+    exercise_logs is empty unless include_logs=true, in which case it holds the
+    latest page of logs. Use GET /users/{user_id}/exercise to page through the
+    full history.
     """
-    db_user = crud.get_user(db, user_id=user_id)
+    db_user = await crud_async.get_user(db, user_id=user_id, include_logs=include_logs)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
     return db_user
@@ -75,18 +158,26 @@ def read_user(user_id: str, db: Session = Depends(get_db)):
 # Pet (The Chicken)
 # ==================
 @app.get("/users/{user_id}/pet", response_model=schemas.Pet, tags=["Pet"])
-def get_user_pet(user_id: str, db: Session = Depends(get_db)):
+@query_stats.budget(1)
+async def get_user_pet(user_id: str, request: Request, response: Response, db: Session = UnitOfWork):
     """
     Get the current status of the specified user's pet.
+
+    Send the returned ETag back in If-None-Match to get a 304 while the pet is unchanged.
     """
-    pet = crud.get_pet_by_user_id(db, user_id=user_id)
+    pet = await crud_async.get_pet_state(db, user_id=user_id)
     if pet is None:
         raise HTTPException(status_code=404, detail="Pet not found for this user")
     
+    etag = pet_etag(pet)
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
     return pet
 
 @app.patch("/users/{user_id}/pet", response_model=schemas.Pet, tags=["Pet"])
-def update_user_pet(user_id: str, pet_update: schemas.PetUpdate, db: Session = Depends(get_db)):
+@query_stats.budget(2)
+async def update_user_pet(user_id: str, pet_update: schemas.PetUpdate, db: Session = UnitOfWork):
     """
     Update any attributes of the user's pet.
     
@@ -101,17 +192,51 @@ def update_user_pet(user_id: str, pet_update: schemas.PetUpdate, db: Session = D
     
     Only the fields you provide will be updated.
     """
-    pet = crud.get_pet_by_user_id(db, user_id)
+    pet = await crud_async.update_user_pet(db, user_id, pet_update)
     if not pet:
         raise HTTPException(status_code=404, detail="Pet not found")
-    
-    return crud.update_pet(db, pet, pet_update)
+    return pet
 
 # ==================
 # Exercise
 # ==================
+@app.get("/users/{user_id}/exercise", response_model=List[schemas.ExerciseLog], tags=["Exercise"])
+@query_stats.budget(1)
+async def list_exercise_logs(
+    user_id: str,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = PageSize,
+    db: Session = UnitOfWork
+):
+    """
+    Get the user's exercise logs, newest first, one page at a time.
+
+    Pass the X-Next-Cursor response header back as `cursor` to get the next
+    page; the header is absent on the last page.
+    """
+    try:
+        logs, next_cursor = await crud_async.get_exercise_logs(db, user_id, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    set_next_cursor(response, next_cursor)
+    return logs
+
+@app.get("/users/{user_id}/exercise/export", tags=["Exercise"])
+async def export_exercise_logs(user_id: str, format: str = ExportFormat, db: Session = UnitOfWork):
+    """
+    Download the user's full exercise history as NDJSON (one JSON object per
+    line) or CSV, oldest first. The file is streamed, so any history length works.
+    """
+    if await crud_async.run(db, crud.get_user, user_id) is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return export_response(
+        export.stream_exercise_logs(format, user_id=user_id), format, f"exercise-{user_id}"
+    )
+
 @app.post("/users/{user_id}/exercise", tags=["Exercise"])
-def log_exercise(user_id: str, log: schemas.ExerciseLogCreate, db: Session = Depends(get_db)):
+@query_stats.budget(4)
+async def log_exercise(user_id: str, log: schemas.ExerciseLogCreate, db: Session = UnitOfWork):
     """
     Log an exercise session.
     
@@ -121,26 +246,64 @@ def log_exercise(user_id: str, log: schemas.ExerciseLogCreate, db: Session = Dep
     
     Returns the updated pet status and a flag indicating if breakthrough is required.
     """
-    result = crud.log_exercise(db, user_id, log)
+    result = await crud_async.log_exercise(db, user_id, log)
     if result is None:
         raise HTTPException(status_code=404, detail="User or pet not found")
+    metrics.count_on_commit(db, "exercise_logged")
+    return result
+
+@app.post("/users/{user_id}/exercise/batch", response_model=schemas.ExerciseBatchResult, tags=["Exercise"])
+@query_stats.budget(4)
+async def log_exercise_batch(user_id: str, logs: List[schemas.ExerciseLogCreate], db: Session = UnitOfWork):
+    """
+    Log many exercise sessions in one request (e.g. sessions queued while offline).
+
+    Sessions are applied in the order given, with the same rules as
+    POST /users/{user_id}/exercise, in a single transaction.
+
+    Returns the final pet status and, for each session, the strength applied,
+    the resulting level and whether a breakthrough blocked the gain.
+    """
+    if len(logs) > crud.MAX_EXERCISE_BATCH_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {crud.MAX_EXERCISE_BATCH_SIZE} sessions per batch"
+        )
+    result = await crud_async.log_exercise_batch(db, user_id, logs)
+    if result is None:
+        raise HTTPException(status_code=404, detail="User or pet not found")
+    metrics.count_on_commit(db, "exercise_logged", len(logs))
     return result
 
 # ==================
 # Daily Quests
 # ==================
 @app.get("/users/{user_id}/quests", response_model=List[schemas.UserQuest], tags=["Quests"])
-def get_daily_quests(user_id: str, db: Session = Depends(get_db)):
+@query_stats.budget(4)
+async def get_daily_quests(
+    user_id: str,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = PageSize,
+    db: Session = UnitOfWork
+):
     """
     Get the user's daily quest list.
     
     If quests for the day have not been generated, this will create them.
+    Newest first, so today's quests are at the top of the first page; paged
+    like GET /users/{user_id}/exercise (cursor / X-Next-Cursor).
     """
-    quests = crud.get_or_create_daily_quests(db, user_id)
+    try:
+        quests, next_cursor = await crud_async.get_user_quests(db, user_id, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    set_next_cursor(response, next_cursor)
     return quests
 
 @app.post("/users/{user_id}/quests/{user_quest_id}/complete", tags=["Quests"])
-def complete_daily_quest(user_id: str, user_quest_id: int, db: Session = Depends(get_db)):
+@query_stats.budget(4)
+async def complete_daily_quest(user_id: str, user_quest_id: int, db: Session = UnitOfWork):
     """
     Report a specific quest as complete.
     
@@ -150,41 +313,45 @@ def complete_daily_quest(user_id: str, user_quest_id: int, db: Session = Depends
     Returns success status and updated pet information.
     Will return error if quest is already completed (preventing duplicate rewards).
     """
-    result = crud.complete_quest(db, user_id, user_quest_id)
+    result = await crud_async.complete_quest(db, user_id, user_quest_id)
     if not result:
         raise HTTPException(status_code=404, detail="Quest not found")
     
     if not result.get("success"):
         raise HTTPException(status_code=400, detail=result.get("message", "Cannot complete quest"))
     
+    metrics.count_on_commit(db, "quest_completed")
     return result
 
 # ==================
 # Daily Quest System (Independent)
 # ==================
 @app.get("/users/{user_id}/daily-quests", tags=["Daily Quests"])
-def get_daily_quests(user_id: str, db: Session = Depends(get_db)):
+@query_stats.budget(1)
+async def get_daily_quests(user_id: str, request: Request, response: Response, db: Session = UnitOfWork):
     """
     Get current status of all daily quests.
     
-    Returns:
-    - Quest 1: 每日登入 (auto-completed on daily-check)
+    Returns quest_N_claimed / quest_N_claimable for every daily quest
+    (defined in daily_quests.py), e.g.:
+    - Quest 1: 每日登入 (claimable once per day)
     - Quest 2: 運動十分鐘 (600 seconds exercise)
     - Quest 3: 走路5000步 (5000 steps)
-    
-    Each quest shows:
-    - completed: bool
-    - progress: current progress value
-    - goal: target value
-    - rewards: strength, stamina, mood
+
+    Supports If-None-Match with the returned ETag (304 while the pet is unchanged).
     """
-    result = crud.get_daily_quest_status(db, user_id)
-    if not result:
+    pet = await crud_async.get_pet_state(db, user_id)
+    if not pet:
         raise HTTPException(status_code=404, detail="Pet not found")
-    return result
+    etag = pet_etag(pet)
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return crud.daily_quest_status(pet)
 
 @app.get("/users/{user_id}/daily-stats", tags=["Daily Quests"])
-def get_daily_stats(user_id: str, db: Session = Depends(get_db)):
+@query_stats.budget(1)
+async def get_daily_stats(user_id: str, request: Request, response: Response, db: Session = UnitOfWork):
     """
     Get user's daily exercise statistics.
     
@@ -192,38 +359,47 @@ def get_daily_stats(user_id: str, db: Session = Depends(get_db)):
     - daily_exercise_seconds: Total exercise time today (in seconds)
     - daily_steps: Total steps today
     - last_reset_date: Last time stats were reset
+
+    Supports If-None-Match with the returned ETag (304 while the pet is unchanged).
     """
-    result = crud.get_daily_stats(db, user_id)
-    if not result:
+    pet = await crud_async.get_pet_state(db, user_id)
+    if not pet:
         raise HTTPException(status_code=404, detail="Pet not found")
-    return result
+    etag = pet_etag(pet)
+    if etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return crud.daily_stats(pet)
 
 @app.post("/users/{user_id}/daily-quests/{quest_id}/claim", tags=["Daily Quests"])
-def claim_daily_quest(user_id: str, quest_id: int, db: Session = Depends(get_db)):
+@query_stats.budget(2)
+async def claim_daily_quest(user_id: str, quest_id: int, db: Session = UnitOfWork):
     """
     Claim reward for a completed daily quest.
     
-    Quest IDs:
+    Quest IDs (see daily_quests.py):
     - 1: 每日登入
     - 2: 運動十分鐘
     - 3: 走路5000步
     
     Returns error if quest is not completed yet.
     """
-    result = crud.claim_daily_quest_reward(db, user_id, quest_id)
+    result = await crud_async.claim_daily_quest_reward(db, user_id, quest_id)
     if not result:
         raise HTTPException(status_code=404, detail="Pet not found")
     
     if not result.get("success"):
         raise HTTPException(status_code=400, detail=result.get("message", "Cannot claim reward"))
     
+    metrics.count_on_commit(db, "daily_quest_claimed")
     return result
 
 # ==================
 # Daily Check
 # ==================
 @app.post("/users/{user_id}/daily-check", tags=["Pet"])
-def perform_daily_check(user_id: str, db: Session = Depends(get_db)):
+@query_stats.budget(3)
+async def perform_daily_check(user_id: str, db: Session = UnitOfWork):
     """
     Perform daily check to verify if user exercised enough yesterday.
     
@@ -233,7 +409,7 @@ def perform_daily_check(user_id: str, db: Session = Depends(get_db)):
     - If mood reaches 0 and strength > 0, decreases strength
     - If stamina is 0, doesn't decrease mood (already exercised enough)
     """
-    result = crud.perform_daily_check(db, user_id)
+    result = await crud_async.perform_daily_check(db, user_id)
     if result is None:
         raise HTTPException(status_code=404, detail="User or pet not found")
     return result
@@ -241,27 +417,69 @@ def perform_daily_check(user_id: str, db: Session = Depends(get_db)):
 # ==================
 # Travel (Breakthrough)
 # ==================
+MAX_NEARBY_RADIUS_M = 50000
+MAX_NEARBY_LIMIT = 100
+
 @app.get("/travel/attractions", response_model=List[schemas.Attraction], tags=["Travel"])
-def get_all_attractions(db: Session = Depends(get_db)):
+@query_stats.budget(1)
+async def get_all_attractions(request: Request, db: Session = UnitOfWork):
     """
     Get all available travel attractions (Placeholders).
+
+    Served from the in-memory attraction catalog. Send the returned ETag back
+    in If-None-Match to get a 304 while the catalog is unchanged.
+    """
+    catalog = await crud_async.get_attraction_catalog(db)
+    headers = {"ETag": catalog.etag}
+    if etag_matches(request, catalog.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=catalog.body, media_type="application/json", headers=headers)
+
+@app.get("/travel/attractions/nearby", response_model=List[schemas.NearbyAttraction], tags=["Travel"])
+@query_stats.budget(1)
+async def get_nearby_attractions(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radius_m: float = Query(1000, gt=0, le=MAX_NEARBY_RADIUS_M),
+    limit: int = Query(20, ge=1, le=MAX_NEARBY_LIMIT),
+    db: Session = UnitOfWork
+):
+    """
+    Attractions within radius_m meters of (lat, lng), nearest first.
+
+    Answered from the attraction catalog's in-memory grid index; attractions
+    without coordinates are never returned.
     """
-    return db.query(models.Attraction).all()
+    return await crud_async.get_nearby_attractions(db, lat, lng, radius_m, limit)
 
 @app.get("/users/{user_id}/travel/checkins", response_model=List[schemas.TravelCheckin], tags=["Travel"])
-def get_user_travel_checkins(user_id: str, db: Session = Depends(get_db)):
+@query_stats.budget(1)
+async def get_user_travel_checkins(
+    user_id: str,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = PageSize,
+    db: Session = UnitOfWork
+):
     """
-    Get all travel checkins (completed location-based quests) for a user.
+    Get travel checkins (completed location-based quests) for a user, newest first.
     
-    Returns a list of all locations where the user has checked in.
+    Returns a page of locations where the user has checked in; paged like
+    GET /users/{user_id}/exercise (cursor / X-Next-Cursor).
     """
-    return crud.get_user_travel_checkins(db, user_id)
+    try:
+        checkins, next_cursor = await crud_async.get_user_travel_checkins(db, user_id, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    set_next_cursor(response, next_cursor)
+    return checkins
 
 @app.post("/users/{user_id}/travel/checkins", tags=["Travel"])
-def create_travel_checkin(
+@query_stats.budget(3)
+async def create_travel_checkin(
     user_id: str, 
     checkin: schemas.TravelCheckinCreate, 
-    db: Session = Depends(get_db)
+    db: Session = UnitOfWork
 ):
     """
     Create a new travel checkin at a location-based quest.
@@ -274,13 +492,17 @@ def create_travel_checkin(
     Returns the updated pet and checkin record.
     """
     try:
-        result = crud.create_travel_checkin(db, user_id, checkin)
-        return result
+        result = await crud_async.create_travel_checkin(db, user_id, checkin)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    metrics.count_on_commit(db, "travel_checkin")
+    if result["breakthrough_completed"]:
+        metrics.count_on_commit(db, "breakthrough")
+    return result
 
 @app.post("/users/{user_id}/travel/breakthrough", tags=["Travel"])
-def complete_breakthrough(user_id: str, db: Session = Depends(get_db)):
+@query_stats.budget(2)
+async def complete_breakthrough(user_id: str, db: Session = UnitOfWork):
     """
     Complete a breakthrough to continue leveling past levels 5, 10, 15, 20.
     
@@ -289,36 +511,38 @@ def complete_breakthrough(user_id: str, db: Session = Depends(get_db)):
     
     Returns success status and updated pet information.
     """
-    result = crud.complete_breakthrough(db, user_id)
+    result = await crud_async.complete_breakthrough(db, user_id)
     if result is None:
         raise HTTPException(status_code=404, detail="Pet not found")
+    if result["success"]:
+        metrics.count_on_commit(db, "breakthrough")
     return result
 
 @app.post("/users/{user_id}/travel/start", response_model=schemas.Attraction, tags=["Travel"])
-def start_travel_quest(user_id: str, db: Session = Depends(get_db)):
+@query_stats.budget(2)
+async def start_travel_quest(user_id: str, db: Session = UnitOfWork):
     """
     Get a random attraction for breakthrough quest.
     
     Returns a random Taipei attraction that can be used for breakthrough.
     """
-    pet = crud.get_pet_by_user_id(db, user_id)
+    pet, attraction = await crud_async.get_travel_quest(db, user_id)
     if not pet:
         raise HTTPException(status_code=404, detail="Pet not found")
 
     # Check if at a breakthrough level
-    if pet.level % 5 != 0 or pet.level < 5:
+    if pet["level"] % 5 != 0 or pet["level"] < 5:
         raise HTTPException(
             status_code=400, 
             detail="Pet is not at a breakthrough level (5, 10, 15, 20)."
         )
     
-    if pet.breakthrough_completed:
+    if pet["breakthrough_completed"]:
         raise HTTPException(
             status_code=400,
             detail="Breakthrough already completed for this level."
         )
 
-    attraction = crud.get_random_attraction(db)
     if not attraction:
         raise HTTPException(status_code=500, detail="No travel attractions available")
         
@@ -328,14 +552,124 @@ def start_travel_quest(user_id: str, db: Session = Depends(get_db)):
 # Leaderboard
 # ==================
 @app.get("/leaderboard/level", response_model=List[schemas.LeaderboardEntry], tags=["Leaderboard"])
-def get_level_leaderboard(limit: int = 10, db: Session = Depends(get_db)):
+@query_stats.budget(1)
+async def get_level_leaderboard(
+    limit: int = Query(10, ge=1, le=pagination.MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+):
     """
     Get the pet level leaderboard.
+
+    Served from the in-memory leaderboard; the top page is cached until the
+    leaderboard changes. Paged like GET /users/{user_id}/exercise
+    (cursor / X-Next-Cursor).
+    """
+    after = None
+    if cursor:
+        try:
+            after = pagination.decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        # (level, strength, user_id) of the last entry of the previous page
+        if len(after) != 3 or not all(isinstance(value, int) for value in after[:2]) or not isinstance(after[2], str):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    body, last = leaderboard.level_leaderboard.page_json(after, limit)
+    response = Response(content=body, media_type="application/json")
+    set_next_cursor(response, pagination.encode_cursor(*last) if last else None)
+    return response
+
+@app.get("/leaderboard/level/rank/{user_id}", response_model=schemas.LeaderboardRank, tags=["Leaderboard"])
+@query_stats.budget(1)
+async def get_level_rank(user_id: str):
     """
-    leaderboard_data = crud.get_leaderboard_by_level(db, limit=limit)
-    
-    # Convert to LeaderboardEntry schema
-    return [
-        schemas.LeaderboardEntry(username=pet.name, value=pet.level)
-        for pet, user_id in leaderboard_data
-    ]
\ No newline at end of file
+    Get the user's own position on the pet level leaderboard.
+    """
+    rank = leaderboard.level_leaderboard.rank(user_id)
+    if rank is None:
+        raise HTTPException(status_code=404, detail="Pet not found for this user")
+    return rank
+
+# ==================
+# Admin
+# ==================
+@app.get("/admin/exercise/export", tags=["Admin"], dependencies=[Depends(require_admin)])
+async def export_all_exercise_logs(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    format: str = ExportFormat
+):
+    """
+    Stream every user's exercise logs with start <= created_at < end
+    (both optional) as NDJSON or CSV. Requires the X-Admin-Token header.
+    """
+    return export_response(
+        export.stream_exercise_logs(format, start=start, end=end), format, "exercise-logs"
+    )
+
+@app.post("/admin/attractions/import", tags=["Admin"], dependencies=[Depends(require_admin)])
+async def import_attractions(request: Request, format: str = ImportFormat):
+    """
+    Upsert attractions from a JSON (array or NDJSON) or CSV POI file sent as
+    the raw request body, e.g.
+        curl -H "X-Admin-Token: ..." --data-binary @pois.json /admin/attractions/import
+    Existing attractions are matched by name. Requires the X-Admin-Token header.
+
+    Returns the number of rows upserted and the import rate. Batches are
+    committed as they go, so a 400 for a malformed record keeps the rows
+    imported before it.
+    """
+    with tempfile.TemporaryFile() as upload:
+        # Spool the body to disk so the import can parse it as a file; the
+        # writes go to the threadpool so disk I/O does not stall the event loop
+        async for chunk in request.stream():
+            await run_in_threadpool(upload.write, chunk)
+        upload.seek(0)
+        try:
+            return await run_in_threadpool(poi_import.import_file, upload, format)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/admin/balance/simulate", tags=["Admin"], dependencies=[Depends(require_admin)])
+async def simulate_balance(simulation: schemas.BalanceSimulation):
+    """
+    Run the game rules over a synthetic population of new users for a number
+    of days (see balance.py), optionally with different game constants,
+    population parameters or daily quest definitions. Requires the
+    X-Admin-Token header.
+
+    Returns the level and stage distribution per day and, per stage, the
+    share of users that reached it and the median / p90 days it took.
+    """
+    try:
+        return await run_in_threadpool(
+            balance.simulate, simulation.users, simulation.days,
+            config=simulation.config, population=simulation.population,
+            quests=simulation.quests, seed=simulation.seed
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/admin/profile", tags=["Admin"], dependencies=[Depends(require_admin)])
+async def profile_process(
+    seconds: float = Query(10, gt=0, le=profiling.PROFILE_MAX_SECONDS),
+    interval_ms: float = Query(profiling.PROFILE_INTERVAL_MS, ge=0.1, le=1000),
+    memory: bool = False
+):
+    """
+    Sample the stacks of every thread in the worker that serves this request
+    for `seconds` and, with memory=true, trace allocations (see profiling.py).
+    Requires the X-Admin-Token header; 409 if a profile is already running.
+
+    Returns the collapsed-stack (flamegraph) and allocation files written to
+    PROFILE_DIR on that worker, the number of samples and the hottest frames.
+    """
+    profile = profiling.Profile(f"process-{seconds:g}s", interval_ms, memory)
+    try:
+        await profile.start_async()
+    except profiling.ProfileBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        await profile.stop_async()
+    return profile.summary()
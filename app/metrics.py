@@ -0,0 +1,208 @@
+"""
+Prometheus metrics, served at GET /metrics.
+
+- HTTP: request count and latency histogram per method / route template /
+  status, and requests in progress (MetricsMiddleware, a plain ASGI
+  middleware - one dict lookup and a few increments per request)
+- database pool (per engine): connections checked out, idle, overflow and the
+  pool size, how long requests waited for a connection and how often they
+  gave up after pool_timeout (InstrumentedPool)
+- business events: exercise sessions logged, quests claimed, breakthroughs
+  and travel check-ins, counted when the request's transaction commits
+  (count_on_commit)
+
+With several worker processes each worker keeps its own counters, so a scrape
+would only see whichever worker answered. Set PROMETHEUS_MULTIPROC_DIR to an
+empty directory (startup.sh does this in production) and every worker writes
+its samples there; /metrics then aggregates all workers. The directory must
+be emptied before the workers start.
+"""
+import os
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import REGISTRY, multiprocess
+from sqlalchemy import event, exc
+from sqlalchemy.orm import Session
+
+from . import server_timing
+
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# ==================
+# Metrics
+# ==================
+
+http_requests = Counter(
+    "petfit_http_requests_total", "HTTP requests", ["method", "route", "status"]
+)
+http_request_duration = Histogram(
+    "petfit_http_request_duration_seconds", "HTTP request latency", ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+http_requests_in_progress = Gauge(
+    "petfit_http_requests_in_progress", "HTTP requests being served", ["method"],
+    multiprocess_mode="livesum"
+)
+
+db_pool_size = Gauge(
+    "petfit_db_pool_size", "Connections the pool keeps open", ["engine"], multiprocess_mode="livesum"
+)
+db_pool_checked_out = Gauge(
+    "petfit_db_pool_checked_out", "Connections in use", ["engine"], multiprocess_mode="livesum"
+)
+db_pool_checked_in = Gauge(
+    "petfit_db_pool_checked_in", "Idle connections in the pool", ["engine"], multiprocess_mode="livesum"
+)
+db_pool_overflow = Gauge(
+    "petfit_db_pool_overflow", "Connections open beyond the pool size", ["engine"], multiprocess_mode="livesum"
+)
+db_pool_wait = Histogram(
+    "petfit_db_pool_wait_seconds", "Time to get a connection from the pool", ["engine"],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30)
+)
+db_pool_timeouts = Counter(
+    "petfit_db_pool_timeouts_total", "Connection requests that hit pool_timeout", ["engine"]
+)
+
+BUSINESS_EVENTS = {
+    "exercise_logged": Counter("petfit_exercise_sessions_total", "Exercise sessions logged"),
+    "daily_quest_claimed": Counter("petfit_daily_quests_claimed_total", "Daily quest rewards claimed"),
+    "quest_completed": Counter("petfit_quests_completed_total", "User quests completed"),
+    "breakthrough": Counter("petfit_breakthroughs_total", "Breakthroughs completed"),
+    "travel_checkin": Counter("petfit_travel_checkins_total", "Travel check-ins"),
+}
+
+# ==================
+# HTTP
+# ==================
+
+class MetricsMiddleware:
+    """Count and time every HTTP request by method and matched route template."""
+
+    def __init__(self, app):
+        self.app = app
+        self._children = {}  # (method, route, status) -> (counter, histogram) children
+        self._in_progress = {}  # method -> gauge child
+
+    def _record(self, method: str, route: str, status: int, seconds: float):
+        key = (method, route, status)
+        children = self._children.get(key)
+        if children is None:
+            children = self._children[key] = (
+                http_requests.labels(method, route, str(status)),
+                http_request_duration.labels(method, route)
+            )
+        children[0].inc()
+        children[1].observe(seconds)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500  # unless a response starts
+        in_progress = self._in_progress.get(method)
+        if in_progress is None:
+            in_progress = self._in_progress[method] = http_requests_in_progress.labels(method)
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_progress.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_progress.dec()
+            # The router puts the matched route in the scope; unmatched paths share one label
+            route = scope.get("route")
+            self._record(method, route.path if route else "unmatched", status, time.perf_counter() - started)
+
+# ==================
+# Database pool
+# ==================
+
+def instrumented_pool(base, engine_name: str):
+    """
+    A subclass of the QueuePool class `base` that records checkout wait time,
+    pool_timeout hits and the pool gauges for `engine_name`.
+    """
+    wait = db_pool_wait.labels(engine_name)
+    timeouts = db_pool_timeouts.labels(engine_name)
+    checked_out = db_pool_checked_out.labels(engine_name)
+    checked_in = db_pool_checked_in.labels(engine_name)
+    overflow = db_pool_overflow.labels(engine_name)
+
+    class InstrumentedPool(base):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            db_pool_size.labels(engine_name).set(self.size())
+
+        def _update_gauges(self):
+            checked_out.set(self.checkedout())
+            checked_in.set(self.checkedin())
+            overflow.set(max(0, self.overflow()))
+
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                connection = super()._do_get()
+            except exc.TimeoutError:
+                timeouts.inc()
+                raise
+            finally:
+                seconds = time.perf_counter() - started
+                wait.observe(seconds)
+                server_timing.add("pool", seconds)
+            self._update_gauges()
+            return connection
+
+        def _do_return_conn(self, record):
+            super()._do_return_conn(record)
+            self._update_gauges()
+
+    InstrumentedPool.__name__ = f"Instrumented{base.__name__}"
+    return InstrumentedPool
+
+# ==================
+# Business events
+# ==================
+
+def count_on_commit(db, name: str, amount: int = 1):
+    """Count a business event once the session's transaction commits (Session or AsyncSession)."""
+    events = db.info.setdefault("metrics_events", {})
+    events[name] = events.get(name, 0) + amount
+
+@event.listens_for(Session, "after_commit")
+def _count_events(session):
+    events = session.info.pop("metrics_events", None)
+    if events:
+        for name, amount in events.items():
+            BUSINESS_EVENTS[name].inc(amount)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_events(session):
+    session.info.pop("metrics_events", None)
+
+# ==================
+# Exposition
+# ==================
+
+def render():
+    """(body, content type) for GET /metrics, aggregated over all workers in multiprocess mode."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+def worker_exit():
+    """Drop this worker's live gauges (in progress, pool) from the multiprocess aggregate."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
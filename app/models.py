@@ -1,10 +1,14 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, DateTime, Enum as SAEnum
+from sqlalchemy import BigInteger, Boolean, Column, ForeignKey, Index, Integer, String, Float, Date, DateTime, Enum as SAEnum
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, literal_column, text
 import enum
+import os
 
 from .database import Base
 
+# Time zone for pets without one (IANA name); daily resets happen at local midnight
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "Asia/Taipei")
+
 # Define pet growth stages
 class PetStage(int, enum.Enum):
     EGG = 0
@@ -45,19 +49,22 @@ class Pet(Base):
     daily_steps = Column(Integer, default=0) # Today's accumulated walking steps
     last_reset_date = Column(DateTime(timezone=True), nullable=True) # Last date when daily stats were reset
     
-    # Daily quest tracking (independent system)
-    daily_quest_1_completed = Column(Boolean, default=False) # Quest 1: 每日登入 (False = ready to claim)
-    daily_quest_2_completed = Column(Boolean, default=True) # Quest 2: 運動十分鐘 (True = not achieved yet)
-    daily_quest_3_completed = Column(Boolean, default=True) # Quest 3: 走路5000步 (True = not achieved yet)
+    # Daily quest tracking (independent system): bit (quest id - 1) is set once
+    # the quest's reward was claimed today, see daily_quests.py
+    daily_quests_claimed = Column(BigInteger, nullable=False, default=0, server_default=text("0"))
     
     # Breakthrough tracking
     breakthrough_completed = Column(Boolean, default=False) # Tracks if breakthrough is needed
     last_daily_check = Column(DateTime(timezone=True), nullable=True) # Last time daily check was performed
+    timezone = Column(String, nullable=False, default=DEFAULT_TIMEZONE, server_default=DEFAULT_TIMEZONE) # Owner's IANA time zone, used for the daily reset
     
     # Growth Stage
     stage = Column(SAEnum(PetStage), default=PetStage.EGG)
     
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now())
+    # Bumped by every UPDATE (ORM or Core) of the row; used for pet ETags
+    version = Column(Integer, nullable=False, default=1, server_default=text("1"),
+                     onupdate=literal_column("version") + 1)
 
     # Create relationship with User
     owner_id = Column(String, ForeignKey("users.id"))  # String to match User.id
@@ -66,6 +73,16 @@ class Pet(Base):
     # Create relationship with ExerciseLog
     exercise_logs = relationship("ExerciseLog", back_populates="pet")
 
+    __table_args__ = (
+        # Nightly reset: pets per time zone not yet checked since local midnight
+        Index("ix_pets_timezone_last_daily_check", "timezone", "last_daily_check"),
+        # Level leaderboard order
+        Index("ix_pets_level_strength", "level", "strength"),
+    )
+    # Read updated_at / version back with RETURNING on UPDATE, instead of a
+    # SELECT the next time they are accessed
+    __mapper_args__ = {"eager_defaults": True}
+
 class ExerciseLog(Base):
     __tablename__ = "exercise_logs"
     
@@ -82,6 +99,22 @@ class ExerciseLog(Base):
     user = relationship("User", back_populates="exercise_logs")
     pet = relationship("Pet", back_populates="exercise_logs")
 
+    __table_args__ = (
+        # Keyset pagination of a user's logs
+        Index("ix_exercise_logs_user_id_id", "user_id", "id"),
+    )
+
+# Per-user, per-day exercise totals (maintained by log_exercise)
+class DailyExerciseRollup(Base):
+    __tablename__ = "daily_exercise_rollup"
+
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)  # String to match User.id
+    day = Column(Date, primary_key=True)  # Owner's local date the exercise was logged
+    seconds = Column(Integer, default=0, nullable=False)  # Sum of duration_seconds
+    steps = Column(Integer, default=0, nullable=False)  # Sum of steps
+    strength_points = Column(Integer, default=0, nullable=False)  # Sum of duration_seconds // 10 per session
+    sessions = Column(Integer, default=0, nullable=False)  # Number of exercise logs
+
 # Static definitions for daily quests
 class Quest(Base):
     __tablename__ = "quests"
@@ -107,6 +140,13 @@ class UserQuest(Base):
     user = relationship("User", back_populates="quests")
     quest = relationship("Quest")
 
+    __table_args__ = (
+        # Keyset pagination of a user's quests
+        Index("ix_user_quests_user_id_id", "user_id", "id"),
+        # Looking up a user's quests for today
+        Index("ix_user_quests_user_id_date", "user_id", "date"),
+    )
+
 # Travel checkins (location-based quests)
 class TravelCheckin(Base):
     __tablename__ = "travel_checkins"
@@ -120,6 +160,13 @@ class TravelCheckin(Base):
     
     user = relationship("User", back_populates="travel_checkins")
 
+    __table_args__ = (
+        # Keyset pagination of a user's checkins
+        Index("ix_travel_checkins_user_id_id", "user_id", "id"),
+        # One checkin per location; duplicates are rejected by INSERT ... ON CONFLICT
+        Index("uq_travel_checkins_user_id_quest_id", "user_id", "quest_id", unique=True),
+    )
+
 # Attractions (for breakthrough quests)
 class Attraction(Base):
     __tablename__ = "attractions"
@@ -0,0 +1,60 @@
+"""
+Keyset (cursor) pagination for list endpoints.
+
+A page is the rows strictly after the cursor in a fixed key order, so
+fetching page 1000 costs the same as page 1 given an index on (user_id, key).
+Per-user lists are keyed by primary key: ids are assigned at insert time,
+together with the created_at / completed_at / date server defaults, so id
+order is chronological order. Cursors are opaque URL-safe tokens encoding the
+key of the last row of the previous page; list endpoints return the cursor
+for the next page in the X-Next-Cursor response header (absent on the last
+page).
+"""
+import base64
+import json
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(*values) -> str:
+    raw = json.dumps(list(values), separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> list:
+    """Values encoded in the cursor. Raises ValueError for a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values
+
+def paginate(db: Session, stmt, columns, cursor: str = None, limit: int = DEFAULT_PAGE_SIZE,
+             descending: bool = True):
+    """
+    Run an ORM select one page at a time, ordered by `columns` (together
+    unique, e.g. ending in the primary key). Returns (rows, next_cursor).
+    """
+    if cursor:
+        values = decode_cursor(cursor)
+        # Exact types: bool is an int subclass, but true / false is no id
+        if len(values) != len(columns) or not all(
+            type(value) is column.type.python_type for column, value in zip(columns, values)
+        ):
+            raise ValueError("Invalid cursor")
+        key = tuple_(*columns)
+        stmt = stmt.where(key < tuple_(*values) if descending else key > tuple_(*values))
+
+    order = [column.desc() if descending else column.asc() for column in columns]
+    rows = db.execute(stmt.order_by(*order).limit(limit + 1)).scalars().all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*[getattr(rows[-1], column.key) for column in columns])
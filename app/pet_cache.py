@@ -0,0 +1,242 @@
+"""
+Read-through pet state cache.
+
+Pet rows are cached by owner user_id as plain dicts of column values, so the
+read-heavy endpoints (GET /users/{user_id}/pet, /daily-quests, /daily-stats)
+can be answered without a database round trip. Entries expire after
+PET_CACHE_TTL_SECONDS and the cache holds at most PET_CACHE_MAX_ENTRIES.
+
+The write paths keep it current the same way as the leaderboard:
+- Core UPDATE ... RETURNING paths call track() with the full returned row
+- other Core writes call invalidate()
+- ORM writes to Pet objects are invalidated by an after_flush hook
+Changes are only applied once the session commits, and dropped on rollback.
+
+PET_CACHE_BACKEND picks the backend:
+- memory (default): per-process LRU dict
+- local-shared: a SQLite file shared by every worker process on the host,
+  standing in for a shared cache (Redis / memcached) with the same semantics -
+  values are serialized and every process sees every write
+- none: caching disabled
+With several worker processes and the memory backend, a worker only sees
+writes made elsewhere once its entry expires, so startup.sh defaults the
+multi-worker production mode to local-shared.
+"""
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from . import models
+
+PET_CACHE_BACKEND = os.getenv("PET_CACHE_BACKEND", "memory").lower()
+PET_CACHE_TTL_SECONDS = float(os.getenv("PET_CACHE_TTL_SECONDS", "60"))
+PET_CACHE_MAX_ENTRIES = int(os.getenv("PET_CACHE_MAX_ENTRIES", "10000"))
+PET_CACHE_PATH = os.getenv("PET_CACHE_PATH", os.path.join(tempfile.gettempdir(), "petfit_pet_cache.sqlite"))
+
+# ==================
+# Backends
+# ==================
+
+class CacheBackend:
+    """Interface for pet cache backends. Values are dicts of pet column values."""
+
+    def get(self, key: str):
+        raise NotImplementedError
+
+    def set(self, key: str, value: dict):
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+class NullBackend(CacheBackend):
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+class MemoryBackend(CacheBackend):
+    """In-process LRU with a TTL."""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (expires_at, value), least recently used first
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class LocalSharedBackend(CacheBackend):
+    """
+    SQLite-file cache shared by all processes on the host. When over
+    max_entries, the least recently written entries are evicted.
+    """
+
+    def __init__(self, path: str, max_entries: int, ttl_seconds: float):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pet_cache "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute(
+            "SELECT value FROM pet_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def set(self, key, value):
+        expires_at = time.time() + self.ttl_seconds
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO pet_cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, pickle.dumps(value), expires_at)
+        )
+        # Entries written together share a TTL, so expires_at order is write order
+        conn.execute(
+            "DELETE FROM pet_cache WHERE expires_at <= ? OR key IN "
+            "(SELECT key FROM pet_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (time.time(), self.max_entries)
+        )
+
+    def delete(self, key):
+        self._connect().execute("DELETE FROM pet_cache WHERE key = ?", (key,))
+
+    def clear(self):
+        self._connect().execute("DELETE FROM pet_cache")
+
+def make_backend(name: str = PET_CACHE_BACKEND) -> CacheBackend:
+    if name == "none":
+        return NullBackend()
+    if name == "local-shared":
+        return LocalSharedBackend(PET_CACHE_PATH, PET_CACHE_MAX_ENTRIES, PET_CACHE_TTL_SECONDS)
+    if name == "memory":
+        return MemoryBackend(PET_CACHE_MAX_ENTRIES, PET_CACHE_TTL_SECONDS)
+    raise ValueError(f"Unknown PET_CACHE_BACKEND: {name}")
+
+# ==================
+# Cache
+# ==================
+
+class PetCache:
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._writes = 0  # bumped on every write-path change, see load()
+
+    def get(self, user_id: str):
+        """Cached pet state for the user, or None on a miss. Treat the result as read-only."""
+        return self.backend.get(user_id)
+
+    def load(self, db: Session, user_id: str):
+        """Read-through: cached pet state, else read the pet row and cache it. None if no pet."""
+        pet = self.backend.get(user_id)
+        if pet is not None:
+            return pet
+        writes = self._writes
+        pets = models.Pet.__table__
+        row = db.execute(select(pets).where(pets.c.owner_id == user_id)).mappings().first()
+        if row is None:
+            return None
+        pet = dict(row)
+        if user_id in db.info.get("pet_cache_updates", {}):
+            # Written in this (uncommitted) transaction; cached on commit instead
+            return pet
+        # Don't cache a row read before a write that committed meanwhile
+        with self._lock:
+            if writes == self._writes:
+                self.backend.set(user_id, pet)
+        return pet
+
+    def apply(self, updates: dict):
+        """Apply committed changes: user_id -> full pet row, or None to invalidate."""
+        with self._lock:
+            self._writes += 1
+            for user_id, pet in updates.items():
+                if pet is None:
+                    self.backend.delete(user_id)
+                else:
+                    self.backend.set(user_id, pet)
+
+pet_cache = PetCache(make_backend())
+
+# ==================
+# Session hooks
+# ==================
+
+def track(db: Session, pet: dict):
+    """Queue a full pet row (e.g. from UPDATE ... RETURNING *) to be cached on commit."""
+    db.info.setdefault("pet_cache_updates", {})[pet["owner_id"]] = dict(pet)
+
+def invalidate(db: Session, user_id: str):
+    """Queue the user's entry to be dropped on commit."""
+    db.info.setdefault("pet_cache_updates", {})[user_id] = None
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_flushed_pets(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, models.Pet) and obj.owner_id is not None:
+            invalidate(session, obj.owner_id)
+
+@event.listens_for(Session, "after_commit")
+def _apply_updates(session):
+    updates = session.info.pop("pet_cache_updates", None)
+    if updates:
+        pet_cache.apply(updates)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_updates(session):
+    session.info.pop("pet_cache_updates", None)
@@ -0,0 +1,173 @@
+"""
+Pet game rules, free of the ORM and the database.
+
+The rules work on a PetState, a small __slots__ value holding just the stats
+they read and write, so they can be run in bulk (log_exercise_batch),
+benchmarked or tested without a session. crud.py loads a PetState from a Pet
+object or a pets row, applies a rule and writes the changed columns back;
+crud_atomic.py evaluates the same rules in SQL.
+
+- Strength: every STRENGTH_PER_LEVEL points is a level, up to MAX_LEVEL.
+  Levels gained are computed in closed form rather than one at a time.
+- Breakthrough: reaching a level that is a multiple of BREAKTHROUGH_INTERVAL
+  stops strength gains until a breakthrough (travel check-in) is completed.
+- Every level up refills stamina and adds LEVEL_UP_MOOD_BONUS mood.
+- Stamina is kept within 0..MAX_STAMINA and mood within 0..MAX_MOOD.
+- Stage follows the level, but only changes once the milestone's breakthrough
+  is completed; it is looked up in tables built from LEVEL_STAGE_MAP.
+"""
+from .models import PetStage
+
+MAX_LEVEL = 25
+STRENGTH_PER_LEVEL = 120  # 120 points = 1200 seconds = 20 minutes
+MIN_DAILY_STRENGTH = 60   # Minimum 60 points (10 minutes) per day to maintain mood
+MAX_STAMINA = 900  # Maximum stamina value, reset daily
+MAX_MOOD = 100
+BREAKTHROUGH_INTERVAL = 5  # Breakthrough needed at levels 5, 10, 15, 20, 25
+LEVEL_UP_MOOD_BONUS = 10
+MISSED_DAY_MOOD_PENALTY = 10
+MISSED_DAY_STRENGTH_PENALTY = 10
+
+# Map of levels to stages (only after breakthrough)
+# Stage evolution happens AFTER breakthrough at level milestones
+LEVEL_STAGE_MAP = {
+    1: PetStage.EGG,        # Level 1-4 (before lv5 breakthrough)
+    5: PetStage.CHICK,      # After lv5 breakthrough
+    10: PetStage.CHICKEN,   # After lv10 breakthrough
+    15: PetStage.BIG_CHICKEN, # After lv15 breakthrough
+    20: PetStage.BUFF_CHICKEN # After lv20 breakthrough
+}
+
+def stage_tables(max_level: int = MAX_LEVEL, breakthrough_interval: int = BREAKTHROUGH_INTERVAL):
+    """Stage per level 0..max_level: (breakthrough completed, breakthrough pending)."""
+    completed = []
+    stage = PetStage.EGG
+    for level in range(max_level + 1):
+        stage = LEVEL_STAGE_MAP.get(level, stage)
+        completed.append(stage)
+    # At a milestone without its breakthrough, stay at the previous milestone's stage
+    # (level 5 has no earlier milestone and shows CHICK either way)
+    pending = [
+        completed[level - breakthrough_interval]
+        if level % breakthrough_interval == 0 and level > breakthrough_interval else stage
+        for level, stage in enumerate(completed)
+    ]
+    return tuple(completed), tuple(pending)
+
+STAGE_BY_LEVEL, STAGE_BY_LEVEL_PENDING_BREAKTHROUGH = stage_tables()
+
+class PetState:
+    """The pet stats the rules operate on."""
+
+    __slots__ = ("strength", "stamina", "mood", "level", "stage", "breakthrough_completed")
+
+    def __init__(self, strength: int = 0, stamina: int = MAX_STAMINA, mood: int = 0, level: int = 1,
+                 stage: PetStage = PetStage.EGG, breakthrough_completed: bool = False):
+        self.strength = strength
+        self.stamina = stamina
+        self.mood = mood
+        self.level = level
+        self.stage = stage
+        self.breakthrough_completed = breakthrough_completed
+
+    @classmethod
+    def from_dict(cls, pet) -> "PetState":
+        """From a pets row / pet state dict."""
+        return cls(*(pet[name] for name in cls.__slots__))
+
+    @classmethod
+    def from_object(cls, pet) -> "PetState":
+        """From a models.Pet (or anything with the same attributes)."""
+        return cls(*(getattr(pet, name) for name in cls.__slots__))
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def write_to(self, pet):
+        """Set the changed stats on a models.Pet; unchanged attributes are left alone."""
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if getattr(pet, name) != value:
+                setattr(pet, name, value)
+
+    def __eq__(self, other):
+        return isinstance(other, PetState) and self.as_dict() == other.as_dict()
+
+    def __repr__(self):
+        return "PetState(%s)" % ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+
+def clamp(value: int, low: int, high: int) -> int:
+    return low if value < low else high if value > high else value
+
+def needs_breakthrough(level: int, breakthrough_completed: bool) -> bool:
+    """Pet is at level 5, 10, 15, ... and has not done the breakthrough yet."""
+    return level % BREAKTHROUGH_INTERVAL == 0 and level >= BREAKTHROUGH_INTERVAL and not breakthrough_completed
+
+def stage_for_level(level: int, breakthrough_completed: bool) -> PetStage:
+    """
+    Determine the pet's stage based on level and breakthrough status.
+    Stage only changes AFTER completing breakthrough at level milestones (5, 10, 15, 20).
+    """
+    level = clamp(level, 0, MAX_LEVEL)
+    if breakthrough_completed:
+        return STAGE_BY_LEVEL[level]
+    return STAGE_BY_LEVEL_PENDING_BREAKTHROUGH[level]
+
+def apply_stats(pet: PetState, strength: int = 0, stamina: int = 0, mood: int = 0) -> bool:
+    """
+    Apply stat changes to the pet in place.
+    Returns True if strength gains were blocked by a pending breakthrough
+    (stamina and mood still change).
+    """
+    if strength > 0 and needs_breakthrough(pet.level, pet.breakthrough_completed):
+        pet.stamina = clamp(pet.stamina + stamina, 0, MAX_STAMINA)
+        pet.mood = clamp(pet.mood + mood, 0, MAX_MOOD)
+        return True
+
+    total = pet.strength + strength
+    # Level up while there is strength for it, stopping at MAX_LEVEL or the next breakthrough level
+    levels = max(0, min(
+        total // STRENGTH_PER_LEVEL,
+        MAX_LEVEL - pet.level,
+        BREAKTHROUGH_INTERVAL - pet.level % BREAKTHROUGH_INTERVAL
+    ))
+    if levels:
+        pet.level += levels
+        pet.stamina = MAX_STAMINA
+        pet.mood += levels * LEVEL_UP_MOOD_BONUS
+        if pet.level % BREAKTHROUGH_INTERVAL == 0:
+            pet.breakthrough_completed = False
+
+    if needs_breakthrough(pet.level, pet.breakthrough_completed):
+        pet.strength = 0
+    else:
+        pet.strength = total - levels * STRENGTH_PER_LEVEL
+
+    pet.stamina = clamp(pet.stamina + stamina, 0, MAX_STAMINA)
+    pet.mood = clamp(pet.mood + mood, 0, MAX_MOOD)
+    pet.stage = stage_for_level(pet.level, pet.breakthrough_completed)
+    return False
+
+def complete_breakthrough(pet: PetState):
+    """Complete the breakthrough in place. Returns None, or why it is not possible."""
+    if pet.level % BREAKTHROUGH_INTERVAL != 0 or pet.level < BREAKTHROUGH_INTERVAL:
+        return "Not at a breakthrough level"
+    if pet.breakthrough_completed:
+        return "Breakthrough already completed for this level"
+    pet.breakthrough_completed = True
+    pet.stage = stage_for_level(pet.level, True)
+    return None
+
+def start_new_day(pet: PetState, strength_yesterday: int) -> bool:
+    """
+    Daily check: refill stamina; if yesterday's strength points are below
+    MIN_DAILY_STRENGTH, lower mood, and strength too once mood is 0.
+    Returns whether the requirement was met.
+    """
+    pet.stamina = MAX_STAMINA
+    met_requirement = strength_yesterday >= MIN_DAILY_STRENGTH
+    if not met_requirement:
+        pet.mood = max(0, pet.mood - MISSED_DAY_MOOD_PENALTY)
+        if pet.mood == 0 and pet.strength > 0:
+            pet.strength = max(0, pet.strength - MISSED_DAY_STRENGTH_PENALTY)
+    return met_requirement
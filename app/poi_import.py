@@ -0,0 +1,201 @@
+"""
+Bulk attraction (POI) import.
+
+Loads JSON or CSV POI files - e.g. Taipei open data exports with tens of
+thousands of entries - into the attractions table. The file is parsed as a
+stream, one record at a time, and upserted IMPORT_BATCH_SIZE rows per
+INSERT ... ON CONFLICT (name) DO UPDATE statement, each batch in its own
+transaction, so memory use does not grow with the file size.
+
+Accepted input:
+- JSON: a top-level array of objects, or newline-delimited objects (NDJSON)
+- CSV: a header row and one POI per row
+Field names are matched case-insensitively against FIELD_ALIASES, so the
+common open-data spellings (stitle / Px / Py, lat / lng, ...) work as is.
+Records without a name are skipped.
+
+Run it with:
+    python -m app.poi_import pois.json [--format json|csv] [--batch-size N]
+or POST the file to /admin/attractions/import.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import time
+
+from sqlalchemy.orm import Session
+
+from . import attractions, crud_atomic, models
+from .database import SessionLocal
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "5000"))
+
+IMPORT_FORMATS = ("json", "csv")
+
+FIELD_ALIASES = {
+    "name": ("name", "title", "stitle", "名稱"),
+    "description": ("description", "desc", "introduction", "xbody", "簡介"),
+    "latitude": ("latitude", "lat", "py", "緯度"),
+    "longitude": ("longitude", "lng", "lon", "px", "經度"),
+}
+
+JSON_READ_SIZE = 64 * 1024
+JSON_MAX_RECORD_SIZE = 1024 * 1024
+
+# ==================
+# Parsing
+# ==================
+
+def read_json(stream):
+    """Objects from a text stream holding a JSON array or NDJSON, one at a time."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    eof = False
+    started = False
+    while True:
+        # Skip separators between objects
+        while position < len(buffer) and (buffer[position].isspace() or buffer[position] in ",["):
+            if buffer[position] == "[":
+                if started:
+                    raise ValueError("Nested arrays are not supported")
+                started = True
+            position += 1
+        if position < len(buffer) and buffer[position] == "]":
+            return
+        if position < len(buffer):
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof or len(buffer) - position > JSON_MAX_RECORD_SIZE:
+                    raise ValueError(f"Invalid JSON near: {buffer[position:position + 80]!r}")
+                record = None  # object cut off by the end of the buffer, read more
+            if record is not None:
+                if not isinstance(record, dict):
+                    raise ValueError("Expected JSON objects")
+                yield record
+                position = end
+                continue
+        elif eof:
+            return
+        chunk = stream.read(JSON_READ_SIZE)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+def read_csv(stream):
+    return csv.DictReader(stream)
+
+def _float(value):
+    if value is None or value == "":
+        return None
+    return float(value)
+
+def normalize(record: dict):
+    """An attractions row for the record, or None if it has no name."""
+    fields = {str(key).strip().lower(): value for key, value in record.items()}
+    row = {}
+    for column, aliases in FIELD_ALIASES.items():
+        row[column] = next((fields[alias] for alias in aliases if fields.get(alias) not in (None, "")), None)
+    name = str(row["name"]).strip() if row["name"] is not None else ""
+    if not name:
+        return None
+    row["name"] = name
+    if row["description"] is not None:
+        row["description"] = str(row["description"])
+    row["latitude"] = _float(row["latitude"])
+    row["longitude"] = _float(row["longitude"])
+    return row
+
+# ==================
+# Upsert
+# ==================
+
+def _upsert_statement(db: Session):
+    table = models.Attraction.__table__
+    stmt = crud_atomic.dialect_insert(db, table)
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.name],
+        set_={column: stmt.excluded[column] for column in ("description", "latitude", "longitude")}
+    )
+
+def _write_batch(db: Session, stmt, batch: dict):
+    try:
+        db.execute(stmt, list(batch.values()))
+        attractions.invalidate(db)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Error in import_attractions: {e}")
+        raise e
+
+def import_attractions(records, batch_size: int = IMPORT_BATCH_SIZE, progress=None):
+    """
+    Upsert attractions from an iterable of raw records (see normalize()).
+    Calls progress(summary) after each batch. Returns the final summary.
+    """
+    summary = {"rows": 0, "skipped": 0, "batches": 0, "seconds": 0.0, "rows_per_second": 0.0}
+    started = time.perf_counter()
+
+    def report():
+        summary["seconds"] = round(time.perf_counter() - started, 3)
+        summary["rows_per_second"] = round(summary["rows"] / summary["seconds"], 1) if summary["seconds"] else 0.0
+        if progress:
+            progress(summary)
+
+    db = SessionLocal()
+    try:
+        stmt = _upsert_statement(db)
+        batch = {}  # name -> row; a statement may not upsert the same name twice
+        for record in records:
+            row = normalize(record)
+            if row is None:
+                summary["skipped"] += 1
+                continue
+            batch[row["name"]] = row
+            if len(batch) >= batch_size:
+                _write_batch(db, stmt, batch)
+                summary["rows"] += len(batch)
+                summary["batches"] += 1
+                batch = {}
+                report()
+        if batch:
+            _write_batch(db, stmt, batch)
+            summary["rows"] += len(batch)
+            summary["batches"] += 1
+        report()
+    finally:
+        db.close()
+    return summary
+
+def import_file(stream, format: str, batch_size: int = IMPORT_BATCH_SIZE, progress=None):
+    """Import a binary file object holding a JSON / CSV POI file."""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    records = read_csv(text) if format == "csv" else read_json(text)
+    try:
+        return import_attractions(records, batch_size, progress)
+    finally:
+        text.detach()
+
+def main():
+    parser = argparse.ArgumentParser(description="Import attractions from a JSON / CSV POI file")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=IMPORT_FORMATS, help="default: from the file extension")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    format = args.format or ("csv" if args.path.lower().endswith(".csv") else "json")
+    with open(args.path, "rb") as stream:
+        summary = import_file(
+            stream, format, args.batch_size,
+            progress=lambda s: print(f"  {s['rows']} rows ({s['rows_per_second']:.0f} rows/s)")
+        )
+    print(
+        f"✓ Imported {summary['rows']} attractions in {summary['seconds']}s "
+        f"({summary['rows_per_second']:.0f} rows/s), skipped {summary['skipped']} without a name"
+    )
+
+if __name__ == "__main__":
+    main()
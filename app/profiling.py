@@ -0,0 +1,257 @@
+"""
+On-demand sampling profiler and allocation tracing.
+
+Nothing runs until a profile is asked for, in one of two ways:
+- POST /admin/profile?seconds=10 (X-Admin-Token) samples this worker process
+  for that many seconds and then returns.
+- A request carrying a valid X-Profile header is profiled on its own. The
+  header is `<expires>.<signature>`, an HMAC-SHA256 with PROFILE_SECRET over
+  the expiry time, method and path, so a leaked header only works for one
+  route and briefly:
+      python -m app.profiling sign GET /users/u1/pet
+  ProfileMiddleware is only installed when PROFILE_SECRET is set.
+
+The sampler is a thread that records the stack of every other thread each
+interval (sys._current_frames), so there is no tracing cost in the profiled
+code. Samples of an event loop thread show the coroutine that was running.
+All threads are sampled, so a request profile also contains whatever other
+requests the worker was serving at the time. With several workers only the
+worker that received the request is profiled.
+
+Output goes to PROFILE_DIR, named <time>-<pid>-<label>:
+- .collapsed: one "thread;frame;frame... count" line per distinct stack, the
+  input format of flamegraph.pl, speedscope and inferno
+- .alloc.txt (memory=true / X-Profile-Memory: 1): the top allocation sites
+  still alive at the end, from tracemalloc started for the profile only (or,
+  if tracing was already on, the top changes since the profile started)
+"""
+import argparse
+import hashlib
+import hmac
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+import anyio
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/petfit-profiles")
+PROFILE_SECRET = os.getenv("PROFILE_SECRET")  # unset disables the X-Profile header
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_REQUEST_INTERVAL_MS = float(os.getenv("PROFILE_REQUEST_INTERVAL_MS", "1"))
+TRACEMALLOC_FRAMES = 10
+ALLOCATION_TOP = 50
+# Leaf frames of threads that are waiting, left out of the summary's hottest frames
+IDLE_FRAMES = ("(threading.py:", "(selectors.py:", "(queue.py:", "_write_to_self (")
+
+class ProfileBusy(Exception):
+    pass
+
+# One profile at a time per process: the sampler sees every thread anyway,
+# and tracemalloc is process wide
+_busy = threading.Lock()
+
+class Profile:
+    """
+    Sample all thread stacks every `interval_ms` while the block runs and,
+    with `memory`, trace allocations. Raises ProfileBusy if a profile is
+    already running. The output files are written on exit (see `files`).
+
+        with Profile("checkout") as profile:
+            ...
+
+    On the event loop use `await profile.start_async()` / `stop_async()`
+    instead: stopping joins the sampler, snapshots tracemalloc and writes the
+    files, which would stall every request on the worker.
+    """
+
+    def __init__(self, label: str, interval_ms: float = PROFILE_INTERVAL_MS, memory: bool = False):
+        self.label = "".join(c if c.isalnum() or c in "-_." else "_" for c in label)[:80]
+        self.interval = max(interval_ms, 0.1) / 1000
+        self.memory = memory
+        self.stacks = Counter()  # collapsed stack -> samples
+        self.samples = 0
+        self.seconds = 0.0
+        self.files = []
+        self._stop = threading.Event()
+        self._thread = None
+        self._started = None
+        self._own_tracing = False  # tracemalloc was started by this profile
+        self._baseline = None  # snapshot at start when tracing was already on
+
+    def start(self):
+        if not _busy.acquire(blocking=False):
+            raise ProfileBusy("A profile is already running in this process")
+        if self.memory:
+            # Tracing started by someone else (PYTHONTRACEMALLOC, a debugger)
+            # is left running; the report then only covers what changed
+            if tracemalloc.is_tracing():
+                self._baseline = tracemalloc.take_snapshot()
+            else:
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+                self._own_tracing = True
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        try:
+            self._stop.set()
+            self._thread.join()
+            self.seconds = time.perf_counter() - self._started
+            snapshot = None
+            if self.memory:
+                snapshot = tracemalloc.take_snapshot()
+                if self._own_tracing:
+                    tracemalloc.stop()
+            self._write(snapshot)
+        finally:
+            _busy.release()
+
+    # Off the event loop, on a thread of their own rather than the shared
+    # threadpool, which is likely busy while there is something to profile
+    async def start_async(self):
+        return await anyio.to_thread.run_sync(self.start, limiter=anyio.CapacityLimiter(1))
+
+    async def stop_async(self):
+        await anyio.to_thread.run_sync(self.stop, limiter=anyio.CapacityLimiter(1))
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _sample(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    # co_qualname is Python 3.11+; the image runs 3.10
+                    name = getattr(code, "co_qualname", code.co_name)
+                    stack.append(f"{name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def _write(self, snapshot):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(
+            PROFILE_DIR, f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{self.label}"
+        )
+        with open(base + ".collapsed", "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        self.files.append(base + ".collapsed")
+
+        if snapshot is not None:
+            filters = (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+            )
+            snapshot = snapshot.filter_traces(filters)
+            with open(base + ".alloc.txt", "w") as f:
+                if self._baseline is not None:
+                    f.write(f"Top {ALLOCATION_TOP} allocation changes over {self.seconds:.1f}s\n")
+                    stats = snapshot.compare_to(self._baseline.filter_traces(filters), "lineno")
+                else:
+                    f.write(f"Top {ALLOCATION_TOP} allocation sites alive after {self.seconds:.1f}s\n")
+                    stats = snapshot.statistics("lineno")
+                for stat in stats[:ALLOCATION_TOP]:
+                    f.write(f"{stat}\n")
+                f.write("\nTop 10 allocation tracebacks\n")
+                for stat in snapshot.statistics("traceback")[:10]:
+                    f.write(f"\n{stat}\n")
+                    f.writelines(f"    {line}\n" for line in stat.traceback.format())
+            self.files.append(base + ".alloc.txt")
+
+    def summary(self, top: int = 10) -> dict:
+        """What the admin endpoint returns: files, sample counts and the hottest non-idle leaf frames."""
+        leaves = Counter()
+        for stack, count in self.stacks.items():
+            leaf = stack.rsplit(";", 1)[-1]
+            if not any(idle in leaf for idle in IDLE_FRAMES):
+                leaves[leaf] += count
+        return {
+            "files": self.files,
+            "seconds": round(self.seconds, 3),
+            "samples": self.samples,
+            "top_frames": [{"frame": frame, "samples": count} for frame, count in leaves.most_common(top)],
+        }
+
+# ==================
+# Signed request header
+# ==================
+
+def sign(method: str, path: str, expires: int) -> str:
+    """X-Profile header value for `method path`, valid until the unix time `expires`."""
+    message = f"{expires}:{method.upper()}:{path}".encode()
+    return f"{expires}.{hmac.new(PROFILE_SECRET.encode(), message, hashlib.sha256).hexdigest()}"
+
+def verify(value: str, method: str, path: str) -> bool:
+    if not PROFILE_SECRET:
+        return False
+    expires, _, _ = value.partition(".")
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(value, sign(method, path, int(expires)))
+
+class ProfileMiddleware:
+    """Profile requests that carry a valid X-Profile header; others pass straight through."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        signature = memory = None
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                signature = value.decode("latin-1")
+            elif name == b"x-profile-memory":
+                memory = value in (b"1", b"true")
+        if signature is None or not verify(signature, scope["method"], scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        label = f"{scope['method']}{scope['path'].replace('/', '_')}"
+        profile = Profile(label, PROFILE_REQUEST_INTERVAL_MS, memory=bool(memory))
+        try:
+            await profile.start_async()
+        except ProfileBusy:
+            # Serve the request unprofiled rather than failing it
+            print(f"Profile skipped for {scope['method']} {scope['path']}: another profile is running")
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            await profile.stop_async()
+            print(f"Profiled {scope['method']} {scope['path']}: {profile.samples} samples -> {', '.join(profile.files)}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Sign an X-Profile header with PROFILE_SECRET")
+    parser.add_argument("command", choices=["sign"])
+    parser.add_argument("method")
+    parser.add_argument("path")
+    parser.add_argument("--ttl", type=int, default=300, help="Seconds the header stays valid")
+    args = parser.parse_args()
+    if not PROFILE_SECRET:
+        parser.error("PROFILE_SECRET is not set")
+    print(sign(args.method, args.path, int(time.time()) + args.ttl))
+
+if __name__ == "__main__":
+    main()
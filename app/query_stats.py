@@ -0,0 +1,189 @@
+"""
+Per-request SQL statistics.
+
+Engine event hooks count the statements every request executes and add up
+their database time; QueryStatsMiddleware reports them:
+- X-DB-Queries / X-DB-Time-Ms response headers (statements run before the
+  response starts, i.e. including the unit of work's commit)
+- one log line per request with QUERY_LOG_REQUESTS=true
+- a "Probable N+1" warning when the same statement text runs
+  N_PLUS_ONE_THRESHOLD or more times in one request
+- a slow query log entry, with its route, for every statement that takes
+  longer than SLOW_QUERY_MS
+
+Routes can declare how many statements they may issue with the budget()
+decorator. A request over its route's budget is logged, or raises
+QueryBudgetExceeded with QUERY_BUDGET_MODE=raise, which makes it fail under
+the TestClient; tests/test_query_budgets.py runs every budgeted route that
+way, cold and warm. Tests can also collect the stats of the requests they make:
+
+    with query_stats.capture() as requests:
+        client.get("/users/u1/pet")
+    assert requests[0].count <= 1
+
+Statements outside a request (startup, background jobs, CLIs) are not counted.
+"""
+import contextlib
+import contextvars
+import os
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+QUERY_STATS_ENABLED = os.getenv("QUERY_STATS_ENABLED", "true").lower() in ("1", "true", "yes")
+QUERY_LOG_REQUESTS = os.getenv("QUERY_LOG_REQUESTS", "false").lower() in ("1", "true", "yes")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", "log").lower()  # log | raise
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+class RequestQueries:
+    """Statement count and database time of one request."""
+
+    __slots__ = ("method", "scope", "count", "seconds", "statements")
+
+    def __init__(self, method: str, scope: dict):
+        self.method = method
+        self.scope = scope
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = Counter()  # statement text -> executions
+
+    @property
+    def route(self) -> str:
+        route = self.scope.get("route")
+        return route.path if route else self.scope.get("path", "")
+
+    @property
+    def budget(self):
+        route = self.scope.get("route")
+        return getattr(getattr(route, "endpoint", None), "query_budget", None)
+
+    def repeated(self):
+        """(statement, executions) run at least N_PLUS_ONE_THRESHOLD times, most first."""
+        return [(statement, n) for statement, n in self.statements.most_common() if n >= N_PLUS_ONE_THRESHOLD]
+
+    def __repr__(self):
+        return f"RequestQueries({self.method} {self.route}: {self.count} queries, {self.seconds * 1000:.1f}ms)"
+
+_current = contextvars.ContextVar("request_queries", default=None)
+
+# Lists registered by capture(); every finished request is appended to each
+_captures = []
+_captures_lock = threading.Lock()
+
+def current():
+    """Stats of the request being served, or None outside a request."""
+    return _current.get()
+
+def budget(queries: int):
+    """
+    Declare the most statements a route may execute, e.g. @query_stats.budget(2).
+    Count them with cold caches (pet cache miss, attraction catalog stale,
+    first call of the day), since that is what a fresh worker runs.
+    """
+    def decorate(endpoint):
+        endpoint.query_budget = queries
+        return endpoint
+    return decorate
+
+@contextlib.contextmanager
+def capture():
+    """Collect the RequestQueries of every request finished inside the block."""
+    requests = []
+    with _captures_lock:
+        _captures.append(requests)
+    try:
+        yield requests
+    finally:
+        with _captures_lock:
+            _captures.remove(requests)
+
+# ==================
+# Engine hooks
+# ==================
+
+def _short(statement: str, limit: int = 500) -> str:
+    statement = " ".join(statement.split())
+    return statement if len(statement) <= limit else statement[:limit] + "..."
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is None:
+        return
+    started = conn.info["query_started"].pop()
+    seconds = time.perf_counter() - started
+    stats.count += 1
+    stats.seconds += seconds
+    stats.statements[statement] += 1
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        print(f"Slow query ({seconds * 1000:.0f}ms) in {stats.method} {stats.route}: {_short(statement)}")
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    # after_cursor_execute does not run for a failed statement
+    started = exception_context.connection.info.get("query_started") if exception_context.connection else None
+    if started and _current.get() is not None:
+        started.pop()
+
+# ==================
+# Middleware
+# ==================
+
+def _report(stats: RequestQueries, status: int):
+    if QUERY_LOG_REQUESTS:
+        print(f"{stats.method} {stats.route} {status}: {stats.count} queries, {stats.seconds * 1000:.1f}ms")
+    for statement, executions in stats.repeated():
+        print(f"Probable N+1 in {stats.method} {stats.route}: {executions} x {_short(statement, 200)}")
+    with _captures_lock:
+        for requests in _captures:
+            requests.append(stats)
+    limit = stats.budget
+    if limit is not None and stats.count > limit:
+        message = f"{stats.method} {stats.route} ran {stats.count} queries, budget {limit}"
+        if QUERY_BUDGET_MODE == "raise":
+            raise QueryBudgetExceeded(message)
+        print(f"Query budget exceeded: {message}")
+
+class QueryStatsMiddleware:
+    """Count each request's statements and report them (see module docstring)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not QUERY_STATS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestQueries(scope["method"], scope)
+        status = 500
+
+        async def send_with_headers(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [
+                    (b"x-db-queries", str(stats.count).encode()),
+                    (b"x-db-time-ms", f"{stats.seconds * 1000:.1f}".encode()),
+                ]
+            await send(message)
+
+        token = _current.set(stats)
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _current.reset(token)
+        _report(stats, status)
@@ -0,0 +1,104 @@
+"""
+In-memory quest template registry.
+
+The quests table only holds the QUEST_TEMPLATES rows seeded at startup, so it
+is read into memory once: generating a user's daily quests needs no template
+lookups, and the quest nested in every UserQuest response is served from here
+instead of a join or a lazy load per row. Looking up a quest id or title that
+is not in memory (e.g. seeded by a newer deployment) reloads the table.
+
+Rows a request seeds itself are only used by that request until it commits;
+like the leaderboard and the attraction catalog, the registry follows
+committed data only, so a rollback cannot leave it with ids that have no row.
+"""
+import threading
+
+from sqlalchemy import event, or_, select
+from sqlalchemy.orm import Session
+
+from . import crud_atomic, models
+
+# Columns the templates own: updated on existing rows when the templates change
+TEMPLATE_COLUMNS = ("description", "reward_strength", "reward_stamina", "reward_mood")
+
+def upsert_statement(db: Session, templates):
+    """
+    Insert the templates (matched by title), updating the description and
+    rewards of existing rows that differ, so the table follows QUEST_TEMPLATES.
+    """
+    table = models.Quest.__table__
+    stmt = crud_atomic.dialect_insert(db, table).values(list(templates))
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c.title],
+        set_={column: stmt.excluded[column] for column in TEMPLATE_COLUMNS},
+        where=or_(*(table.c[column].is_distinct_from(stmt.excluded[column]) for column in TEMPLATE_COLUMNS))
+    )
+
+def _ids_by_title(by_id: dict) -> dict:
+    return {quest["title"]: quest["id"] for quest in by_id.values()}
+
+class QuestTemplateRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_id = {}  # quest id -> schemas.Quest as a dict
+        self._ids_by_title = {}
+
+    def load(self, db: Session) -> dict:
+        """
+        (Re)load all quest templates from the database; returns them by id.
+        A session that wrote templates itself only gets them for its own use:
+        the registry takes them in once it has committed (see the hooks below).
+        """
+        table = models.Quest.__table__
+        rows = db.execute(select(table)).mappings().all()
+        by_id = {row["id"]: dict(row) for row in rows}
+        if db.info.get("quest_templates_changed"):
+            return by_id
+        with self._lock:
+            self._by_id = by_id
+            self._ids_by_title = _ids_by_title(by_id)
+        return by_id
+
+    def invalidate(self):
+        """Drop the loaded templates; the next lookup reloads them."""
+        with self._lock:
+            self._by_id = {}
+            self._ids_by_title = {}
+
+    def seed(self, db: Session, templates):
+        """Upsert the templates in one statement (see upsert_statement); reloaded once the session commits."""
+        db.execute(upsert_statement(db, templates))
+        db.info["quest_templates_changed"] = True
+
+    def get(self, db: Session, quest_id: int):
+        """Quest template dict by id, or None."""
+        quest = self._by_id.get(quest_id)
+        if quest is None:
+            quest = self.load(db).get(quest_id)
+        return quest
+
+    def ids(self, db: Session, templates):
+        """Quest ids of the given templates, in order, seeding any that are missing."""
+        titles = [template["title"] for template in templates]
+        ids_by_title = self._ids_by_title
+        if any(title not in ids_by_title for title in titles):
+            ids_by_title = _ids_by_title(self.load(db))
+        if any(title not in ids_by_title for title in titles):
+            self.seed(db, templates)
+            ids_by_title = _ids_by_title(self.load(db))
+        return [ids_by_title[title] for title in titles]
+
+registry = QuestTemplateRegistry()
+
+# ==================
+# Session hooks
+# ==================
+
+@event.listens_for(Session, "after_commit")
+def _apply_changes(session):
+    if session.info.pop("quest_templates_changed", False):
+        registry.invalidate()
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop("quest_templates_changed", None)
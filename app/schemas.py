@@ -1,7 +1,7 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, computed_field, field_validator
+from typing import Dict, Optional, List
 from datetime import datetime
-from .models import PetStage
+from .models import DEFAULT_TIMEZONE, PetStage
 
 # ==================
 # Base models (for create/update)
@@ -17,9 +17,8 @@ class PetBase(BaseModel):
     breakthrough_completed: bool = False
     daily_exercise_seconds: int = 0
     daily_steps: int = 0
-    daily_quest_1_completed: bool = False
-    daily_quest_2_completed: bool = False
-    daily_quest_3_completed: bool = False
+    daily_quests_claimed: int = 0  # bit (quest id - 1) set = claimed today
+    timezone: Optional[str] = None  # IANA time zone, e.g. "Asia/Taipei"
 
 class PetCreate(PetBase):
     pass
@@ -34,9 +33,14 @@ class PetUpdate(BaseModel):
     breakthrough_completed: Optional[bool] = None
     daily_exercise_seconds: Optional[int] = None
     daily_steps: Optional[int] = None
-    daily_quest_1_completed: Optional[bool] = None
-    daily_quest_2_completed: Optional[bool] = None
-    daily_quest_3_completed: Optional[bool] = None
+    daily_quests_claimed: Optional[int] = None
+    timezone: Optional[str] = None
+
+    @field_validator("timezone")
+    @classmethod
+    def default_timezone(cls, value):
+        # pets.timezone is NOT NULL: an explicit null means the default zone
+        return value or DEFAULT_TIMEZONE
 
 class UserBase(BaseModel):
     pass
@@ -44,6 +48,7 @@ class UserBase(BaseModel):
 class UserCreate(BaseModel):
     user_id: str  # TownPass ID
     pet_name: str  # Pet name is required
+    timezone: Optional[str] = None  # IANA time zone for the daily reset (defaults to DEFAULT_TIMEZONE)
 
 class ExerciseLogBase(BaseModel):
     exercise_type: str
@@ -89,6 +94,22 @@ class Pet(PetBase):
     class Config:
         from_attributes = True # Pydantic v2 (formerly orm_mode=True)
 
+    # Claimed flags of the first three daily quests, for clients that predate daily_quests_claimed
+    @computed_field
+    @property
+    def daily_quest_1_completed(self) -> bool:
+        return bool(self.daily_quests_claimed & 1)
+
+    @computed_field
+    @property
+    def daily_quest_2_completed(self) -> bool:
+        return bool(self.daily_quests_claimed & 2)
+
+    @computed_field
+    @property
+    def daily_quest_3_completed(self) -> bool:
+        return bool(self.daily_quests_claimed & 4)
+
 class ExerciseLog(ExerciseLogBase):
     id: int
     created_at: datetime
@@ -98,6 +119,17 @@ class ExerciseLog(ExerciseLogBase):
     class Config:
         from_attributes = True
 
+class ExerciseBatchItemResult(BaseModel):
+    index: int  # Position of the session in the request
+    strength_gain: int  # Strength applied (0 if blocked by breakthrough)
+    level: int  # Pet level after this session
+    levels_gained: int
+    breakthrough_required: bool
+
+class ExerciseBatchResult(BaseModel):
+    pet: Pet
+    results: List[ExerciseBatchItemResult]
+
 class Quest(QuestBase):
     id: int
     
@@ -130,6 +162,9 @@ class Attraction(AttractionBase):
     class Config:
         from_attributes = True
 
+class NearbyAttraction(Attraction):
+    distance_m: float
+
 class TravelCheckin(TravelCheckinBase):
     id: int
     user_id: str  # String to match User.id
@@ -143,6 +178,23 @@ class LeaderboardEntry(BaseModel):
     username: str
     value: int # Can be level, exercise volume, etc.
 
+class LeaderboardRank(BaseModel):
+    user_id: str
+    username: str
+    level: int
+    strength: int
+    rank: int  # 1-based, pets with equal level and strength share a rank
+    total: int  # Number of pets on the leaderboard
+
+# For the balance simulator (see balance.py)
+class BalanceSimulation(BaseModel):
+    users: int = 10000
+    days: int = 90
+    seed: Optional[int] = None
+    config: Dict[str, int] = {}  # Game constant overrides, e.g. {"min_daily_strength": 90}
+    population: Dict[str, float] = {}  # Population model overrides, e.g. {"active_probability": 0.5}
+    quests: Optional[List[dict]] = None  # Daily quest definitions replacing the live ones
+
 # For JWT Authentication (optional but recommended)
 class Token(BaseModel):
     access_token: str
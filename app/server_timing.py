@@ -0,0 +1,223 @@
+"""
+Per-request span timing.
+
+ServerTimingMiddleware times each request and reports where the time went
+in a Server-Timing response header, e.g.
+
+    Server-Timing: deps;dur=0.4, pool;dur=0.1, db;dur=1.9;desc="3 queries",
+        threadpool;dur=0.1, crud;dur=2.6;desc="log_exercise", endpoint;dur=2.9,
+        commit;dur=0.8, serialize;dur=0.3, total;dur=4.6
+
+- deps: routing, request parsing and dependency resolution (session setup)
+- pool: waiting for a database connection (see metrics.instrumented_pool)
+- db: SQL execution, from query_stats
+- threadpool: waiting for a worker thread to run sync CRUD code
+- crud: each crud_async call, by CRUD function
+- endpoint: the route function, including the spans above it ran
+- commit: the unit of work's commit (get_db / get_async_db)
+- serialize: response model validation and JSON encoding
+- total: request start until the response headers were sent
+Code can add its own spans with `with server_timing.span("name"):`.
+
+Every response gets an X-Request-ID: the client's, if it sent a usable one,
+or a new one. With REQUEST_LOG_FORMAT=json a JSON line per request is
+printed with the request ID, route, status, durations (including writing
+the response body), SQL statement count and the spans.
+
+Recording a span is a context variable lookup and two perf_counter() calls;
+SERVER_TIMING_ENABLED=false turns all of it off.
+"""
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import os
+import re
+import time
+import uuid
+from datetime import datetime, timezone
+
+from fastapi.routing import APIRoute
+
+from . import query_stats
+
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "true").lower() in ("1", "true", "yes")
+REQUEST_LOG_FORMAT = os.getenv("REQUEST_LOG_FORMAT", "off").lower()  # off | json
+
+REQUEST_ID_HEADER = "x-request-id"
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+class RequestTiming:
+    __slots__ = ("request_id", "started", "endpoint_started", "endpoint_finished", "spans")
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.endpoint_started = None
+        self.endpoint_finished = None
+        self.spans = {}  # (name, desc) -> seconds, in first-recorded order
+
+    def add(self, name: str, seconds: float, desc: str = None):
+        key = (name, desc)
+        self.spans[key] = self.spans.get(key, 0.0) + seconds
+
+    def breakdown(self, response_started: float):
+        """[(name, desc, seconds)] for the Server-Timing header, in request order."""
+        endpoint_started = self.endpoint_started or response_started
+        spans = [("deps", None, endpoint_started - self.started)]
+        stats = query_stats.current()
+        if stats is not None and stats.count:
+            spans.append(("db", f"{stats.count} quer{'y' if stats.count == 1 else 'ies'}", stats.seconds))
+        spans.extend((name, desc, seconds) for (name, desc), seconds in self.spans.items() if name != "commit")
+        if self.endpoint_finished is not None:
+            spans.append(("endpoint", None, self.endpoint_finished - endpoint_started))
+        commit = self.spans.get(("commit", None))
+        if commit is not None:
+            spans.append(("commit", None, commit))
+        if self.endpoint_finished is not None:
+            # Whatever ran between the endpoint returning and the headers, apart from the commit
+            serialize = response_started - self.endpoint_finished - (commit or 0.0)
+            spans.append(("serialize", None, max(0.0, serialize)))
+        spans.append(("total", None, response_started - self.started))
+        return spans
+
+_current = contextvars.ContextVar("request_timing", default=None)
+
+def current():
+    """Timing of the request being served, or None outside a request."""
+    return _current.get()
+
+def request_id():
+    timing = _current.get()
+    return timing.request_id if timing else None
+
+def add(name: str, seconds: float, desc: str = None):
+    """Add a measured duration to the current request's span `name`."""
+    timing = _current.get()
+    if timing is not None:
+        timing.add(name, seconds, desc)
+
+@contextlib.contextmanager
+def span(name: str, desc: str = None):
+    """Time the block as span `name` of the current request (no-op outside a request)."""
+    timing = _current.get()
+    if timing is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(name, time.perf_counter() - started, desc)
+
+# ==================
+# Routes
+# ==================
+
+def _timed_endpoint(endpoint):
+    """Wrap a route function to record when it starts and returns."""
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def timed(*args, **kwargs):
+            timing = _current.get()
+            if timing is None:
+                return await endpoint(*args, **kwargs)
+            timing.endpoint_started = time.perf_counter()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                timing.endpoint_finished = time.perf_counter()
+    else:
+        @functools.wraps(endpoint)
+        def timed(*args, **kwargs):
+            timing = _current.get()
+            if timing is None:
+                return endpoint(*args, **kwargs)
+            timing.endpoint_started = time.perf_counter()
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                timing.endpoint_finished = time.perf_counter()
+    return timed
+
+class TimedRoute(APIRoute):
+    """APIRoute whose endpoint records the endpoint span (set as app.router.route_class)."""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        if SERVER_TIMING_ENABLED:
+            endpoint = _timed_endpoint(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+# ==================
+# Middleware
+# ==================
+
+def _header(spans) -> bytes:
+    entries = []
+    for name, desc, seconds in spans:
+        entry = f"{name};dur={seconds * 1000:.1f}"
+        if desc:
+            entry += f';desc="{desc}"'
+        entries.append(entry)
+    return ", ".join(entries).encode()
+
+def _log(timing: RequestTiming, scope, status: int, spans, response_started: float, finished: float):
+    route = scope.get("route")
+    stats = query_stats.current()
+    print(json.dumps({
+        "time": datetime.now(timezone.utc).isoformat(),
+        "request_id": timing.request_id,
+        "method": scope["method"],
+        "route": route.path if route else None,
+        "path": scope["path"],
+        "status": status,
+        "duration_ms": round((finished - timing.started) * 1000, 2),
+        "write_ms": round((finished - response_started) * 1000, 2) if response_started else None,
+        "queries": stats.count if stats else None,
+        "db_ms": round(stats.seconds * 1000, 2) if stats else None,
+        "spans": [
+            {"name": name, "desc": desc, "ms": round(seconds * 1000, 2)} for name, desc, seconds in spans or []
+        ],
+    }, ensure_ascii=False))
+
+class ServerTimingMiddleware:
+    """Time each request and add the Server-Timing and X-Request-ID headers (see module docstring)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not SERVER_TIMING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        incoming = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                incoming = value.decode("latin-1")
+                break
+        timing = RequestTiming(incoming if incoming and REQUEST_ID_PATTERN.match(incoming) else uuid.uuid4().hex)
+        status = 500
+        spans = None
+        response_started = None
+
+        async def send_with_timing(message):
+            nonlocal status, spans, response_started
+            if message["type"] == "http.response.start":
+                response_started = time.perf_counter()
+                status = message["status"]
+                spans = timing.breakdown(response_started)
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", _header(spans)),
+                    (REQUEST_ID_HEADER.encode(), timing.request_id.encode()),
+                ]
+            await send(message)
+
+        token = _current.set(timing)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            if REQUEST_LOG_FORMAT == "json":
+                _log(timing, scope, status, spans, response_started, time.perf_counter())
+            _current.reset(token)
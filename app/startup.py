@@ -0,0 +1,151 @@
+"""
+Application startup.
+
+STARTUP_MODE=development (default) keeps the convenient local behaviour:
+create missing tables, seed the attractions and quest templates, load the
+in-memory caches.
+
+STARTUP_MODE=production is for scale-to-zero deployments, where every cold
+instance pays for its startup before it serves a request:
+- no create_all; run the add_*.py migrations / reset_database.py instead
+- the seed data is upserted with a single INSERT ... ON CONFLICT DO NOTHING
+  statement (attractions in a CTE, quest templates in the main statement),
+  under a transaction-scoped advisory lock on Postgres so instances that start
+  together queue up instead of racing on the same rows
+- STARTUP_WARM_CONNECTIONS pool connections are opened concurrently, while
+  the in-memory caches load
+Either way the AnyIO threadpool is sized to the worker's connection share plus
+headroom (database.THREADPOOL_SIZE) and one line with the timing breakdown is
+logged.
+
+main.py imports this module before anything else, so the "imports" phase
+covers FastAPI, SQLAlchemy, the app modules and engine creation.
+"""
+import time
+
+IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from anyio import to_thread
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+
+from . import attractions, crud, crud_atomic, database, leaderboard, models, quest_templates
+from .database import SessionLocal, engine
+
+STARTUP_MODE = os.getenv("STARTUP_MODE", "development").lower()
+STARTUP_WARM_CONNECTIONS = int(os.getenv("STARTUP_WARM_CONNECTIONS", "3"))
+
+# Arbitrary application-wide key for pg_advisory_xact_lock
+SEED_LOCK_KEY = 7_302_115_001
+
+# Milliseconds per startup phase, in order
+timings = {}
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 1)
+
+def imports_done():
+    timings["imports"] = _elapsed_ms(IMPORT_STARTED)
+
+def seed_statements(db):
+    """The statements that upsert all seed data: one on Postgres, one per table elsewhere."""
+    attractions_table = models.Attraction.__table__
+    seed_attractions = crud_atomic.dialect_insert(db, attractions_table).values(
+        crud.TAIPEI_ATTRACTIONS
+    ).on_conflict_do_nothing(index_elements=[attractions_table.c.name])
+    # Existing quests get the current rewards too (the template registry reads them from the table)
+    seed_quests = quest_templates.upsert_statement(db, crud.QUEST_TEMPLATES)
+
+    if db.get_bind().dialect.name == "postgresql":
+        return [seed_quests.add_cte(seed_attractions.cte("seed_attractions"))]
+    return [seed_attractions, seed_quests]
+
+def _seed_production():
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        postgres = db.get_bind().dialect.name == "postgresql"
+        db.connection()
+        timings["engine"] = _elapsed_ms(started)
+
+        started = time.perf_counter()
+        if postgres:
+            db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SEED_LOCK_KEY})
+        for stmt in seed_statements(db):
+            db.execute(stmt)
+        db.commit()  # also releases the advisory lock
+        timings["seed"] = _elapsed_ms(started)
+    except Exception as e:
+        db.rollback()
+        print(f"Error seeding startup data: {e}")
+        raise e
+    finally:
+        db.close()
+
+def _seed_development():
+    started = time.perf_counter()
+    models.Base.metadata.create_all(bind=engine)
+    timings["schema"] = _elapsed_ms(started)
+
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        crud.seed_attractions(db)
+        crud.seed_quest_templates(db)
+        db.commit()
+    finally:
+        db.close()
+    timings["seed"] = _elapsed_ms(started)
+
+def _load_caches():
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        leaderboard.level_leaderboard.load(db)
+        attractions.attraction_catalog.load(db)
+        quest_templates.registry.load(db)
+    finally:
+        db.close()
+    timings["caches"] = _elapsed_ms(started)
+
+def _warm_sync_pool(count: int):
+    with ThreadPoolExecutor(count) as executor:
+        # Hold every connection until all are open, so the pool keeps `count` of them
+        connections = list(executor.map(lambda _: engine.connect(), range(count)))
+    for connection in connections:
+        connection.close()
+
+async def _warm_async_pool(count: int):
+    connections = await asyncio.gather(*(database.async_engine.connect() for _ in range(count)))
+    await asyncio.gather(*(connection.close() for connection in connections))
+
+async def _warm_pool():
+    started = time.perf_counter()
+    count = min(STARTUP_WARM_CONNECTIONS, database.DB_POOL_SIZE)
+    if count > 0 and not database.PGBOUNCER:
+        if database.USE_ASYNC_DB:
+            await _warm_async_pool(count)
+        else:
+            await run_in_threadpool(_warm_sync_pool, count)
+    timings["warmup"] = _elapsed_ms(started)
+
+async def run():
+    """Prepare the database and in-memory state (called from the app startup hook)."""
+    started = time.perf_counter()
+    to_thread.current_default_thread_limiter().total_tokens = database.THREADPOOL_SIZE
+    if STARTUP_MODE == "production":
+        await run_in_threadpool(_seed_production)
+        await asyncio.gather(_warm_pool(), run_in_threadpool(_load_caches))
+    else:
+        await run_in_threadpool(_seed_development)
+        await run_in_threadpool(_load_caches)
+    timings["startup"] = _elapsed_ms(started)
+
+    print(
+        f"Startup ({STARTUP_MODE}): "
+        + ", ".join(f"{phase} {ms:.0f}ms" for phase, ms in timings.items())
+    )
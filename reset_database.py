@@ -27,11 +27,7 @@ def reset_database():
         print("Attractions seeded")
         
         # Seed daily quest templates
-        for quest_template in crud.QUEST_TEMPLATES:
-            q = db.query(models.Quest).filter(models.Quest.title == quest_template["title"]).first()
-            if not q:
-                q = models.Quest(**quest_template)
-                db.add(q)
+        crud.seed_quest_templates(db)
         db.commit()
         print("Quest templates seeded")
         
@@ -41,6 +37,7 @@ def reset_database():
             pet_name="預設小雞"
         )
         created_user = crud.create_user(db, default_user)
+        db.commit()
         print(f"Default user created: id={created_user.id}, pet_name={created_user.pet.name}")
         
         print("\nDatabase reset complete!")
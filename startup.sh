@@ -8,5 +8,20 @@ PORT=${PORT:-8080}
 
 echo "Container will listen on port: $PORT"
 
+if [ "$STARTUP_MODE" = "production" ]; then
+    # One worker process per CPU unless WEB_CONCURRENCY is set; app/database.py
+    # splits DB_CONNECTION_BUDGET across them
+    export WEB_CONCURRENCY=${WEB_CONCURRENCY:-$(nproc)}
+    # Workers share their Prometheus samples through this directory (see app/metrics.py)
+    export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/petfit-metrics}
+    # A per-process pet cache would serve other workers' stale pets (and ETags)
+    # until its entries expire; share one across the workers (see app/pet_cache.py)
+    export PET_CACHE_BACKEND=${PET_CACHE_BACKEND:-local-shared}
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+    echo "Starting $WEB_CONCURRENCY workers"
+    exec uvicorn app.main:app --host 0.0.0.0 --port $PORT --workers $WEB_CONCURRENCY
+fi
+
 # Launch FastAPI without --reload for production (Cloud Run)
-exec uvicorn app.main:app --host 0.0.0.0 --port $PORT
\ No newline at end of file
+exec uvicorn app.main:app --host 0.0.0.0 --port $PORT
@@ -0,0 +1,44 @@
+"""
+Test setup: the app runs against a throwaway SQLite file, never the
+DATABASE_URL from the environment or .env, with query budgets enforced.
+
+    pip install pytest httpx
+    python -m pytest -q
+
+The settings are module constants read at import, so they are set here,
+before anything imports app.
+"""
+import os
+import tempfile
+
+_DATA_DIR = tempfile.mkdtemp(prefix="petfit-tests-")
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DATA_DIR, 'test.db')}"
+os.environ["USE_ASYNC_DB"] = "false"
+os.environ["QUERY_BUDGET_MODE"] = "raise"
+os.environ["PET_CACHE_BACKEND"] = "memory"
+# No background jobs changing rows or caches under a test
+os.environ["LEADERBOARD_REFRESH_SECONDS"] = "0"
+os.environ["ATTRACTION_REFRESH_SECONDS"] = "0"
+os.environ["DAILY_RESET_INTERVAL_SECONDS"] = "0"
+os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+os.environ.pop("PROFILE_SECRET", None)
+
+import pytest
+from fastapi.testclient import TestClient
+
+@pytest.fixture(scope="session")
+def client():
+    from app.main import app
+    with TestClient(app) as client:
+        yield client
+
+@pytest.fixture
+def db(client):
+    from app.database import SessionLocal
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
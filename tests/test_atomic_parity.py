@@ -0,0 +1,141 @@
+"""
+crud_atomic's SQL rules agree with pet_rules and the ORM path.
+
+Pairs of identical pets get the same random operations, one with
+ATOMIC_PET_UPDATES on and one with it off; the results and the rows after
+each operation must match.
+"""
+import random
+
+import pytest
+from sqlalchemy import literal, select
+
+from app import crud, crud_atomic, models, pet_rules, schemas
+from app.database import SessionLocal
+
+COLUMNS = (
+    "strength", "stamina", "mood", "level", "breakthrough_completed", "stage",
+    "daily_exercise_seconds", "daily_steps", "daily_quests_claimed",
+)
+PETS = 60
+OPERATIONS_PER_PET = 4
+
+def pet_state(pet):
+    if pet is None:
+        return None
+    if isinstance(pet, dict):
+        return {name: pet[name] for name in COLUMNS}
+    return {name: getattr(pet, name) for name in COLUMNS}
+
+def comparable(result):
+    """A CRUD result with its pet reduced to the compared columns."""
+    if isinstance(result, dict):
+        out = {key: value for key, value in result.items() if key not in ("pet", "checkin")}
+        if "pet" in result:
+            out["pet"] = pet_state(result["pet"])
+        return out
+    if result is None or isinstance(result, tuple):
+        return result
+    return pet_state(result)
+
+def run(session_factory, atomic: bool, operation, user_id: str):
+    name, *args = operation
+    crud.ATOMIC_PET_UPDATES = atomic
+    with session_factory() as db:
+        if name == "update_pet":
+            # Returns the pet itself (an object or a row dict)
+            result = pet_state(crud.update_pet(db, crud.get_pet_by_user_id(db, user_id), *args))
+        elif name == "update_pet_stats":
+            result = crud.update_pet_stats(db, crud.get_pet_by_user_id(db, user_id), *args)
+        else:
+            try:
+                result = getattr(crud, name)(db, user_id, *args)
+            except ValueError as e:
+                result = ("ValueError", str(e))
+        result = comparable(result)
+        db.expire_all()
+        row = pet_state(crud.get_pet_by_user_id(db, user_id))
+        db.commit()
+    return result, row
+
+def random_state(rng):
+    state = dict(
+        strength=rng.choice([0, 119, 120, rng.randint(0, 400)]),
+        stamina=rng.randint(0, pet_rules.MAX_STAMINA),
+        mood=rng.randint(0, pet_rules.MAX_MOOD),
+        level=rng.choice([4, 5, 9, 10, 20, 25, rng.randint(1, pet_rules.MAX_LEVEL + 1)]),
+        breakthrough_completed=rng.choice([True, False]),
+        daily_exercise_seconds=rng.choice([0, 599, 600, 1000]),
+        daily_steps=rng.choice([0, 4999, 5000]),
+        daily_quests_claimed=rng.randint(0, 7),
+    )
+    state["stage"] = pet_rules.stage_for_level(state["level"], state["breakthrough_completed"])
+    return state
+
+def random_operation(rng):
+    kind = rng.choice(["stats", "exercise", "claim", "breakthrough", "checkin", "patch"])
+    if kind == "stats":
+        return ("update_pet_stats", rng.randint(-50, 700), rng.randint(-1000, 1000), rng.randint(-150, 150))
+    if kind == "exercise":
+        return ("log_exercise", schemas.ExerciseLogCreate(
+            exercise_type="Run", duration_seconds=rng.randint(0, 5000), steps=rng.randint(0, 6000)
+        ))
+    if kind == "claim":
+        return ("claim_daily_quest_reward", rng.randint(0, 4))
+    if kind == "breakthrough":
+        return ("complete_breakthrough",)
+    if kind == "checkin":
+        return ("create_travel_checkin", schemas.TravelCheckinCreate(quest_id=rng.choice(["a", "b"]), lat=1.0, lng=2.0))
+    values = {
+        "strength": rng.randint(0, 400),
+        "stamina": rng.randint(0, 1000),
+        "mood": rng.randint(0, 120),
+        "level": rng.randint(1, pet_rules.MAX_LEVEL),
+        "breakthrough_completed": rng.choice([True, False]),
+        "name": "renamed",
+    }
+    changed = rng.sample(sorted(values), rng.randint(0, 3))
+    return ("update_pet", schemas.PetUpdate(**{key: values[key] for key in changed}))
+
+@pytest.fixture
+def restore_mode():
+    atomic = crud.ATOMIC_PET_UPDATES
+    yield
+    crud.ATOMIC_PET_UPDATES = atomic
+
+def test_sql_stage_matches_pet_rules(db):
+    for level in range(-1, pet_rules.MAX_LEVEL + 2):
+        for completed in (True, False):
+            stage = db.execute(select(crud_atomic.stage_for_level(literal(level), literal(completed)))).scalar()
+            assert stage == pet_rules.stage_for_level(level, completed), (level, completed)
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_atomic_updates_match_orm(db, restore_mode, seed):
+    rng = random.Random(seed)
+    states = [random_state(rng) for _ in range(PETS)]
+    for i, state in enumerate(states):
+        for mode in ("atomic", "orm"):
+            user_id = f"parity-{seed}-{i}-{mode}"
+            db.add(models.User(id=user_id))
+            db.add(models.Pet(owner_id=user_id, name="p", **state))
+    db.commit()
+
+    mismatches = []
+    for i, state in enumerate(states):
+        for _ in range(OPERATIONS_PER_PET):
+            operation = random_operation(rng)
+            atomic = run(SessionLocal, True, operation, f"parity-{seed}-{i}-atomic")
+            orm = run(SessionLocal, False, operation, f"parity-{seed}-{i}-orm")
+            if atomic != orm:
+                mismatches.append((state, operation, atomic, orm))
+    assert not mismatches, mismatches[:3]
+
+@pytest.mark.parametrize("operation", [
+    ("log_exercise", schemas.ExerciseLogCreate(exercise_type="Run", duration_seconds=10)),
+    ("claim_daily_quest_reward", 1),
+    ("claim_daily_quest_reward", 9),
+    ("complete_breakthrough",),
+    ("create_travel_checkin", schemas.TravelCheckinCreate(quest_id="z", lat=1, lng=1)),
+], ids=["exercise", "claim", "claim-invalid", "breakthrough", "checkin"])
+def test_missing_pet_matches_orm(client, restore_mode, operation):
+    assert run(SessionLocal, True, operation, "parity-nobody") == run(SessionLocal, False, operation, "parity-nobody")
@@ -0,0 +1,129 @@
+"""Attraction catalog reloads and the nearby grid index."""
+import math
+import random
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app.attractions import EARTH_RADIUS_M, AttractionCatalog, GridIndex
+
+class FailingSession:
+    def execute(self, *args, **kwargs):
+        raise OperationalError("SELECT", {}, Exception("connection lost"))
+
+class InvalidatingSession:
+    """Invalidates the catalog while its load is reading, like a concurrent commit."""
+
+    def __init__(self, db, catalog):
+        self.db = db
+        self.catalog = catalog
+
+    def execute(self, *args, **kwargs):
+        self.catalog.invalidate()
+        return self.db.execute(*args, **kwargs)
+
+def test_load_clears_stale(db):
+    catalog = AttractionCatalog()
+    assert catalog.stale
+    snapshot = catalog.load(db)
+    assert not catalog.stale
+    assert snapshot.attractions and snapshot is catalog.snapshot()
+
+def test_failed_load_stays_stale(db):
+    catalog = AttractionCatalog()
+    catalog.load(db)
+    loaded = catalog.snapshot()
+    catalog.invalidate()
+    with pytest.raises(OperationalError):
+        catalog.load(FailingSession())
+    assert catalog.stale
+    assert catalog.snapshot() is loaded
+
+def test_invalidated_during_load_stays_stale(db):
+    catalog = AttractionCatalog()
+    catalog.load(InvalidatingSession(db, catalog))
+    assert catalog.stale
+    catalog.load(db)
+    assert not catalog.stale
+
+# ==================
+# GridIndex
+# ==================
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(min(a, 1.0)))
+
+def brute_force(attractions, lat, lng, radius_m, limit):
+    found = sorted(
+        (haversine_m(lat, lng, a["latitude"], a["longitude"]), position)
+        for position, a in enumerate(attractions)
+        if a["latitude"] is not None and a["longitude"] is not None
+    )
+    return [(position, distance) for distance, position in found if distance <= radius_m][:limit]
+
+def random_attractions(rng, count, lat_range, lng_range):
+    attractions = []
+    for _ in range(count):
+        located = rng.random() > 0.05
+        attractions.append({
+            "latitude": rng.uniform(*lat_range) if located else None,
+            "longitude": rng.uniform(*lng_range) if located else None,
+        })
+    return attractions
+
+AREAS = {
+    "city": ((24.95, 25.15), (121.45, 121.65)),
+    "world": ((-90, 90), (-180, 180)),
+    "antimeridian": ((-10, 10), (179, 180)),
+    "pole": ((88, 90), (-180, 180)),
+}
+
+@pytest.mark.parametrize("cell_degrees", [0.01, 0.5])
+@pytest.mark.parametrize("area", sorted(AREAS))
+def test_grid_matches_brute_force(area, cell_degrees):
+    rng = random.Random(f"{area}-{cell_degrees}")
+    lat_range, lng_range = AREAS[area]
+    attractions = random_attractions(rng, 400, lat_range, lng_range)
+    if area == "antimeridian":
+        # Points on both sides of the date line
+        attractions += [
+            {"latitude": p["latitude"], "longitude": -p["longitude"]}
+            for p in attractions[:200] if p["longitude"] is not None
+        ]
+    index = GridIndex(attractions, cell_degrees)
+
+    for _ in range(60):
+        lat, lng = rng.uniform(*lat_range), rng.uniform(*lng_range)
+        radius_m = rng.choice([50, 500, 2000, 20000, 200000, 3000000])
+        limit = rng.choice([1, 5, 50, 1000])
+        positions, distances = index.nearby(lat, lng, radius_m, limit)
+        expected = brute_force(attractions, lat, lng, radius_m, limit)
+        assert positions == [position for position, _ in expected], (lat, lng, radius_m, limit)
+        assert distances == pytest.approx([distance for _, distance in expected], abs=1e-3)
+
+def test_grid_ignores_attractions_without_coordinates():
+    attractions = [{"latitude": None, "longitude": None}, {"latitude": 25.0, "longitude": 121.5}]
+    index = GridIndex(attractions)
+    assert len(index) == 1
+    assert index.nearby(25.0, 121.5, 10, 5) == ([1], [0.0])
+
+def test_empty_grid():
+    assert GridIndex(()).nearby(25.0, 121.5, 1000, 5) == ([], [])
+
+def test_catalog_nearby_is_nearest_first(db):
+    catalog = AttractionCatalog()
+    snapshot = catalog.load(db)
+    first = next(a for a in snapshot.attractions if a["latitude"] is not None)
+    found = catalog.nearby(first["latitude"], first["longitude"], 5000, 3)
+    assert found[0]["id"] == first["id"] and found[0]["distance_m"] == 0
+    assert [a["distance_m"] for a in found] == sorted(a["distance_m"] for a in found)
+
+@pytest.mark.parametrize("lng", [180.0, -180.0])
+def test_grid_finds_points_on_the_antimeridian(lng):
+    # Enough occupied cells that the lookup does not fall back to a full scan
+    filler = [{"latitude": lat * 1.0, "longitude": lon * 1.0} for lat in range(-60, 60, 3) for lon in range(-170, 170, 3)]
+    index = GridIndex([{"latitude": 0.0, "longitude": lng}] + filler, 0.5)
+    for query_lng in (179.999, -179.999):
+        assert index.nearby(0.0, query_lng, 1000, 5)[0] == [0]
@@ -0,0 +1,108 @@
+"""The nightly reset: two set-based UPDATEs per time zone bucket, same rules as pet_rules."""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select, update
+
+from app import crud, models, pet_rules, schemas
+from app.daily_reset import reset_timezone
+from app.database import SessionLocal
+from app.pet_rules import PetState
+
+# 11:30 UTC: 00:30 on March 11 in Auckland (UTC+13), 04:30 on March 10 in Los Angeles (UTC-7)
+NOW = datetime(2026, 3, 10, 11, 30, tzinfo=timezone.utc)
+AUCKLAND_MIDNIGHT = datetime(2026, 3, 10, 11, 0, tzinfo=timezone.utc)
+LOS_ANGELES_MIDNIGHT = datetime(2026, 3, 10, 7, 0, tzinfo=timezone.utc)
+
+def create_pet(user_id: str, zone_name: str, last_daily_check: datetime = None, strength_yesterday: int = None, **stats):
+    with SessionLocal() as db:
+        crud.create_user(db, schemas.UserCreate(user_id=user_id, pet_name=user_id, timezone=zone_name))
+        db.execute(
+            update(models.Pet).where(models.Pet.owner_id == user_id)
+            .values(last_daily_check=last_daily_check, daily_exercise_seconds=600, daily_steps=900, daily_quests_claimed=2, **stats)
+        )
+        if strength_yesterday is not None:
+            yesterday = crud.local_day_start(crud.get_zone(zone_name), NOW).astimezone(crud.get_zone(zone_name)).date() - timedelta(days=1)
+            db.add(models.DailyExerciseRollup(
+                user_id=user_id, day=yesterday, seconds=strength_yesterday * crud.SECONDS_PER_STRENGTH_POINT,
+                steps=0, strength_points=strength_yesterday, sessions=1,
+            ))
+        db.commit()
+
+def pet_row(db, user_id: str):
+    return db.execute(select(models.Pet).where(models.Pet.owner_id == user_id)).scalar_one()
+
+def reset(zone_name: str):
+    with SessionLocal() as db:
+        return reset_timezone(db, zone_name, NOW)
+
+# (name, mood, strength, strength points yesterday or None for no rollup row)
+CASES = [
+    ("met the minimum", 50, 30, pet_rules.MIN_DAILY_STRENGTH),
+    ("one point short", 50, 30, pet_rules.MIN_DAILY_STRENGTH - 1),
+    ("no exercise yesterday", 15, 30, None),
+    ("mood reaches 0, strength drops", 10, 30, None),
+    ("mood 0, strength floors at 0", 0, 5, 0),
+    ("mood 0 without strength", 0, 0, None),
+]
+
+def test_reset_matches_pet_rules(client):
+    zone_name = "Europe/Berlin"
+    for name, mood, strength, strength_yesterday in CASES:
+        create_pet(f"reset-{name}", zone_name, None, strength_yesterday, mood=mood, strength=strength, stamina=10)
+
+    summary = reset(zone_name)
+    met = [case for case in CASES if (case[3] or 0) >= pet_rules.MIN_DAILY_STRENGTH]
+    assert summary == {"timezone": zone_name, "met_requirement": len(met), "missed_requirement": len(CASES) - len(met)}
+
+    with SessionLocal() as db:
+        for name, mood, strength, strength_yesterday in CASES:
+            expected = PetState(mood=mood, strength=strength, stamina=10)
+            pet_rules.start_new_day(expected, strength_yesterday or 0)
+            pet = pet_row(db, f"reset-{name}")
+            assert (pet.mood, pet.strength, pet.stamina) == (expected.mood, expected.strength, expected.stamina), name
+            assert (pet.daily_exercise_seconds, pet.daily_steps, pet.daily_quests_claimed) == (0, 0, 0)
+            assert crud.as_utc(pet.last_daily_check) == NOW
+
+def test_buckets_use_their_own_midnight(client):
+    # Checked after Los Angeles' midnight but before Auckland's
+    checked = AUCKLAND_MIDNIGHT - timedelta(minutes=30)
+    create_pet("reset-auckland", "Pacific/Auckland", checked, mood=50)
+    create_pet("reset-los-angeles", "America/Los_Angeles", checked, mood=50)
+    create_pet("reset-los-angeles-yesterday", "America/Los_Angeles", LOS_ANGELES_MIDNIGHT - timedelta(minutes=1), mood=50)
+
+    assert reset("Pacific/Auckland") == {"timezone": "Pacific/Auckland", "met_requirement": 0, "missed_requirement": 1}
+    assert reset("America/Los_Angeles") == {"timezone": "America/Los_Angeles", "met_requirement": 0, "missed_requirement": 1}
+    with SessionLocal() as db:
+        assert crud.as_utc(pet_row(db, "reset-auckland").last_daily_check) == NOW
+        assert crud.as_utc(pet_row(db, "reset-los-angeles").last_daily_check) == checked
+        assert pet_row(db, "reset-los-angeles").mood == 50
+        assert pet_row(db, "reset-los-angeles-yesterday").mood == 50 - pet_rules.MISSED_DAY_MOOD_PENALTY
+
+def test_reset_runs_once_per_local_day(client):
+    zone_name = "Europe/London"
+    create_pet("reset-twice", zone_name, None, mood=50)
+    assert reset(zone_name)["missed_requirement"] == 1
+    assert reset(zone_name) == {"timezone": zone_name, "met_requirement": 0, "missed_requirement": 0}
+    with SessionLocal() as db:
+        assert pet_row(db, "reset-twice").mood == 50 - pet_rules.MISSED_DAY_MOOD_PENALTY
+
+def test_reset_invalidates_cached_pets(client):
+    zone_name = "Asia/Tokyo"
+    create_pet("reset-cached", zone_name, None, stamina=10)
+    assert client.get("/users/reset-cached/pet").json()["stamina"] == 10
+    reset(zone_name)
+    assert client.get("/users/reset-cached/pet").json()["stamina"] == pet_rules.MAX_STAMINA
+
+def test_failed_reset_rolls_back(client, monkeypatch):
+    zone_name = "Europe/Paris"
+    create_pet("reset-failing", zone_name, None, mood=50)
+
+    def fail(db, pet):
+        raise RuntimeError("leaderboard unavailable")
+    monkeypatch.setattr("app.daily_reset.leaderboard.track", fail)
+    with pytest.raises(RuntimeError):
+        reset(zone_name)
+    with SessionLocal() as db:
+        pet = pet_row(db, "reset-failing")
+        assert (pet.mood, pet.last_daily_check) == (50, None)
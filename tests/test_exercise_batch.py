@@ -0,0 +1,98 @@
+"""log_exercise_batch folds sessions the same way as logging them one by one."""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import func, select, update
+
+from app import crud, models, schemas
+from app.database import SessionLocal
+
+PET_COLUMNS = crud.EXERCISE_BATCH_COLUMNS
+
+def session(seconds: int, steps: int = 0) -> schemas.ExerciseLogCreate:
+    return schemas.ExerciseLogCreate(exercise_type="Run", duration_seconds=seconds, steps=steps)
+
+def create_pet(user_id: str, **stats):
+    with SessionLocal() as db:
+        crud.create_user(db, schemas.UserCreate(user_id=user_id, pet_name=user_id))
+        if stats:
+            db.execute(update(models.Pet).where(models.Pet.owner_id == user_id).values(**stats))
+        db.commit()
+
+def pet_row(db, user_id: str) -> dict:
+    pet = db.execute(select(models.Pet.__table__).where(models.Pet.owner_id == user_id)).mappings().first()
+    return {column: pet[column] for column in PET_COLUMNS}
+
+BATCHES = {
+    "within a level": dict(stats={}, logs=[session(300, 100), session(200, 50)]),
+    "several levels": dict(stats={}, logs=[session(1200), session(2400, 3000), session(100)]),
+    "stops at the gate": dict(
+        stats={"level": 4, "strength": 100, "breakthrough_completed": False},
+        logs=[session(600), session(1200), session(50, 10)],
+    ),
+    "blocked at the gate": dict(
+        stats={"level": 10, "strength": 0, "breakthrough_completed": False, "stamina": 15},
+        logs=[session(600), session(600)],
+    ),
+    "past a completed gate": dict(
+        stats={"level": 5, "strength": 110, "breakthrough_completed": True},
+        logs=[session(100), session(6000, 8000)],
+    ),
+}
+
+@pytest.mark.parametrize("atomic", [True, False], ids=["atomic", "orm"])
+@pytest.mark.parametrize("name", sorted(BATCHES))
+def test_batch_matches_sessions_one_by_one(client, monkeypatch, name, atomic):
+    monkeypatch.setattr(crud, "ATOMIC_PET_UPDATES", atomic)
+    case = BATCHES[name]
+    batch_user, single_user = f"batch-{name}-{atomic}", f"single-{name}-{atomic}"
+    create_pet(batch_user, **case["stats"])
+    create_pet(single_user, **case["stats"])
+
+    with SessionLocal() as db:
+        result = crud.log_exercise_batch(db, batch_user, case["logs"])
+        db.commit()
+    with SessionLocal() as db:
+        blocked = []
+        for log in case["logs"]:
+            blocked.append(crud.log_exercise(db, single_user, log)["breakthrough_required"])
+            db.commit()
+
+    with SessionLocal() as db:
+        assert pet_row(db, batch_user) == pet_row(db, single_user)
+        assert {column: result["pet"][column] for column in PET_COLUMNS} == pet_row(db, batch_user)
+    assert [r["breakthrough_required"] for r in result["results"]] == blocked
+    assert [r["index"] for r in result["results"]] == list(range(len(case["logs"])))
+    assert sum(r["levels_gained"] for r in result["results"]) == result["pet"]["level"] - case["stats"].get("level", 1)
+    for r, log in zip(result["results"], case["logs"]):
+        expected = 0 if r["breakthrough_required"] else log.duration_seconds // crud.SECONDS_PER_STRENGTH_POINT
+        assert r["strength_gain"] == expected
+
+def test_batch_writes_logs_and_rollup(client):
+    create_pet("batch-rows")
+    logs = [session(600, 1000), session(95, 20), session(1, 0)]
+    with SessionLocal() as db:
+        crud.log_exercise_batch(db, "batch-rows", logs)
+        db.commit()
+
+        assert db.scalar(
+            select(func.count()).select_from(models.ExerciseLog).where(models.ExerciseLog.user_id == "batch-rows")
+        ) == 3
+        rollup = db.execute(
+            select(models.DailyExerciseRollup).where(models.DailyExerciseRollup.user_id == "batch-rows")
+        ).scalar_one()
+        assert (rollup.seconds, rollup.steps, rollup.strength_points, rollup.sessions) == (696, 1020, 69, 3)
+        assert rollup.day == datetime.now(crud.get_zone(models.DEFAULT_TIMEZONE)).date()
+
+def test_empty_batch_changes_nothing(client):
+    create_pet("batch-empty")
+    with SessionLocal() as db:
+        before = pet_row(db, "batch-empty")
+        result = crud.log_exercise_batch(db, "batch-empty", [])
+        db.commit()
+        assert result["results"] == []
+        assert pet_row(db, "batch-empty") == before
+
+def test_batch_without_pet(client):
+    with SessionLocal() as db:
+        assert crud.log_exercise_batch(db, "batch-nobody", [session(60)]) is None
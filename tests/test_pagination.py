@@ -0,0 +1,96 @@
+"""Keyset pagination: cursors and page order."""
+import base64
+
+import pytest
+from sqlalchemy import select
+
+from app import models, pagination
+from app.pagination import decode_cursor, encode_cursor
+
+@pytest.mark.parametrize("values", [[1], [42, "u1"], ["a/b+c?"], []])
+def test_cursor_round_trip(values):
+    cursor = encode_cursor(*values)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == values
+
+# Empty, not base64, not JSON ("not json"), truncated
+@pytest.mark.parametrize("cursor", ["", "!!!", "bm90IGpzb24", encode_cursor(1)[:-2]])
+def test_malformed_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+def test_cursor_must_be_a_list():
+    cursor = base64.urlsafe_b64encode(b'{"id": 1}').decode()
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+@pytest.mark.parametrize("values", [[True], [False], ["5"], [5.0], [None], [1, 2]])
+def test_cursor_values_must_match_the_key(db, values):
+    stmt = select(models.ExerciseLog)
+    with pytest.raises(ValueError):
+        pagination.paginate(db, stmt, [models.ExerciseLog.id], cursor=encode_cursor(*values))
+
+@pytest.mark.parametrize("path", ["exercise", "quests", "travel/checkins"])
+def test_tampered_cursor_is_a_bad_request(client, path):
+    client.post("/users/", json={"user_id": "page-tampered", "pet_name": "p"})
+    response = client.get(f"/users/page-tampered/{path}", params={"cursor": encode_cursor(True)})
+    assert response.status_code == 400
+
+def walk(client, url: str, limit: int):
+    """All pages of a list endpoint: (items in order, pages)."""
+    items, pages, cursor = [], 0, None
+    while True:
+        params = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        response = client.get(url, params=params)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page) <= limit
+        items += page
+        pages += 1
+        cursor = response.headers.get(pagination.NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return items, pages
+
+def log_exercise(client, user_id: str, count: int):
+    for seconds in range(1, count + 1):
+        client.post(f"/users/{user_id}/exercise", json={"exercise_type": "Run", "duration_seconds": seconds})
+
+@pytest.mark.parametrize("limit, pages", [(1, 12), (5, 3), (6, 2), (12, 1), (50, 1)])
+def test_pages_cover_every_row_newest_first(client, limit, pages):
+    user_id = f"page-walk-{limit}"
+    client.post("/users/", json={"user_id": user_id, "pet_name": "p"})
+    log_exercise(client, user_id, 12)
+
+    logs, walked = walk(client, f"/users/{user_id}/exercise", limit)
+    ids = [log["id"] for log in logs]
+    assert ids == sorted(ids, reverse=True)
+    assert [log["duration_seconds"] for log in logs] == list(range(12, 0, -1))
+    # A last page that is exactly full has no cursor, so there is no empty page after it
+    assert walked == pages
+
+def test_rows_added_between_pages_do_not_shift_the_next_page(client):
+    client.post("/users/", json={"user_id": "page-insert", "pet_name": "p"})
+    log_exercise(client, "page-insert", 6)
+
+    first = client.get("/users/page-insert/exercise", params={"limit": 3})
+    log_exercise(client, "page-insert", 2)
+    second = client.get(
+        "/users/page-insert/exercise",
+        params={"limit": 3, "cursor": first.headers[pagination.NEXT_CURSOR_HEADER]}
+    )
+    assert [log["duration_seconds"] for log in first.json()] == [6, 5, 4]
+    assert [log["duration_seconds"] for log in second.json()] == [3, 2, 1]
+    assert pagination.NEXT_CURSOR_HEADER not in second.headers
+
+def test_ascending_pages(db, client):
+    client.post("/users/", json={"user_id": "page-asc", "pet_name": "p"})
+    log_exercise(client, "page-asc", 5)
+    log = models.ExerciseLog
+    stmt = select(log).where(log.user_id == "page-asc")
+
+    rows, cursor = pagination.paginate(db, stmt, [log.id], limit=2, descending=False)
+    seen = [row.duration_seconds for row in rows]
+    while cursor:
+        rows, cursor = pagination.paginate(db, stmt, [log.id], cursor=cursor, limit=2, descending=False)
+        seen += [row.duration_seconds for row in rows]
+    assert seen == [1, 2, 3, 4, 5]
@@ -0,0 +1,143 @@
+"""pet_rules, table driven: no database involved."""
+import pytest
+
+from app.models import PetStage
+from app.pet_rules import (
+    MAX_STAMINA,
+    PetState,
+    apply_stats,
+    complete_breakthrough,
+    stage_for_level,
+    start_new_day,
+)
+
+def pet(**stats) -> PetState:
+    state = PetState(**stats)
+    if "stage" not in stats:
+        state.stage = stage_for_level(state.level, state.breakthrough_completed)
+    return state
+
+# (name, pet before, (strength, stamina, mood), pet after, blocked)
+APPLY_STATS = [
+    (
+        "gain within a level",
+        pet(level=1, strength=10, stamina=500, mood=20), (50, 0, 0),
+        pet(level=1, strength=60, stamina=500, mood=20), False,
+    ),
+    (
+        "several levels at once",
+        pet(level=1, strength=0, stamina=100, mood=0), (360, 0, 0),
+        pet(level=4, strength=0, stamina=MAX_STAMINA, mood=30), False,
+    ),
+    (
+        "leftover strength carries over",
+        pet(level=2, strength=100, stamina=100, mood=0), (150, -50, 5),
+        pet(level=4, strength=10, stamina=MAX_STAMINA - 50, mood=25), False,
+    ),
+    (
+        "stops at the level 5 gate, extra strength is dropped",
+        pet(level=1, strength=100, stamina=100, mood=0), (500, 0, 0),
+        pet(level=5, strength=0, stamina=MAX_STAMINA, mood=40, breakthrough_completed=False), False,
+    ),
+    (
+        "blocked at level 5: only stamina and mood change",
+        pet(level=5, strength=0, stamina=500, mood=40, breakthrough_completed=False), (200, -100, 5),
+        pet(level=5, strength=0, stamina=400, mood=45, breakthrough_completed=False), True,
+    ),
+    (
+        "past level 5 after its breakthrough",
+        pet(level=5, strength=0, stamina=100, mood=0, breakthrough_completed=True), (240, 0, 0),
+        pet(level=7, strength=0, stamina=MAX_STAMINA, mood=20, breakthrough_completed=True), False,
+    ),
+    (
+        "stops at the level 10 gate and keeps the previous stage",
+        pet(level=8, strength=0, stamina=100, mood=0, breakthrough_completed=True), (480, 0, 0),
+        pet(level=10, strength=0, stamina=MAX_STAMINA, mood=20, breakthrough_completed=False), False,
+    ),
+    (
+        "blocked at level 10",
+        pet(level=10, strength=0, stamina=MAX_STAMINA, mood=20, breakthrough_completed=False), (120, 0, 0),
+        pet(level=10, strength=0, stamina=MAX_STAMINA, mood=20, breakthrough_completed=False), True,
+    ),
+    (
+        "a loss at the gate is not blocked",
+        pet(level=5, strength=0, stamina=300, mood=50, breakthrough_completed=False), (-10, 0, -60),
+        pet(level=5, strength=0, stamina=300, mood=0, breakthrough_completed=False), False,
+    ),
+    (
+        "no levels past MAX_LEVEL",
+        pet(level=25, strength=0, stamina=100, mood=0, breakthrough_completed=True), (1000, 0, 0),
+        pet(level=25, strength=1000, stamina=100, mood=0, breakthrough_completed=True), False,
+    ),
+    (
+        "stamina and mood are clamped",
+        pet(level=1, strength=0, stamina=MAX_STAMINA, mood=50), (0, -2000, 500),
+        pet(level=1, strength=0, stamina=0, mood=100), False,
+    ),
+]
+
+@pytest.mark.parametrize(
+    "before, change, after, blocked",
+    [case[1:] for case in APPLY_STATS],
+    ids=[case[0] for case in APPLY_STATS],
+)
+def test_apply_stats(before, change, after, blocked):
+    strength, stamina, mood = change
+    assert apply_stats(before, strength, stamina, mood) is blocked
+    assert before == after
+
+@pytest.mark.parametrize("level, completed, stage", [
+    (-3, True, PetStage.EGG),
+    (1, False, PetStage.EGG),
+    (4, True, PetStage.EGG),
+    (5, False, PetStage.CHICK),
+    (5, True, PetStage.CHICK),
+    (9, True, PetStage.CHICK),
+    (10, False, PetStage.CHICK),
+    (10, True, PetStage.CHICKEN),
+    (15, False, PetStage.CHICKEN),
+    (15, True, PetStage.BIG_CHICKEN),
+    (20, False, PetStage.BIG_CHICKEN),
+    (20, True, PetStage.BUFF_CHICKEN),
+    (25, False, PetStage.BUFF_CHICKEN),
+    (30, True, PetStage.BUFF_CHICKEN),
+])
+def test_stage_for_level(level, completed, stage):
+    assert stage_for_level(level, completed) == stage
+
+@pytest.mark.parametrize("before, error, after", [
+    (pet(level=5, breakthrough_completed=False), None, pet(level=5, breakthrough_completed=True)),
+    (
+        pet(level=10, breakthrough_completed=False), None,
+        pet(level=10, breakthrough_completed=True, stage=PetStage.CHICKEN),
+    ),
+    (pet(level=7, breakthrough_completed=False), "Not at a breakthrough level", pet(level=7)),
+    (pet(level=0, breakthrough_completed=False), "Not at a breakthrough level", pet(level=0)),
+    (
+        pet(level=10, breakthrough_completed=True), "Breakthrough already completed for this level",
+        pet(level=10, breakthrough_completed=True),
+    ),
+], ids=["level 5", "level 10", "between gates", "level 0", "already completed"])
+def test_complete_breakthrough(before, error, after):
+    assert complete_breakthrough(before) == error
+    assert before == after
+
+# (name, pet before, strength yesterday, pet after, met)
+NEW_DAY = [
+    ("met the minimum", pet(stamina=100, mood=50, strength=30), 60, pet(mood=50, strength=30), True),
+    ("missed: mood drops", pet(stamina=100, mood=50, strength=30), 59, pet(mood=40, strength=30), False),
+    ("missed, nothing yesterday", pet(stamina=0, mood=15, strength=30), 0, pet(mood=5, strength=30), False),
+    ("missed: mood reaches 0, strength drops", pet(mood=10, strength=30), 0, pet(mood=0, strength=20), False),
+    ("missed at mood 0: strength floors at 0", pet(mood=0, strength=5), 0, pet(mood=0, strength=0), False),
+    ("missed at mood 0 without strength", pet(mood=0, strength=0), 0, pet(mood=0, strength=0), False),
+]
+
+@pytest.mark.parametrize(
+    "before, strength_yesterday, after, met",
+    [case[1:] for case in NEW_DAY],
+    ids=[case[0] for case in NEW_DAY],
+)
+def test_start_new_day(before, strength_yesterday, after, met):
+    assert start_new_day(before, strength_yesterday) is met
+    assert before == after
+    assert before.stamina == MAX_STAMINA
@@ -0,0 +1,117 @@
+"""
+Every route declaring a query budget (@query_stats.budget) stays within it.
+
+The routes are called cold, with the pet cache emptied and the attraction
+catalog stale before each request, and warm. QUERY_BUDGET_MODE=raise (see
+conftest.py) already fails a request over its budget; the counts are also
+checked here from query_stats.capture().
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from app import attractions, database, models, pet_cache, query_stats
+from app.main import app
+
+BUDGETED = {
+    f"{method} {route.path}": route.endpoint.query_budget
+    for route in app.routes
+    if getattr(getattr(route, "endpoint", None), "query_budget", None) is not None
+    for method in route.methods
+}
+
+class Calls:
+    def __init__(self, client, cold: bool):
+        self.client = client
+        self.cold = cold
+        self.counts = {}  # "METHOD /route" -> [statement counts]
+
+    def __call__(self, method: str, url: str, **kwargs):
+        if self.cold:
+            pet_cache.pet_cache.backend.clear()
+            attractions.attraction_catalog.invalidate()
+        with query_stats.capture() as requests:
+            response = self.client.request(method, url, **kwargs)
+        assert response.status_code < 500, (method, url, response.text)
+        stats = requests[0]
+        self.counts.setdefault(f"{stats.method} {stats.route}", []).append(stats.count)
+        return response
+
+def exercise_routes(call, users):
+    for u in users:
+        call("POST", "/users/", json={"user_id": u, "pet_name": u})
+        call("GET", f"/users/{u}")
+        call("GET", f"/users/{u}?include_logs=true")
+        call("GET", f"/users/{u}/pet")
+        call("PATCH", f"/users/{u}/pet", json={"name": "z"})
+        call("PATCH", f"/users/{u}/pet", json={"strength": 100, "mood": 5})
+        call("GET", f"/users/{u}/quests")  # first call of the day generates them
+        quests = call("GET", f"/users/{u}/quests").json()
+        call("POST", f"/users/{u}/quests/{quests[0]['id']}/complete")
+        call("POST", f"/users/{u}/quests/{quests[0]['id']}/complete")
+        call("GET", f"/users/{u}/daily-quests")
+        call("GET", f"/users/{u}/daily-stats")
+        for quest_id in (1, 2, 3, 1):
+            call("POST", f"/users/{u}/daily-quests/{quest_id}/claim")
+        call("POST", f"/users/{u}/exercise", json={"exercise_type": "run", "duration_seconds": 3000, "steps": 6000})
+        call("POST", f"/users/{u}/exercise/batch", json=[{"exercise_type": "run", "duration_seconds": 600}] * 3)
+        call("GET", f"/users/{u}/exercise")
+        call("POST", f"/users/{u}/daily-check")
+        call("POST", f"/users/{u}/daily-check")
+        call("GET", "/travel/attractions")
+        call("GET", "/travel/attractions/nearby?lat=25.03&lng=121.56")
+        call("POST", f"/users/{u}/travel/start")
+        for quest_id, lat, lng in (("taipei-101", 25.03, 121.56), ("taipei-101", 25.03, 121.56), ("x", 1, 2)):
+            call("POST", f"/users/{u}/travel/checkins", json={"quest_id": quest_id, "lat": lat, "lng": lng})
+        call("GET", f"/users/{u}/travel/checkins")
+        call("POST", f"/users/{u}/travel/breakthrough")
+        call("POST", f"/users/{u}/travel/breakthrough")
+        call("GET", "/leaderboard/level")
+        call("GET", f"/leaderboard/level/rank/{u}")
+
+    # The next day, and pets waiting at a breakthrough level
+    with database.SessionLocal() as db:
+        yesterday = datetime.now() - timedelta(days=1)
+        db.execute(
+            update(models.Pet)
+            .where(models.Pet.owner_id.in_(users))
+            .values(last_daily_check=yesterday, last_reset_date=yesterday)
+        )
+        db.commit()
+    pet_cache.pet_cache.backend.clear()
+    for u in users:
+        call("POST", f"/users/{u}/daily-check")
+        call("GET", f"/users/{u}/quests")
+        call("PATCH", f"/users/{u}/pet", json={"level": 10, "breakthrough_completed": False})
+        call("POST", f"/users/{u}/travel/start")
+        call("POST", f"/users/{u}/travel/checkins", json={"quest_id": "new-spot", "lat": 25.1, "lng": 121.5})
+        call("PATCH", f"/users/{u}/pet", json={"level": 15, "breakthrough_completed": False})
+        call("POST", f"/users/{u}/travel/breakthrough")
+
+    call("POST", "/users/nobody/daily-check")
+    call("PATCH", "/users/nobody/pet", json={"name": "x"})
+
+@pytest.mark.parametrize("cold", [True, False], ids=["cold", "warm"])
+def test_routes_stay_within_query_budget(client, cold):
+    call = Calls(client, cold)
+    prefix = "budget-cold" if cold else "budget-warm"
+    exercise_routes(call, [f"{prefix}-1", f"{prefix}-2"])
+
+    assert set(call.counts) >= set(BUDGETED), "budgeted routes not exercised"
+    over = {
+        route: (max(counts), BUDGETED[route])
+        for route, counts in call.counts.items()
+        if route in BUDGETED and max(counts) > BUDGETED[route]
+    }
+    assert not over, over
+
+def test_warm_pet_reads_skip_the_database(client):
+    call = Calls(client, cold=False)
+    call("POST", "/users/", json={"user_id": "budget-reads", "pet_name": "r"})
+    call("GET", "/users/budget-reads/pet")
+    for path in ("/users/budget-reads/pet", "/users/budget-reads/daily-quests", "/users/budget-reads/daily-stats"):
+        call("GET", path)
+    assert call.counts["GET /users/{user_id}/pet"][-1] == 0
+    assert call.counts["GET /users/{user_id}/daily-quests"] == [0]
+    assert call.counts["GET /users/{user_id}/daily-stats"] == [0]
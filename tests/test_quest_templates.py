@@ -0,0 +1,24 @@
+"""The quest template registry only takes in committed rows."""
+from app.database import SessionLocal
+from app.quest_templates import registry
+
+def template(title: str) -> dict:
+    return {"title": title, "description": "test", "reward_strength": 1, "reward_stamina": 2, "reward_mood": 3}
+
+def test_rolled_back_seed_leaves_no_ids(db):
+    [quest_id] = registry.ids(db, [template("registry-rollback")])
+    assert registry.get(db, quest_id)["title"] == "registry-rollback"
+    db.rollback()
+
+    with SessionLocal() as other:
+        assert registry.get(other, quest_id) is None
+
+def test_committed_seed_is_loaded(db):
+    [quest_id] = registry.ids(db, [template("registry-commit")])
+    with SessionLocal() as other:
+        assert registry.get(other, quest_id) is None
+    db.commit()
+
+    with SessionLocal() as other:
+        assert registry.get(other, quest_id)["reward_mood"] == 3
+        assert registry.ids(other, [template("registry-commit")]) == [quest_id]